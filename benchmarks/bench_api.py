@@ -0,0 +1,273 @@
+"""
+Latency and throughput benchmark for the prediction endpoints.
+
+Runs src.main:app in-process through an ASGI client, sweeps /lab/predict and
+/lab/bulk-predict over batch sizes, concurrency levels and cache-hit ratios,
+and writes p50/p95/p99 latency, throughput and RSS per scenario to a JSON file.
+
+Usage:
+    python -m benchmarks.bench_api --output bench.json
+    python -m benchmarks.bench_api --output new.json --compare bench.json
+
+Redis is replaced by fakeredis by default (`pip install fakeredis`); pass
+--redis-url to benchmark against a local Redis instead.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+FEATURE_NAMES = ("MedInc", "HouseAge", "AveRooms", "AveBedrms",
+                 "Population", "AveOccup", "Latitude", "Longitude")
+LOCATION = np.array([3.8, 28.0, 5.4, 1.1, 1430.0, 3.1, 35.6, -119.6])
+SPREAD = np.array([2.0, 12.0, 2.5, 0.5, 1100.0, 1.0, 2.0, 2.0])
+
+
+def rss_mb() -> float:
+    # Current resident set size, falling back to peak RSS off Linux
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(latencies) -> dict:
+    values = np.asarray(latencies) * 1000
+    return {f"p{q}_ms": float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+
+class HouseSource:
+    """
+    Generate houses so that roughly `hit_ratio` of them repeat a warmed set.
+    """
+
+    def __init__(self, hit_ratio, hot_size=256, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.hit_ratio = hit_ratio
+        self.hot = [self._fresh() for _ in range(hot_size)]
+
+    def _fresh(self):
+        row = LOCATION + self.rng.normal(size=8) * SPREAD
+        row[6] = np.clip(row[6], -90, 90)
+        row[7] = np.clip(row[7], -180, 180)
+        return dict(zip(FEATURE_NAMES, row.tolist()))
+
+    def house(self):
+        if self.rng.random() < self.hit_ratio:
+            return self.hot[self.rng.integers(len(self.hot))]
+        return self._fresh()
+
+    def houses(self, count):
+        return [self.house() for _ in range(count)]
+
+
+async def run_scenario(client, endpoint, batch_size, concurrency, hit_ratio, requests):
+    """
+    Drive one endpoint at a fixed concurrency and collect per-request latency.
+    Returns:
+        Scenario result dict.
+    """
+    source = HouseSource(hit_ratio)
+    # Warm the hot set so hits are served from the cache
+    for start in range(0, len(source.hot), 128):
+        await client.post("/lab/bulk-predict", json={"houses": source.hot[start:start + 128]})
+    for house in source.hot:
+        await client.post("/lab/predict", json=house)
+
+    if endpoint == "/lab/predict":
+        payloads = [source.house() for _ in range(requests)]
+    else:
+        payloads = [{"houses": source.houses(batch_size)} for _ in range(requests)]
+
+    latencies = []
+    errors = 0
+    queue = iter(payloads)
+
+    async def worker():
+        nonlocal errors
+        for payload in queue:
+            started = time.perf_counter()
+            response = await client.post(endpoint, json=payload)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    # Throughput counts served requests only; refused ones would inflate it
+    served = requests - errors
+    rows = served * (1 if endpoint == "/lab/predict" else batch_size)
+    return {
+        "endpoint": endpoint,
+        "batch_size": batch_size if endpoint != "/lab/predict" else 1,
+        "concurrency": concurrency,
+        "hit_ratio": hit_ratio,
+        "requests": requests,
+        "errors": errors,
+        **percentiles(latencies),
+        "requests_per_s": served / elapsed,
+        "rows_per_s": rows / elapsed,
+        "rss_mb": rss_mb(),
+    }
+
+
+def use_redis_stand_in(redis_url):
+    # Point the app's Redis client at fakeredis unless a real URL is given
+    import src.housing_predict as housing_predict
+
+    if redis_url:
+        housing_predict.LOCAL_REDIS_URL = redis_url
+        return
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is not installed; pip install fakeredis or pass --redis-url")
+    server = fakeredis.FakeServer()
+    housing_predict.asyncio.from_url = lambda *args, **kwargs: fakeredis.FakeAsyncRedis(
+        server=server, decode_responses=True
+    )
+    housing_predict.redis_client = lambda *args, **kwargs: fakeredis.FakeAsyncRedis(server=server)
+
+
+def configure_app(redis_url, admission):
+    """
+    Prepare src.housing_predict for an in-process run: swap in the Redis
+    stand-in and, unless admission is True, switch admission control off so
+    requests over its budgets are measured rather than refused. Works whether
+    or not the module was already imported.
+    Args:
+        redis_url (str, optional): Real Redis to use instead of fakeredis.
+        admission (bool, required): Keep admission control on.
+    """
+    if not admission:
+        # Read when src.housing_predict is first imported
+        os.environ["ADMISSION_ENABLED"] = "false"
+    use_redis_stand_in(redis_url)
+    if admission:
+        return
+    import src.housing_predict as housing_predict
+    from src.admission import AdmissionMiddleware
+
+    # Already imported with admission on: drop the middleware and rebuild the stack on the next request
+    sub_application = housing_predict.sub_application_housing_predict
+    sub_application.user_middleware = [middleware for middleware in sub_application.user_middleware
+                                       if middleware.cls is not AdmissionMiddleware]
+    sub_application.middleware_stack = None
+    housing_predict.ADMISSION_ENABLED = False
+
+
+def scenarios(args):
+    for concurrency, hit_ratio in itertools.product(args.concurrency, args.hit_ratios):
+        yield "/lab/predict", 1, concurrency, hit_ratio
+        for batch_size in args.batch_sizes:
+            yield "/lab/bulk-predict", batch_size, concurrency, hit_ratio
+
+
+async def run_benchmark(args) -> dict:
+    import httpx
+
+    from src.main import app
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for endpoint, batch_size, concurrency, hit_ratio in scenarios(args):
+                result = await run_scenario(client, endpoint, batch_size, concurrency,
+                                            hit_ratio, args.requests)
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+    return {"meta": metadata(), "results": results}
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(),
+            "machine": platform.machine(), "timestamp": time.time()}
+
+
+def scenario_key(result) -> tuple:
+    return (result["endpoint"], result["batch_size"], result["concurrency"], result["hit_ratio"])
+
+
+def compare(baseline: dict, current: dict, threshold: float, key=scenario_key) -> list:
+    """
+    Flag scenarios whose p95 latency rose or throughput fell by more than threshold.
+    Args:
+        baseline (dict, required): Earlier benchmark output.
+        current (dict, required): New benchmark output.
+        threshold (float, required): Allowed relative change, e.g. 0.1 for 10%.
+        key (callable, optional): Identifies the same scenario in both outputs.
+    Returns:
+        List of regression descriptions; empty when nothing regressed.
+    """
+    previous = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        if result["p95_ms"] > old["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key(result)} p95 {old['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result["requests_per_s"] < old["requests_per_s"] * (1 - threshold):
+            regressions.append(f"{key(result)} throughput "
+                               f"{old['requests_per_s']:.1f}/s -> {result['requests_per_s']:.1f}/s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench.json", help="Where to write results")
+    parser.add_argument("--compare", help="Earlier results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change counted as a regression (default 0.1)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--hit-ratios", type=float, nargs="+", default=[0.0, 0.5, 0.9])
+    parser.add_argument("--redis-url", help="Use this Redis instead of fakeredis")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep admission control on; by default it is off so requests over its "
+                             "budgets are measured rather than refused")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_app(args.redis_url, args.admission)
+    report = asyncio.run(run_benchmark(args))
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Wrote {len(report['results'])} scenarios to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(json.load(baseline), report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Replay captured production traffic against the prediction endpoints.
+
+Reads capture files written by services running with CAPTURE_SAMPLE_RATE
+set, and sends the same requests, in the same order and with the same
+payloads, to src.main:app in-process. Requests start at their recorded
+arrival times divided by --speed, or as fast as --concurrency allows with
+--speed 0. Latency percentiles and throughput are reported per endpoint,
+next to the shape of the captured traffic and the latency it had in
+production.
+
+Usage:
+    python -m benchmarks.replay captures/*.bin --output replay.json
+    python -m benchmarks.replay captures/*.bin --output new.json --compare replay.json
+
+Redis is replaced by fakeredis by default (`pip install fakeredis`); pass
+--redis-url to replay against a local Redis instead.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_api import FEATURE_NAMES, compare, configure_app, metadata, percentiles, rss_mb
+from src.capture import read_capture
+
+
+def load_requests(paths, limit=None) -> list:
+    # Requests from every file, merged by arrival time; ties keep file order
+    requests = [request for path in paths for request in read_capture(path)]
+    requests.sort(key=lambda request: request["time"])
+    return requests[:limit] if limit else requests
+
+
+def traffic_shape(requests) -> dict:
+    """
+    Describe captured traffic: mix of endpoints, batch sizes, how often rows
+    repeat earlier ones, and the cache hits and latency recorded in production.
+    """
+    if not requests:
+        return {"requests": 0}
+    rows = sum(request["rows"] for request in requests)
+    features = np.concatenate([request["features"] for request in requests])
+    distinct = len(np.unique(features + 0.0, axis=0))
+    bulk_sizes = [request["rows"] for request in requests if request["endpoint"] == "/bulk-predict"]
+    endpoints = sorted({request["endpoint"] for request in requests})
+    return {
+        "requests": len(requests),
+        "rows": rows,
+        "duration_s": requests[-1]["time"] - requests[0]["time"],
+        "endpoints": {endpoint: sum(request["endpoint"] == endpoint for request in requests)
+                      for endpoint in endpoints},
+        "bulk_batch_size": ({"p50": float(np.percentile(bulk_sizes, 50)),
+                             "p95": float(np.percentile(bulk_sizes, 95)), "max": max(bulk_sizes)}
+                            if bulk_sizes else None),
+        "duplicate_row_ratio": 1 - distinct / rows,
+        "recorded_cache_hit_ratio": sum(request["cache_hits"] for request in requests) / rows,
+        "recorded_latency": {endpoint: percentiles([request["latency"] for request in requests
+                                                    if request["endpoint"] == endpoint])
+                             for endpoint in endpoints},
+    }
+
+
+def payload(request) -> bytes:
+    # Floats are written with repr, so the replayed values are the captured ones exactly
+    houses = [dict(zip(FEATURE_NAMES, row)) for row in request["features"].tolist()]
+    if request["endpoint"] == "/predict":
+        return json.dumps(houses[0]).encode()
+    return json.dumps({"houses": houses}).encode()
+
+
+async def replay(client, requests, speed, concurrency):
+    """
+    Send captured requests and time each one.
+    Returns:
+        (list of (endpoint, rows, latency, status) in completion order, elapsed seconds)
+    """
+    bodies = [payload(request) for request in requests]
+    outcomes = []
+
+    async def send(request, body):
+        started = time.perf_counter()
+        response = await client.post(f"/lab{request['endpoint']}", content=body,
+                                     headers={"content-type": "application/json"})
+        outcomes.append((request["endpoint"], request["rows"], time.perf_counter() - started,
+                         response.status_code))
+
+    started = time.perf_counter()
+    if speed > 0:
+        # Open loop: requests start on the recorded schedule whether or not earlier ones finished
+        first = requests[0]["time"] if requests else 0
+        tasks = []
+        for request, body in zip(requests, bodies):
+            delay = (request["time"] - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.get_running_loop().create_task(send(request, body)))
+        await asyncio.gather(*tasks)
+    else:
+        queue = iter(zip(requests, bodies))
+
+        async def worker():
+            for request, body in queue:
+                await send(request, body)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return outcomes, time.perf_counter() - started
+
+
+def summarize(outcomes, elapsed) -> list:
+    results = []
+    for endpoint in sorted({outcome[0] for outcome in outcomes}):
+        selected = [outcome for outcome in outcomes if outcome[0] == endpoint]
+        # Throughput counts served requests only; refused ones would inflate it
+        served = [outcome for outcome in selected if outcome[3] == 200]
+        results.append({
+            "endpoint": endpoint,
+            "requests": len(selected),
+            "errors": len(selected) - len(served),
+            **percentiles([latency for _, _, latency, _ in selected]),
+            "requests_per_s": len(served) / elapsed,
+            "rows_per_s": sum(rows for _, rows, _, _ in served) / elapsed,
+        })
+    return results
+
+
+async def run_replay(args) -> dict:
+    import httpx
+
+    from src.main import app
+
+    requests = load_requests(args.captures, args.limit)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+            outcomes, elapsed = await replay(client, requests, args.speed, args.concurrency)
+    return {"meta": {**metadata(), "speed": args.speed, "concurrency": args.concurrency,
+                     "captures": args.captures},
+            "capture": traffic_shape(requests),
+            "elapsed_s": elapsed,
+            "rss_mb": rss_mb(),
+            "results": summarize(outcomes, elapsed)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="Capture files to replay")
+    parser.add_argument("--output", default="replay.json", help="Where to write results")
+    parser.add_argument("--compare", help="Earlier replay results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change counted as a regression (default 0.1)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Multiple of the recorded request rate; 0 sends as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="Requests in flight when --speed is 0")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--redis-url", help="Use this Redis instead of fakeredis")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep admission control on; by default it is off so requests over its "
+                             "budgets are measured rather than refused")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_app(args.redis_url, args.admission)
+    report = asyncio.run(run_replay(args))
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(json.dumps(report["results"]), file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(json.load(baseline), report, args.threshold,
+                                  key=lambda result: result["endpoint"])
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import time
+from collections import deque
+from contextvars import ContextVar
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from src.metrics import stage
+
+
+# Admission ticket of the request being handled, set by AdmissionMiddleware
+_request_ticket = ContextVar("request_ticket", default=None)
+
+
+class Rejected(Exception):
+    """Raised when a request cannot be admitted; carries its HTTP status."""
+
+    def __init__(self, status, detail, reason):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.reason = reason
+
+
+class PriorityClass:
+    """
+    Concurrency budget shared by a group of routes.
+    Requests over the budget wait in a FIFO queue for up to max_wait
+    seconds; when the queue is full or the wait runs out they are rejected,
+    so a saturated class answers quickly instead of piling up latency.
+    Args:
+        name (str, required): Label used in metrics.
+        concurrency (int, required): Requests handled at once.
+        max_queue (int, optional): Requests allowed to wait for a slot.
+        max_wait (float, optional): Seconds a request may wait for a slot.
+    """
+
+    def __init__(self, name, concurrency, max_queue=0, max_wait=0.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise Rejected(429, f"Too many {self.name} requests", "queue_full")
+        # Futures are created per wait, so the class is not bound to one event loop
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # A slot handed over by release() is ours even if the timeout fires with it
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            raise Rejected(429, f"Too many {self.name} requests", "timeout") from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter still waiting
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class AdmissionController:
+    """
+    Admit requests to the prediction routes.
+    Each route belongs to a priority class with its own concurrency budget,
+    so bulk traffic cannot take the slots of latency-sensitive requests.
+    Routes in no class (health, metrics, admin) are never queued or refused.
+    Handlers additionally reserve the rows they are about to score against
+    a cap shared by all requests.
+    Args:
+        classes (list[PriorityClass], required): Priority classes.
+        routes (dict, required): Route path (without the mount prefix) to class name.
+        max_rows (int, required): Rows reserved by in-flight requests at most.
+        retry_after (int, optional): Seconds clients are asked to wait when refused.
+        registry (MetricsRegistry, optional): Where admission metrics are recorded.
+    """
+
+    def __init__(self, classes, routes, max_rows, retry_after=1, registry=None):
+        self.classes = {priority.name: priority for priority in classes}
+        self.routes = routes
+        self.max_rows = max_rows
+        self.retry_after = retry_after
+        self.registry = registry
+        self.rows_in_flight = 0
+
+    def classify(self, path: str):
+        return self.classes.get(self.routes.get(path.rstrip("/") or "/"))
+
+    def reject(self, priority_name, error: Rejected):
+        if self.registry is not None:
+            self.registry.inc("admission_rejected_total",
+                              (("class", priority_name), ("reason", error.reason)))
+
+    def reserve_rows(self, rows: int):
+        if rows > self.max_rows:
+            raise Rejected(413, f"Batch of {rows} rows exceeds the limit of {self.max_rows}", "too_large")
+        if self.rows_in_flight + rows > self.max_rows:
+            raise Rejected(503, "Too many rows in flight", "rows")
+        self.rows_in_flight += rows
+
+    def release_rows(self, rows: int):
+        self.rows_in_flight -= rows
+
+    def record(self):
+        if self.registry is None:
+            return
+        for name, priority in self.classes.items():
+            self.registry.set_gauge("admission_in_flight", priority.in_flight, (("class", name),))
+            self.registry.set_gauge("admission_queued", priority.queued, (("class", name),))
+        self.registry.set_gauge("admission_rows_in_flight", self.rows_in_flight)
+
+    def stats(self) -> dict:
+        return {
+            "classes": {name: {"concurrency": priority.concurrency, "in_flight": priority.in_flight,
+                               "queued": priority.queued, "max_queue": priority.max_queue}
+                        for name, priority in self.classes.items()},
+            "rows_in_flight": self.rows_in_flight,
+            "max_rows": self.max_rows,
+        }
+
+
+class Ticket:
+    # Rows held by one admitted request, released when it finishes
+    def __init__(self, controller, priority):
+        self.controller = controller
+        self.priority = priority
+        self.rows = 0
+
+
+def reserve_rows(rows: int):
+    """
+    Reserve rows for the current request against the in-flight row cap.
+    Does nothing outside a request admitted by AdmissionMiddleware.
+    Raises:
+        HTTPException: 413 if the batch can never fit, 503 if the cap is
+            currently reached; both with Retry-After.
+    """
+    ticket = _request_ticket.get()
+    if ticket is None:
+        return
+    controller = ticket.controller
+    try:
+        controller.reserve_rows(rows)
+    except Rejected as error:
+        controller.reject(ticket.priority.name, error)
+        raise HTTPException(status_code=error.status, detail=error.detail,
+                            headers={"Retry-After": str(controller.retry_after)}) from None
+    ticket.rows += rows
+    controller.record()
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting requests per priority class and refusing them
+    with 429 (class saturated) or 503 (row cap reached) and Retry-After.
+    Args:
+        app (ASGI app, required): Application to wrap.
+        controller (AdmissionController, required): Budgets to enforce.
+    """
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        priority = self.controller.classify(path)
+        if priority is None:
+            return await self.app(scope, receive, send)
+
+        controller = self.controller
+        started = time.perf_counter()
+        try:
+            # Queueing is its own stage, so it is not counted as body validation
+            with stage("admission"):
+                await priority.acquire()
+        except Rejected as error:
+            controller.reject(priority.name, error)
+            controller.record()
+            # Routing never ran; name the route so MetricsMiddleware can label the refusal
+            scope.setdefault("route", SimpleNamespace(path=path.rstrip("/") or "/"))
+            body = json.dumps({"detail": error.detail}).encode()
+            await send({"type": "http.response.start", "status": error.status,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode()),
+                                    (b"retry-after", str(controller.retry_after).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        if controller.registry is not None:
+            controller.registry.observe("admission_wait_seconds", time.perf_counter() - started,
+                                        (("class", priority.name),))
+
+        ticket = Ticket(controller, priority)
+        token = _request_ticket.set(ticket)
+        controller.record()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_ticket.reset(token)
+            controller.release_rows(ticket.rows)
+            priority.release()
+            controller.record()
@@ -0,0 +1,131 @@
+"""
+Precompiled model artifact.
+
+The fused predictor's arrays are written as one .npy file each next to a
+small JSON manifest, and loaded back with memory mapping. Loading needs
+neither sklearn nor unpickling, and every process that maps the same files
+shares their pages through the OS page cache.
+
+Usage:
+    python -m src.artifact --model model_pipeline.pkl --output model_artifact
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from src.cache import model_version
+from src.predictors import FusedSVRPredictor
+
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT = 1
+MANIFEST = "manifest.json"
+ARRAYS = ("fill", "center", "scale", "support_vectors", "support_vectors_t", "support_norms", "dual_coef")
+
+
+class StaleArtifact(Exception):
+    """Raised when an artifact is missing, malformed or built from another model."""
+
+
+def save_artifact(predictor: FusedSVRPredictor, path: str, source_version: str):
+    """
+    Write a predictor's arrays and scalars to an artifact directory.
+    The directory is replaced atomically, so a concurrent reader never sees
+    a partly written artifact.
+    Args:
+        predictor (FusedSVRPredictor, required): Predictor to store.
+        path (str, required): Artifact directory.
+        source_version (str, required): model_version() of the source pipeline.
+    """
+    staging = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name in ARRAYS:
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(getattr(predictor, name)))
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "source_version": source_version,
+        "intercept": predictor.intercept,
+        "gamma": predictor.gamma,
+        "chunk_size": predictor.chunk_size,
+    }
+    with open(os.path.join(staging, MANIFEST), "w") as output:
+        json.dump(manifest, output, indent=2)
+
+    previous = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def load_artifact(path: str, source_version: str = None) -> FusedSVRPredictor:
+    """
+    Load a predictor from an artifact directory with its arrays memory-mapped.
+    Args:
+        path (str, required): Artifact directory.
+        source_version (str, optional): Expected model_version() of the source
+            pipeline; a mismatch means the artifact is stale.
+    Returns:
+        FusedSVRPredictor
+    Raises:
+        StaleArtifact: If the artifact is missing, of another format or built
+            from a different model.
+    """
+    try:
+        with open(os.path.join(path, MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError) as exc:
+        raise StaleArtifact(f"No readable artifact at {path}: {exc}") from exc
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise StaleArtifact(f"Artifact format {manifest.get('format')} is not {ARTIFACT_FORMAT}")
+    if source_version is not None and manifest.get("source_version") != source_version:
+        raise StaleArtifact(f"Artifact was built from model {manifest.get('source_version')}, "
+                            f"not {source_version}")
+
+    try:
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+    except (OSError, ValueError) as exc:
+        raise StaleArtifact(f"Unreadable artifact arrays at {path}: {exc}") from exc
+    return FusedSVRPredictor(
+        intercept=manifest["intercept"],
+        gamma=manifest["gamma"],
+        chunk_size=manifest["chunk_size"],
+        **arrays,
+    )
+
+
+def build_artifact(model_path: str, path: str) -> FusedSVRPredictor:
+    """
+    Compile a pickled pipeline into an artifact directory.
+    Args:
+        model_path (str, required): Pickled imputer -> scaler -> RBF SVR pipeline.
+        path (str, required): Artifact directory to write.
+    Returns:
+        The FusedSVRPredictor that was stored.
+    """
+    from joblib import load
+
+    predictor = FusedSVRPredictor.from_pipeline(load(model_path))
+    save_artifact(predictor, path, model_version(model_path))
+    return predictor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--model", default="model_pipeline.pkl", help="Pickled pipeline to compile")
+    parser.add_argument("--output", default="model_artifact", help="Artifact directory to write")
+    args = parser.parse_args(argv)
+    predictor = build_artifact(args.model, args.output)
+    print(f"Wrote {len(predictor.dual_coef)} support vectors to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+
+from numpy import vstack
+
+from src.metrics import BATCH_SIZE_BUCKETS, LATENCY_BUCKETS, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchQueueFull(Exception):
+    """Raised when the batcher queue is at its configured depth."""
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-row predictions into one model call.
+    Rows are queued and flushed as a single matrix once either max_batch_size
+    rows are waiting or the oldest row has waited max_wait_us microseconds.
+    Args:
+        predict_fn (async callable, required): Takes an (N, 8) array and
+            returns N predictions.
+        max_batch_size (int, optional): Flush once this many rows are queued.
+        max_wait_us (int, optional): Flush once the first row in a batch has
+            waited this many microseconds.
+        max_queue_depth (int, optional): Reject new rows with BatchQueueFull
+            once this many rows are waiting.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_us=2000, max_queue_depth=1024):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1_000_000
+        self.queue = asyncio.Queue(maxsize=max_queue_depth)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+        self._worker = None
+
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Fail anything still queued so callers do not hang
+        while not self.queue.empty():
+            _, future, _ = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, row):
+        """
+        Queue a single feature row and wait for its prediction.
+        Args:
+            row (array, required): Feature vector of shape (8,).
+        Returns:
+            Prediction for the row as a float.
+        """
+        return await self.enqueue(row)
+
+    def enqueue(self, row) -> asyncio.Future:
+        # Queue a row without waiting; the future resolves to its prediction
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((row, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise BatchQueueFull("Prediction queue is full") from None
+        return future
+
+    async def _collect(self):
+        # Block for the first row, then fill the batch until size or time limit
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            flushed_at = time.perf_counter()
+            self.batch_size.observe(len(batch))
+            for _, _, enqueued_at in batch:
+                self.queue_wait.observe(flushed_at - enqueued_at)
+
+            try:
+                predictions = await self.predict_fn(vstack([row for row, _, _ in batch]))
+            except asyncio.CancelledError:
+                # The model call was cancelled, e.g. by a retired executor; fail only this batch
+                # and keep serving unless stop() is cancelling the worker itself
+                self._fail(batch, RuntimeError("Batched prediction was cancelled"))
+                if asyncio.current_task().cancelling():
+                    raise
+                logger.warning("Batched prediction was cancelled")
+                continue
+            except Exception as exc:
+                logger.exception("Batched prediction failed")
+                self._fail(batch, exc)
+                continue
+
+            for (_, future, _), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(float(prediction))
+
+    @staticmethod
+    def _fail(batch, exc):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
@@ -0,0 +1,529 @@
+import asyncio
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from src.metrics import LATENCY_BUCKETS, Histogram, stage
+
+
+class LRUCache:
+    """
+    Bounded in-process cache with least-recently-used eviction and a TTL.
+    Args:
+        max_entries (int, required): Evict once more entries than this are held.
+        max_bytes (int, required): Evict once stored values exceed this size.
+        ttl (float, required): Seconds an entry stays valid.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key) -> Tuple[float, Optional[str]]:
+        # Returns (seconds left, value) or (0, None) on a miss
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0, None
+        value, expires_at = entry
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            self._remove(key)
+            return 0, None
+        self._entries.move_to_end(key)
+        return remaining, value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None or ttl <= 0 else min(ttl, self.ttl)
+        if len(value) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self.size += len(value)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        self._remove(key)
+
+    def clear(self, prefix=None) -> int:
+        keys = [key for key in self._entries if prefix is None or key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+def model_version(path: str) -> str:
+    # Short content hash of the model artifact, so a new model gets new keys
+    digest = hashlib.blake2b(digest_size=6)
+    with open(path, "rb") as artifact:
+        for block in iter(lambda: artifact.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_precision(spec: str, feature_names) -> np.ndarray:
+    """
+    Parse per-field rounding precision for cache keys.
+    Args:
+        spec (str, required): Comma-separated "Field=decimals" pairs, optionally
+            with a bare number applied to every other field, e.g. "4,HouseAge=0".
+            An empty string disables rounding.
+        feature_names (tuple[str], required): Model column order.
+    Returns:
+        Array of decimals per feature, NaN where values are not rounded.
+    """
+    default = np.nan
+    fields = {}
+    for token in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, decimals = token.rpartition("=")
+        if not name:
+            default = int(decimals)
+        elif name in feature_names:
+            fields[name] = int(decimals)
+        else:
+            raise ValueError(f"Unknown cache key field: {name}")
+    return np.array([fields.get(name, default) for name in feature_names], dtype=float)
+
+
+class FeatureKeyBuilder:
+    """
+    Canonical cache keys built from the feature values instead of their text.
+    Each row is rounded per field, packed as eight little-endian float64s and
+    hashed, so 41, 41.0 and (with rounding) 41.00000001 share a key. The model
+    version is part of every key.
+    Args:
+        feature_names (tuple[str], required): Model column order.
+        precision (array, optional): Decimals per feature from parse_precision.
+        version (str, optional): Model version from model_version.
+    """
+
+    def __init__(self, feature_names, precision=None, version=""):
+        self.feature_names = tuple(feature_names)
+        if precision is None:
+            precision = np.full(len(self.feature_names), np.nan)
+        self.rounded = ~np.isnan(precision)
+        self.scale = np.where(self.rounded, 10.0 ** np.nan_to_num(precision), 1.0)
+        self.version = version
+
+    def canonical(self, features) -> np.ndarray:
+        # Rounded float64 rows with -0.0 folded into 0.0
+        rows = np.array(features, dtype="<f8", ndmin=2)
+        if self.rounded.any():
+            rows = np.where(self.rounded, np.round(rows * self.scale) / self.scale, rows)
+        return rows + 0.0
+
+    def row_keys(self, features, prefix: str, namespace: str = "row") -> list:
+        """
+        Build one key per feature row.
+        Returns:
+            List of N keys; rows that canonicalize identically share a key.
+        """
+        return [f"{prefix}:{namespace}:{self.version}:"
+                f"{hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()}"
+                for row in self.canonical(features)]
+
+    def __call__(self, func, namespace="", request=None, response=None, args=None, kwargs=None):
+        # fastapi_cache key_builder for endpoints taking a HousingPrediction as `data`
+        from fastapi_cache import FastAPICache
+
+        data = (kwargs or {}).get("data")
+        features = [getattr(data, name) for name in self.feature_names]
+        return self.row_keys(features, FastAPICache.get_prefix(), namespace or func.__name__)[0]
+
+    def batch_key(self, features, prefix: str, namespace: str = "batch") -> str:
+        # One key for a whole feature matrix; the same rows in another order get another key
+        digest = hashlib.blake2b(self.canonical(features).tobytes(), digest_size=16).hexdigest()
+        return f"{prefix}:{namespace}:{self.version}:{digest}"
+
+
+class PredictionCodec:
+    """
+    Compact binary cache values for predictions.
+    Predictions are stored as little-endian float64 or float32 bytes after a
+    one-byte header naming the format, and values of at least
+    compress_min_bytes are zlib-compressed when that makes them smaller.
+    Decoding is a copy out of the buffer instead of parsing text. Values
+    written as text by earlier releases still decode.
+    Args:
+        dtype (str, optional): "float64" or "float32"; float32 halves the size
+            and keeps about seven significant digits.
+        compress_min_bytes (int, optional): Smallest value compressed; 0 disables compression.
+        level (int, optional): zlib compression level.
+    """
+
+    FORMATS = {b"d": ("<f8", False), b"f": ("<f4", False), b"D": ("<f8", True), b"F": ("<f4", True)}
+
+    def __init__(self, dtype="float64", compress_min_bytes=4096, level=1):
+        if dtype not in ("float64", "float32"):
+            raise ValueError(f"Unsupported cache dtype: {dtype}")
+        self.dtype = np.dtype("<f8" if dtype == "float64" else "<f4")
+        self.header = b"d" if dtype == "float64" else b"f"
+        self.compress_min_bytes = compress_min_bytes
+        self.level = level
+
+    def encode(self, predictions) -> bytes:
+        data = np.ascontiguousarray(predictions, dtype=self.dtype).tobytes()
+        if self.compress_min_bytes and len(data) >= self.compress_min_bytes:
+            compressed = zlib.compress(data, self.level)
+            # Float bits rarely compress well; only keep it when the saving pays for decompression
+            if len(compressed) < 0.8 * len(data):
+                return self.header.upper() + compressed
+        return self.header + data
+
+    def decode(self, value) -> np.ndarray:
+        if isinstance(value, str):
+            value = value.encode()
+        fmt = self.FORMATS.get(value[:1])
+        if fmt is None:
+            # Text written by releases before the binary format
+            return np.array([float(value)])
+        dtype, compressed = fmt
+        data = zlib.decompress(value[1:]) if compressed else memoryview(value)[1:]
+        return np.frombuffer(data, dtype=dtype).astype(np.float64)
+
+    def encode_rows(self, predictions) -> list:
+        # One uncompressed value per prediction, for per-row cache entries
+        data = np.ascontiguousarray(predictions, dtype=self.dtype).tobytes()
+        size = self.dtype.itemsize
+        return [self.header + data[start:start + size] for start in range(0, len(data), size)]
+
+    def decode_rows(self, values) -> np.ndarray:
+        """
+        Decode per-row values from encode_rows.
+        Returns:
+            Array of predictions in value order, NaN where a value is None.
+        """
+        sizes = set(map(len, values)) if None not in values else ()
+        if len(sizes) == 1 and values[0][:1] == self.header and sizes == {1 + self.dtype.itemsize}:
+            # Every row hit in the current format: decode all of them with one copy
+            rows = np.frombuffer(b"".join(values), dtype=[("header", "S1"), ("value", self.dtype)])
+            if (rows["header"] == self.header).all():
+                return rows["value"].astype(np.float64)
+        return np.array([np.nan if value is None else self.decode(value)[0] for value in values])
+
+
+def redis_client(url: str, max_connections: int, timeout: float, **kwargs) -> Redis:
+    """
+    Redis client over an explicitly sized connection pool.
+    Once max_connections are in use, commands wait up to timeout seconds for
+    one to be returned and then fail with ConnectionError, instead of opening
+    connections without bound under load.
+    Args:
+        url (str, required): Redis URL.
+        max_connections (int, required): Connections opened at most.
+        timeout (float, required): Seconds to wait for a free connection.
+        kwargs: Connection options, e.g. socket_connect_timeout.
+    """
+    pool = BlockingConnectionPool.from_url(url, max_connections=max_connections, timeout=timeout, **kwargs)
+    return Redis(connection_pool=pool)
+
+
+class PipelinedRedisBackend(RedisBackend):
+    """
+    RedisBackend with multi-key reads and pipelined multi-key writes.
+    Give it a client without decode_responses, so binary values from
+    PredictionCodec come back as bytes.
+    """
+
+    async def get_many(self, keys: list) -> list:
+        if not keys:
+            return []
+        return await self.redis.mget(keys)
+
+    async def set_many(self, mapping: dict, expire: int = None):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=expire)
+            return await pipe.execute()
+
+
+class CircuitBreakerBackend(Backend):
+    """
+    Wrap a remote backend with per-operation timeouts and a circuit breaker.
+    Every operation is bounded by `timeout`; errors and timeouts count as
+    failures and are reported to the caller as cache misses. After
+    `failure_threshold` consecutive failures the breaker opens and operations
+    return immediately without touching the remote, while a background task
+    probes it every `probe_interval` seconds and closes the breaker once a
+    probe succeeds.
+    Args:
+        remote (Backend, required): Backend to protect, e.g. PipelinedRedisBackend.
+        timeout (float, optional): Seconds allowed per operation.
+        failure_threshold (int, optional): Consecutive failures that open the breaker.
+        probe_interval (float, optional): Seconds between recovery probes.
+    """
+
+    def __init__(self, remote, timeout=0.05, failure_threshold=5, probe_interval=1.0):
+        self.remote = remote
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.state = "closed"
+        self.failures = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.counters = {"errors": 0, "timeouts": 0, "short_circuits": 0, "opened": 0}
+        self._probe_task = None
+
+    async def _call(self, operation, default, *args):
+        if self.state == "open":
+            self.counters["short_circuits"] += 1
+            return default
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(operation(*args), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            self._record_failure()
+            return default
+        except (RedisError, OSError):
+            self.counters["errors"] += 1
+            self._record_failure()
+            return default
+        finally:
+            self.latency.observe(time.perf_counter() - started)
+        self.failures = 0
+        return result
+
+    def _record_failure(self):
+        self.failures += 1
+        if self.state == "closed" and self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.counters["opened"] += 1
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe())
+
+    async def _ping(self):
+        redis = getattr(self.remote, "redis", None)
+        if redis is not None:
+            return await redis.ping()
+        return await self.remote.get("__circuit_breaker_probe__")
+
+    async def _probe(self):
+        while self.state == "open":
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await asyncio.wait_for(self._ping(), self.timeout)
+            except (asyncio.TimeoutError, RedisError, OSError):
+                continue
+            self.failures = 0
+            self.state = "closed"
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str]]:
+        return await self._call(self.remote.get_with_ttl, (0, None), key)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._call(self.remote.get, None, key)
+
+    async def set(self, key: str, value: str, expire: int = None):
+        return await self._call(self.remote.set, None, key, value, expire)
+
+    async def get_many(self, keys: list) -> list:
+        return await self._call(self.remote.get_many, [None] * len(keys), keys)
+
+    async def set_many(self, mapping: dict, expire: int = None):
+        return await self._call(self.remote.set_many, None, mapping, expire)
+
+    async def clear(self, namespace: str = None, key: str = None) -> int:
+        return await self._call(self.remote.clear, 0, namespace, key)
+
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    def stats(self) -> dict:
+        return {"breaker_state": self.state, **self.counters,
+                "remote_latency_seconds": self.latency.snapshot()}
+
+
+class TieredBackend(Backend):
+    """
+    fastapi_cache backend with an in-process L1 in front of a remote backend.
+    L1 is filled on remote hits and on writes. With single_flight enabled,
+    concurrent misses on the same key wait for the first caller's result
+    instead of each computing it.
+    Args:
+        remote (Backend, required): Shared backend, e.g. RedisBackend.
+        l1 (LRUCache, required): In-process cache.
+        single_flight (bool, optional): Coalesce concurrent misses per key.
+        single_flight_timeout (float, optional): Seconds a waiter waits for the
+            first caller before computing the value itself. Waiters are woken
+            as soon as the first caller stores the value or its task ends.
+    """
+
+    def __init__(self, remote, l1, single_flight=True, single_flight_timeout=5.0):
+        self.remote = remote
+        self.l1 = l1
+        self.single_flight = single_flight
+        self.single_flight_timeout = single_flight_timeout
+        self.counters = {"l1_hits": 0, "l1_misses": 0, "remote_hits": 0, "remote_misses": 0,
+                         "single_flight_waits": 0}
+        self._inflight = {}
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str]]:
+        ttl, value = self.l1.get(key)
+        if value is not None:
+            self.counters["l1_hits"] += 1
+            return int(ttl), value
+        self.counters["l1_misses"] += 1
+
+        leader = self._inflight.get(key)
+        if leader is not None:
+            # Another request is already computing this key
+            self.counters["single_flight_waits"] += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(leader), self.single_flight_timeout)
+            except asyncio.TimeoutError:
+                return 0, None
+            ttl, value = self.l1.get(key)
+            if value is not None:
+                return int(ttl), value
+
+        ttl, value = await self.remote.get_with_ttl(key)
+        if value is not None:
+            self.counters["remote_hits"] += 1
+            self.l1.set(key, value, ttl)
+            return ttl, value
+        self.counters["remote_misses"] += 1
+
+        if self.single_flight and key not in self._inflight:
+            loop = asyncio.get_running_loop()
+            future = self._inflight[key] = loop.create_future()
+            # Released by set once the value is stored; if the caller raises or is
+            # cancelled first, the end of its task releases it, and the timer bounds both
+            task = asyncio.current_task()
+            if task is not None:
+                task.add_done_callback(lambda _: self._release(key, future))
+            loop.call_later(self.single_flight_timeout, self._release, key, future)
+        return 0, None
+
+    async def get(self, key: str) -> Optional[str]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: str, expire: int = None):
+        self.l1.set(key, value, expire)
+        try:
+            return await self.remote.set(key, value, expire)
+        finally:
+            self._release(key)
+
+    async def get_many(self, keys: list) -> list:
+        """
+        Look up several keys, going to the remote backend once for L1 misses.
+        Returns:
+            List of values in key order, None for keys found in neither tier.
+        """
+        values = []
+        missing = []
+        for index, key in enumerate(keys):
+            _, value = self.l1.get(key)
+            values.append(value)
+            if value is None:
+                missing.append(index)
+        self.counters["l1_hits"] += len(keys) - len(missing)
+        self.counters["l1_misses"] += len(missing)
+        if not missing:
+            return values
+
+        remote_values = await self.remote.get_many([keys[index] for index in missing])
+        for index, value in zip(missing, remote_values):
+            if value is not None:
+                self.l1.set(keys[index], value)
+                values[index] = value
+        remote_hits = sum(value is not None for value in remote_values)
+        self.counters["remote_hits"] += remote_hits
+        self.counters["remote_misses"] += len(missing) - remote_hits
+        return values
+
+    async def set_many(self, mapping: dict, expire: int = None):
+        for key, value in mapping.items():
+            self.l1.set(key, value, expire)
+        try:
+            return await self.remote.set_many(mapping, expire)
+        finally:
+            for key in mapping:
+                self._release(key)
+
+    async def clear(self, namespace: str = None, key: str = None) -> int:
+        if namespace:
+            self.l1.clear(namespace)
+        elif key:
+            self.l1.delete(key)
+        return await self.remote.clear(namespace, key)
+
+    def _release(self, key, future=None):
+        # Wake requests waiting on this key, unless it has since been taken by another leader
+        current = self._inflight.get(key)
+        if current is None or (future is not None and current is not future):
+            return
+        del self._inflight[key]
+        if not current.done():
+            current.set_result(None)
+
+    async def close(self):
+        if hasattr(self.remote, "close"):
+            await self.remote.close()
+
+    def stats(self) -> dict:
+        remote_stats = self.remote.stats() if hasattr(self.remote, "stats") else {}
+        return {**self.counters, "l1_entries": len(self.l1), "l1_bytes": self.l1.size, **remote_stats}
+
+
+class InstrumentedBackend(Backend):
+    """
+    Outermost backend layer that attributes cache reads and writes to the
+    current request's "cache_lookup" and "cache_write" stages.
+    Args:
+        backend (Backend, required): Backend to delegate to.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str]]:
+        with stage("cache_lookup"):
+            return await self.backend.get_with_ttl(key)
+
+    async def get(self, key: str) -> Optional[str]:
+        with stage("cache_lookup"):
+            return await self.backend.get(key)
+
+    async def get_many(self, keys: list) -> list:
+        with stage("cache_lookup"):
+            return await self.backend.get_many(keys)
+
+    async def set(self, key: str, value: str, expire: int = None):
+        with stage("cache_write"):
+            return await self.backend.set(key, value, expire)
+
+    async def set_many(self, mapping: dict, expire: int = None):
+        with stage("cache_write"):
+            return await self.backend.set_many(mapping, expire)
+
+    async def clear(self, namespace: str = None, key: str = None) -> int:
+        return await self.backend.clear(namespace, key)
+
+    async def close(self):
+        if hasattr(self.backend, "close"):
+            await self.backend.close()
+
+    def stats(self) -> dict:
+        return self.backend.stats()
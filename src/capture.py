@@ -0,0 +1,181 @@
+import logging
+import os
+import random
+import struct
+import time
+from contextvars import ContextVar
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Routes captured, by their code in the log
+ROUTES = ("/predict", "/bulk-predict")
+
+MAGIC = b"HPCAP\x00\x00\x01"
+# Capture start: wall-clock seconds
+FILE_HEADER = struct.Struct("<8sd")
+# Seconds since capture start, route code, unused, status, rows, rows served from cache, latency
+RECORD_HEADER = struct.Struct("<dBBHIIf")
+
+# Record of the sampled request being handled, set by CaptureMiddleware
+_capture_record = ContextVar("capture_record", default=None)
+
+
+class CaptureRecord:
+    __slots__ = ("route", "offset", "status", "latency", "features", "cache_hits")
+
+    def __init__(self, route, offset):
+        self.route = route
+        self.offset = offset
+        self.status = 0
+        self.latency = 0.0
+        self.features = None
+        self.cache_hits = 0
+
+
+def note(features=None, cache_hits=None):
+    """
+    Attach the request's decoded features and cache outcome to its capture
+    record. Does nothing for requests that are not being captured.
+    Args:
+        features (array, optional): Feature matrix of shape (N, 8) or one row.
+        cache_hits (int, optional): Rows answered from the cache.
+    """
+    record = _capture_record.get()
+    if record is None:
+        return
+    if features is not None:
+        record.features = features
+    if cache_hits is not None:
+        record.cache_hits = cache_hits
+
+
+class TrafficCapture:
+    """
+    Append sampled prediction requests to a compact binary log.
+    The log starts with a magic number and the capture's wall-clock start
+    time. Each request follows as a fixed 24-byte header (arrival offset,
+    route, status, rows, cache hits, latency) and its features as packed
+    little-endian float64 rows, about a third of their JSON size. Requests
+    without decoded features, such as validation failures, are not written.
+    Writes go to a large userspace buffer, so a sampled request costs a copy.
+    Each process writes its own file.
+    Args:
+        directory (str, required): Where capture files are created.
+        sample_rate (float, required): Share of requests captured, 0-1.
+        max_bytes (int, optional): Stop capturing once the file reaches this size.
+    """
+
+    def __init__(self, directory, sample_rate, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.path = None
+        self.records = 0
+        self.size = 0
+        self._file = None
+        self._started = None
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None and self.size < self.max_bytes
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"capture-{int(time.time())}-{os.getpid()}.bin")
+        self._file = open(self.path, "wb", buffering=1 << 20)
+        self._started = time.perf_counter()
+        self.size = self._file.write(FILE_HEADER.pack(MAGIC, time.time()))
+        self.records = 0
+        logger.info("Capturing %.1f%% of prediction requests to %s", self.sample_rate * 100, self.path)
+
+    def start(self, route: int) -> CaptureRecord:
+        return CaptureRecord(route, time.perf_counter() - self._started)
+
+    def write(self, record: CaptureRecord):
+        if record.features is None or not self.active:
+            return
+        features = np.ascontiguousarray(record.features, dtype="<f8").reshape(-1, 8)
+        self.size += self._file.write(RECORD_HEADER.pack(
+            record.offset, record.route, 0, record.status, len(features), record.cache_hits, record.latency))
+        self.size += self._file.write(features.tobytes())
+        self.records += 1
+        if not self.active:
+            logger.warning("Capture %s reached %d bytes; no longer capturing", self.path, self.max_bytes)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path):
+    """
+    Read a capture file.
+    Yields:
+        One dict per request: {"time": <WALL-CLOCK ARRIVAL>, "endpoint": <ROUTE>,
+        "status": <STATUS>, "rows": <ROWS>, "cache_hits": <ROWS FROM CACHE>,
+        "latency": <SECONDS>, "features": <ARRAY OF SHAPE (ROWS, 8)>}
+    Raises:
+        ValueError: If the file is not a capture.
+    """
+    with open(path, "rb") as capture:
+        magic, started = FILE_HEADER.unpack(capture.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = capture.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                # End of file, or a record cut short by a crash
+                return
+            offset, route, _, status, rows, cache_hits, latency = RECORD_HEADER.unpack(header)
+            data = capture.read(rows * 64)
+            if len(data) < rows * 64:
+                return
+            yield {"time": started + offset, "endpoint": ROUTES[route], "status": status, "rows": rows,
+                   "cache_hits": cache_hits, "latency": latency,
+                   "features": np.frombuffer(data, dtype="<f8").reshape(rows, 8)}
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware sampling /predict and /bulk-predict requests into a
+    TrafficCapture. Unsampled requests only cost one random draw.
+    Args:
+        app (ASGI app, required): Application to wrap.
+        capture (TrafficCapture, required): Log written to.
+    """
+
+    def __init__(self, app, capture):
+        self.app = app
+        self.capture = capture
+
+    async def __call__(self, scope, receive, send):
+        capture = self.capture
+        if scope["type"] != "http" or not capture.active or random.random() >= capture.sample_rate:
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        path = path.rstrip("/") or "/"
+        if path not in ROUTES:
+            return await self.app(scope, receive, send)
+
+        record = capture.start(ROUTES.index(path))
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                record.status = message["status"]
+            await send(message)
+
+        token = _capture_record.set(record)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _capture_record.reset(token)
+            record.latency = time.perf_counter() - started
+            capture.write(record)
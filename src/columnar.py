@@ -0,0 +1,294 @@
+import io
+import json
+import os
+import sys
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from src.responses import encode_predictions_json
+
+
+JSON = "application/json"
+RAW = "application/octet-stream"
+NPY = "application/x-npy"
+ARROW = "application/vnd.apache.arrow.stream"
+MEDIA_TYPES = (JSON, RAW, NPY, ARROW)
+
+# Formats of feature files, by extension
+FILE_TYPES = {".json": JSON, ".f64": RAW, ".npy": NPY, ".arrow": ARROW}
+
+# Valid ranges checked column-wise, matching HousingPrediction.check_latlong
+LATLONG_BOUNDS = {"Latitude": (-90, 90), "Longitude": (-180, 180)}
+
+
+def media_type(content_type: str | None) -> str:
+    # Strip parameters such as charset and reject unknown formats
+    media = (content_type or JSON).split(";")[0].strip().lower()
+    if media not in MEDIA_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported media type: {media}")
+    return media
+
+
+def _error(loc, msg, input_value=None, ctx=None):
+    error = {"type": "value_error", "loc": ["body", *loc], "msg": msg, "input": input_value}
+    if ctx is not None:
+        error["ctx"] = ctx
+    return error
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=415, detail="Arrow payloads require pyarrow") from None
+    return pyarrow
+
+
+def _from_columns(columns, feature_names):
+    errors = [_error((name,), "Field required") for name in feature_names if name not in columns]
+    errors += [_error((name,), "Extra inputs are not permitted") for name in columns
+               if name not in feature_names]
+    if errors:
+        raise RequestValidationError(errors)
+    arrays, errors = [], []
+    for name in feature_names:
+        # Without a dtype, nulls and strings give an object or string array instead of NaN
+        column = np.asarray(columns[name])
+        if column.dtype.kind not in "biuf" and column.size:
+            errors.append(_error((name,), "Input should be a valid number"))
+            continue
+        column = column.astype(np.float64)
+        if not np.isfinite(column).all():
+            errors.append(_error((name,), "Input should be a finite number"))
+        arrays.append(column)
+    if errors:
+        raise RequestValidationError(errors)
+    if any(column.ndim != 1 or len(column) != len(arrays[0]) for column in arrays):
+        raise RequestValidationError([_error((), "Columns must be flat and of equal length")])
+    return np.column_stack(arrays) if arrays[0].size else np.empty((0, len(feature_names)))
+
+
+def decode_features(body: bytes, media: str, feature_names) -> np.ndarray:
+    """
+    Decode a columnar payload into a float64 feature matrix.
+    Args:
+        body (bytes, required): Request body.
+        media (str, required): One of MEDIA_TYPES.
+        feature_names (tuple[str], required): Column order of the model.
+    Returns:
+        Feature matrix of shape (N, len(feature_names)).
+    """
+    n_features = len(feature_names)
+    if media == JSON:
+        try:
+            columns = json.loads(body)
+        except ValueError:
+            raise RequestValidationError([_error((), "JSON decode error")]) from None
+        if not isinstance(columns, dict):
+            raise RequestValidationError([_error((), "Input should be an object of columns")])
+        return _from_columns(columns, feature_names)
+
+    if media == RAW:
+        if len(body) % (8 * n_features):
+            raise RequestValidationError(
+                [_error((), f"Body must be little-endian float64 of shape (N, {n_features})")]
+            )
+        features = np.frombuffer(body, dtype="<f8").reshape(-1, n_features)
+        validate_finite(features, feature_names)
+        return features
+
+    if media == NPY:
+        try:
+            features = np.load(io.BytesIO(body), allow_pickle=False)
+            # .npz archives load as NpzFile, and string or object arrays do not convert
+            if not isinstance(features, np.ndarray) or features.dtype.kind not in "biuf":
+                raise ValueError("not a numeric array")
+            features = features.astype(np.float64, copy=False)
+        except ValueError:
+            raise RequestValidationError([_error((), "Body is not a valid .npy array")]) from None
+        if features.ndim != 2 or features.shape[1] != n_features:
+            raise RequestValidationError([_error((), f"Array must have shape (N, {n_features})")])
+        validate_finite(features, feature_names)
+        return features
+
+    pyarrow = _import_pyarrow()
+    try:
+        table = pyarrow.ipc.open_stream(body).read_all()
+    except pyarrow.ArrowInvalid:
+        raise RequestValidationError([_error((), "Body is not a valid Arrow IPC stream")]) from None
+    return _from_columns({name: table.column(name).to_numpy() for name in table.column_names},
+                         feature_names)
+
+
+def read_features(path: str, feature_names) -> np.ndarray:
+    """
+    Read and validate a feature file in one of FILE_TYPES.
+    .npy files are memory-mapped rather than read into memory.
+    Args:
+        path (str, required): File whose extension selects its format.
+        feature_names (tuple[str], required): Column order of the model.
+    Returns:
+        Feature matrix of shape (N, len(feature_names)).
+    """
+    media = FILE_TYPES.get(os.path.splitext(path)[1].lower())
+    if media is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {path}")
+    if media == NPY:
+        try:
+            features = np.load(path, mmap_mode="r", allow_pickle=False)
+            if not isinstance(features, np.ndarray) or features.dtype.kind not in "biuf":
+                raise ValueError("not a numeric array")
+        except ValueError:
+            raise RequestValidationError([_error((), "File is not a valid .npy array")]) from None
+        if features.ndim != 2 or features.shape[1] != len(feature_names):
+            raise RequestValidationError([_error((), f"Array must have shape (N, {len(feature_names)})")])
+        validate_finite(features, feature_names)
+    else:
+        with open(path, "rb") as input_file:
+            features = decode_features(input_file.read(), media, feature_names)
+    validate_latlong(features, feature_names)
+    return features
+
+
+def validate_finite(features: np.ndarray, feature_names, chunk_rows=65536):
+    """
+    Reject infinite and NaN values, which binary formats carry as they are.
+    Rows are checked chunk_rows at a time, so memory-mapped files are not
+    read into memory whole.
+    Raises:
+        RequestValidationError: With one error per offending column.
+    """
+    finite = np.ones(len(feature_names), dtype=bool)
+    for start in range(0, len(features), chunk_rows):
+        finite &= np.isfinite(features[start:start + chunk_rows]).all(axis=0)
+    if not finite.all():
+        raise RequestValidationError([_error((name,), "Input should be a finite number")
+                                      for name, ok in zip(feature_names, finite) if not ok])
+
+
+def latlong_errors(features: np.ndarray, feature_names, rows=None, loc=()) -> list:
+    """
+    Check latitude/longitude ranges over whole columns.
+    Args:
+        features (array, required): Feature matrix.
+        feature_names (tuple[str], required): Column order of features.
+        rows (array, optional): Row index reported for each row of features;
+            defaults to its position.
+        loc (tuple, optional): Location of the rows within the body.
+    Returns:
+        One pydantic-style error per offending row and field, ordered by row.
+    """
+    errors = []
+    for name, (low, high) in LATLONG_BOUNDS.items():
+        column = features[:, feature_names.index(name)]
+        # NaN fails both comparisons, as it does in the per-row validator
+        for row in np.flatnonzero(~((column >= low) & (column <= high))):
+            index = row.item() if rows is None else rows[row]
+            message = f"Invalid value for {name}"
+            errors.append(_error((*loc, index, name), f"Value error, {message}", column[row].item(),
+                                 {"error": ValueError(message)}))
+    errors.sort(key=lambda error: error["loc"][len(loc) + 1])
+    return errors
+
+
+def validate_latlong(features: np.ndarray, feature_names):
+    """
+    Check latitude/longitude ranges over whole columns.
+    Raises:
+        RequestValidationError: With one error per offending row and field.
+    """
+    errors = latlong_errors(features, feature_names)
+    if errors:
+        raise RequestValidationError(errors)
+
+
+def _plain_record(record, feature_names) -> bool:
+    # Exactly the expected keys, each holding a JSON number that fits a float64
+    return (type(record) is dict and len(record) == len(feature_names)
+            and all(type(record.get(name)) is float
+                    or (type(record.get(name)) is int and abs(record[name]) <= sys.float_info.max)
+                    for name in feature_names))
+
+
+def decode_records(records, model_class, feature_names, loc=()) -> np.ndarray:
+    """
+    Validate a list of record objects into a float64 feature matrix.
+    Records holding JSON numbers under exactly the expected keys are
+    converted and range-checked a column at a time. Any other record is
+    validated on its own with model_class, which either coerces it (numeric
+    strings, booleans) or reports its errors, so the errors match validating
+    list[model_class] field by field.
+    Args:
+        records (list, required): Decoded JSON records.
+        model_class (BaseModel, required): Pydantic model for a single record.
+        feature_names (tuple[str], required): Column order of the model.
+        loc (tuple, optional): Location of the list within the body.
+    Returns:
+        Feature matrix of shape (N, len(feature_names)).
+    Raises:
+        RequestValidationError: With the errors of every invalid record.
+    """
+    n_features = len(feature_names)
+    if not records:
+        return np.empty((0, n_features))
+    getter = itemgetter(*feature_names)
+
+    # Common case: every record is plain, checked without a Python-level loop
+    features = None
+    if set(map(type, records)) == {dict} and set(map(len, records)) == {n_features}:
+        try:
+            values = list(chain.from_iterable(map(getter, records)))
+            if set(map(type, values)) <= {float, int}:
+                features = np.array(values, dtype=np.float64).reshape(-1, n_features)
+        except (KeyError, OverflowError):
+            pass
+    if features is not None:
+        errors = latlong_errors(features, feature_names, loc=loc)
+        if errors:
+            raise RequestValidationError(errors)
+        return features
+
+    rows, plain, errors = [], [], []
+    for index, record in enumerate(records):
+        if _plain_record(record, feature_names):
+            plain.append(index)
+            rows.append(getter(record))
+            continue
+        try:
+            # from_attributes as FastAPI validates bodies, which shapes its error messages
+            record = model_class.model_validate(record, from_attributes=True)
+            rows.append(tuple(record.model_dump().values()))
+        except ValidationError as exc:
+            errors += [{**error, "loc": ("body", *loc, index, *error["loc"])}
+                       for error in exc.errors(include_url=False)]
+            rows.append((np.nan,) * n_features)
+    features = np.array(rows, dtype=np.float64)
+    errors += latlong_errors(features[plain], feature_names, rows=plain, loc=loc)
+    if errors:
+        errors.sort(key=lambda error: error["loc"][len(loc) + 1])
+        raise RequestValidationError(errors)
+    return features
+
+
+def encode_predictions(predictions: np.ndarray, media: str) -> bytes:
+    # Return predictions in the same format the request was sent in
+    if media == JSON:
+        return encode_predictions_json(predictions)
+    if media == RAW:
+        return predictions.astype("<f8", copy=False).tobytes()
+    if media == NPY:
+        buffer = io.BytesIO()
+        np.save(buffer, predictions.astype(np.float64, copy=False), allow_pickle=False)
+        return buffer.getvalue()
+    pyarrow = _import_pyarrow()
+    table = pyarrow.table({"prediction": predictions})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -1,19 +1,97 @@
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Request, Response, WebSocket
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
-from joblib import load
 from redis import asyncio
 from datetime import datetime
-from pydantic import BaseModel, ConfigDict, ValidationInfo, field_validator
-from numpy import array
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, ValidationInfo, field_validator, model_validator
+from typing import Any, Literal
+from numpy import array, zeros
 import os 
+import time
+
+from src.admission import AdmissionController, AdmissionMiddleware, PriorityClass, reserve_rows
+from src.artifact import StaleArtifact, load_artifact
+from src.batching import BatchQueueFull, MicroBatcher
+from src.capture import CaptureMiddleware, TrafficCapture, note
+from src.cache import (
+    CircuitBreakerBackend,
+    FeatureKeyBuilder,
+    InstrumentedBackend,
+    LRUCache,
+    PipelinedRedisBackend,
+    PredictionCodec,
+    TieredBackend,
+    model_version,
+    parse_precision,
+    redis_client,
+)
+from src.columnar import (
+    decode_features,
+    decode_records,
+    encode_predictions,
+    media_type,
+    read_features,
+    validate_latlong,
+)
+from src.inference import InferenceExecutor
+from src.jobs import FINISHED, JobQueueFull, JobRunner, MemoryJobStore, RedisJobStore
+from src.metrics import (
+    BATCH_SIZE_BUCKETS,
+    MetricsMiddleware,
+    MetricsRegistry,
+    process_uptime,
+    record_duration,
+    render_histogram,
+    stage,
+    timed_handler,
+)
+from src.models import ModelLoadError, ModelManager, ModelRoutingMiddleware, ServedModel
+from src.predictors import (
+    FusedSVRPredictor,
+    approximate_predictor,
+    build_predictor,
+    reduced_precision_predictor,
+    reference_features,
+)
+from src.profiling import ProfileStore, ProfilingMiddleware, collapsed, token_matches
+from src.responses import ResponseCoder, prediction_response, predictions_response
+from src.sessions import PredictionSession
+from src.streaming import NDJSON, DuplexStreamingResponse, iter_lines, predict_ndjson
+from src.warmup import HotInputs, warm_up
+from src.worker_state import StatePublisher, merge_stats, read_peers
 
 
 logger = logging.getLogger(__name__)
-model = None
+metrics = MetricsRegistry()
+
+MODEL_PATH = "model_pipeline.pkl"
+
+# Loaded model versions; requests are pinned to one by ModelRoutingMiddleware
+models = ModelManager(metrics)
+
+# Hot reload: new *.pkl files in MODEL_DIR are loaded, warmed and rolled out per MODEL_ROLLOUT
+# ("replace", "canary" or "shadow"); admin loads are also restricted to this directory
+MODEL_DIR = os.getenv("MODEL_DIR", "")
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+MODEL_ROLLOUT = os.getenv("MODEL_ROLLOUT", "replace")
+MODEL_CANDIDATE_PERCENT = float(os.getenv("MODEL_CANDIDATE_PERCENT", "10"))
+MODEL_REFERENCE_ROWS = int(os.getenv("MODEL_REFERENCE_ROWS", "256"))
+
+# Precompiled, memory-mapped form of MODEL_PATH built by `python -m src.artifact`
+MODEL_ARTIFACT_PATH = os.getenv("MODEL_ARTIFACT_PATH", "model_artifact")
+startup_report = None
+
+# (model, predictor) loaded and warmed by preload_model() before workers fork
+preloaded = None
+
+# Set by src.serve in multi-worker mode; workers publish their state here
+WORKER_STATE_DIR = os.getenv("WORKER_STATE_DIR")
+WORKER_STATE_INTERVAL = float(os.getenv("WORKER_STATE_INTERVAL", "1"))
+state_publisher = None
 
 # Select redis URL based on environment
 REDIS_URL = os.getenv("REDIS_URL")
@@ -22,28 +100,469 @@ if REDIS_URL is not None:
 else:
     LOCAL_REDIS_URL = "redis://localhost:6379/0" 
 
+# In-process L1 cache layered in front of Redis
+L1_CACHE_ENABLED = os.getenv("L1_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+L1_CACHE_MAX_ENTRIES = int(os.getenv("L1_CACHE_MAX_ENTRIES", "10000"))
+L1_CACHE_MAX_BYTES = int(os.getenv("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+L1_CACHE_TTL = float(os.getenv("L1_CACHE_TTL", "60"))
+CACHE_SINGLE_FLIGHT = os.getenv("CACHE_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+# Redis timeouts and circuit breaker; when open, predictions skip Redis entirely
+CACHE_TIMEOUT_MS = float(os.getenv("CACHE_TIMEOUT_MS", "50"))
+CACHE_FAILURE_THRESHOLD = int(os.getenv("CACHE_FAILURE_THRESHOLD", "5"))
+CACHE_PROBE_INTERVAL = float(os.getenv("CACHE_PROBE_INTERVAL", "1"))
+
+# Connections the prediction cache opens to Redis at most; commands wait CACHE_TIMEOUT_MS for a free one
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+
+# Cached predictions are packed "float64" or "float32" bytes, zlib-compressed from CACHE_COMPRESS_MIN_BYTES
+CACHE_VALUE_DTYPE = os.getenv("CACHE_VALUE_DTYPE", "float64")
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "4096"))
+codec = PredictionCodec(CACHE_VALUE_DTYPE, CACHE_COMPRESS_MIN_BYTES)
+
+# Bulk requests with at least this many rows also cache their whole result under one key; 0 disables
+CACHE_BATCH_MIN_ROWS = int(os.getenv("CACHE_BATCH_MIN_ROWS", "256"))
+
+# Most requested /predict inputs, shared through Redis; each new pod or model version precomputes
+# the top WARMUP_ROWS of them into the cache, spending at most WARMUP_BUDGET_MS before serving
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+WARMUP_ROWS = int(os.getenv("WARMUP_ROWS", "1000"))
+WARMUP_BUDGET_MS = float(os.getenv("WARMUP_BUDGET_MS", "2000"))
+HOT_INPUTS_CAPACITY = int(os.getenv("HOT_INPUTS_CAPACITY", "10000"))
+HOT_INPUTS_KEY = os.getenv("HOT_INPUTS_KEY", "housing:hot-inputs")
+HOT_INPUTS_FLUSH_INTERVAL = float(os.getenv("HOT_INPUTS_FLUSH_INTERVAL", "30"))
+hot_inputs = HotInputs(HOT_INPUTS_CAPACITY, HOT_INPUTS_KEY)
+
+# Per-field rounding for cache keys, e.g. "4" or "4,HouseAge=0,Latitude=2"; empty disables
+CACHE_KEY_PRECISION = os.getenv("CACHE_KEY_PRECISION", "")
+
+# Opt-in micro-batching of concurrent single predictions
+BATCHING_ENABLED = os.getenv("BATCHING_ENABLED", "false").lower() in ("1", "true", "yes")
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_US = int(os.getenv("BATCH_MAX_WAIT_US", "2000"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "1024"))
+batcher = None
+
+# WebSocket prediction sessions; records from every connection share one micro-batcher
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "256"))
+WS_BATCH_MAX_SIZE = int(os.getenv("WS_BATCH_MAX_SIZE", "256"))
+WS_BATCH_MAX_WAIT_US = int(os.getenv("WS_BATCH_MAX_WAIT_US", "1000"))
+WS_BATCH_MAX_QUEUE = int(os.getenv("WS_BATCH_MAX_QUEUE", "8192"))
+session_batcher = None
+
+# Executor that runs model.predict off the event loop ("inline", "thread" or "process")
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0")) or None
+
+# Serve from a fused NumPy predictor instead of the sklearn Pipeline when possible
+FAST_PREDICTOR = os.getenv("FAST_PREDICTOR", "true").lower() in ("1", "true", "yes")
+
+# Optional Nystroem approximation of the SVR, gated on its error against the exact model
+APPROX_MODE = os.getenv("APPROX_MODE", "off")
+APPROX_COMPONENTS = int(os.getenv("APPROX_COMPONENTS", "1000"))
+APPROX_MAX_ERROR = float(os.getenv("APPROX_MAX_ERROR", "0.5"))
+APPROX_MEAN_ERROR = float(os.getenv("APPROX_MEAN_ERROR", "0.05"))
+approximation_report = None
+
+# Compute in "float32" to halve the model's working set; gated on its error against float64
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "float64")
+PRECISION_MAX_ERROR = float(os.getenv("PRECISION_MAX_ERROR", "0.001"))
+precision_report = None
+
+# Rows per model call and longest accepted record for streamed bulk predictions
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "512"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", "65536"))
+
+# Admission control: concurrency budgets per priority class and a cap on rows being scored.
+# Saturated classes answer 429, a full row budget 503, both with Retry-After
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_INTERACTIVE_CONCURRENCY = int(os.getenv("ADMISSION_INTERACTIVE_CONCURRENCY", "64"))
+ADMISSION_INTERACTIVE_QUEUE = int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "256"))
+ADMISSION_BULK_CONCURRENCY = int(os.getenv("ADMISSION_BULK_CONCURRENCY", "4"))
+ADMISSION_BULK_QUEUE = int(os.getenv("ADMISSION_BULK_QUEUE", "8"))
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", "100"))
+ADMISSION_MAX_ROWS = int(os.getenv("ADMISSION_MAX_ROWS", "100000"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+admission = AdmissionController(
+    [
+        PriorityClass("interactive", ADMISSION_INTERACTIVE_CONCURRENCY, ADMISSION_INTERACTIVE_QUEUE,
+                      ADMISSION_MAX_WAIT_MS / 1000),
+        PriorityClass("bulk", ADMISSION_BULK_CONCURRENCY, ADMISSION_BULK_QUEUE, ADMISSION_MAX_WAIT_MS / 1000),
+    ],
+    # Routes in no class, such as /health and /metrics, are always answered
+    {
+        "/predict": "interactive",
+        "/bulk-predict": "bulk",
+        "/bulk-predict/columnar": "bulk",
+        "/bulk-predict/stream": "bulk",
+        "/jobs": "bulk",
+    },
+    max_rows=ADMISSION_MAX_ROWS,
+    retry_after=ADMISSION_RETRY_AFTER,
+    registry=metrics,
+)
+
+# Background batch-scoring jobs; state and results live in Redis ("redis") or in-process ("memory")
+JOB_STORE = os.getenv("JOB_STORE", "redis")
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "2048"))
+JOB_MAX_RUNNING = int(os.getenv("JOB_MAX_RUNNING", "1"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "16"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "86400"))
+JOB_PAGE_MAX_ROWS = int(os.getenv("JOB_PAGE_MAX_ROWS", "10000"))
+# Directory of feature files jobs may read; empty disables file inputs
+JOB_INPUT_DIR = os.getenv("JOB_INPUT_DIR", "")
+jobs = None
+
+# Token for the lab/admin endpoints; PROFILE_ADMIN_TOKEN is its earlier name
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or os.getenv("PROFILE_ADMIN_TOKEN")
+
+# Opt-in sampled capture of /predict and /bulk-predict traffic for `python -m benchmarks.replay`
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0"))
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+CAPTURE_MAX_MB = float(os.getenv("CAPTURE_MAX_MB", "256"))
+capture = TrafficCapture(CAPTURE_DIR, CAPTURE_SAMPLE_RATE, int(CAPTURE_MAX_MB * 1024 * 1024))
+
+# Opt-in request profiling; the middleware is only installed when sampling or on-demand profiling is on
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Profile requests sent with X-Profile: <ADMIN_TOKEN>; the token alone no longer installs the profiler
+PROFILE_ON_DEMAND = os.getenv("PROFILE_ON_DEMAND", "false").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+profiles = ProfileStore(PROFILE_KEEP)
+
+
+def load_model(path, version=None):
+    # Prefer the artifact compiled from this pickle; unpickling imports all of sklearn
+    if FAST_PREDICTOR and MODEL_ARTIFACT_PATH:
+        try:
+            return load_artifact(MODEL_ARTIFACT_PATH, version or model_version(path))
+        except StaleArtifact as exc:
+            logger.warning("Loading %s instead of the precompiled artifact: %s", path, exc)
+    from joblib import load
+
+    return load(path)
+
+
+def prepare_predictor(pipeline):
+    # Build the predictor served for a loaded pipeline; also run by process workers
+    global approximation_report, precision_report
+    serving = build_predictor(pipeline) if FAST_PREDICTOR else pipeline
+    if APPROX_MODE == "nystroem":
+        serving, approximation_report = approximate_predictor(
+            serving, APPROX_COMPONENTS, APPROX_MAX_ERROR, APPROX_MEAN_ERROR
+        )
+    if INFERENCE_PRECISION == "float32":
+        serving, precision_report = reduced_precision_predictor(serving, PRECISION_MAX_ERROR)
+    return serving
+
+
+def preload_model():
+    """
+    Load the model and run one prediction so its arrays are paged in.
+    Called by src.serve before forking; workers then reuse the model
+    through copy-on-write memory instead of loading their own copy.
+    """
+    global preloaded
+    model = load_model(MODEL_PATH)
+    predictor = prepare_predictor(model)
+    predictor.predict(zeros((1, len(FEATURE_NAMES))))
+    preloaded = (model, predictor)
+
+
+def build_served_model(path, version=None, stages=None, loaded=None):
+    """
+    Load a model version and set up everything needed to serve it.
+    Args:
+        path (str, required): Pickled pipeline.
+        version (str, optional): model_version(path); computed when omitted.
+        stages (dict, optional): Receives model_load/predictor/executor durations.
+        loaded (tuple, optional): (model, predictor) from preload_model().
+    Returns:
+        ServedModel
+    """
+    stages = {} if stages is None else stages
+    version = version or model_version(path)
+    if loaded is not None:
+        model, predictor = loaded
+    else:
+        with record_duration(stages, "model_load"):
+            model = load_model(path, version)
+        with record_duration(stages, "predictor"):
+            predictor = prepare_predictor(model)
+    with record_duration(stages, "executor"):
+        executor = InferenceExecutor(
+            predictor,
+            kind=INFERENCE_EXECUTOR,
+            workers=INFERENCE_WORKERS,
+            model_path=path,
+            prepare=prepare_predictor,
+            loader=load_model,
+        )
+    precision = precision_report if INFERENCE_PRECISION == "float32" else None
+    # Cache keys are canonical feature values plus the model version, and the
+    # float type when it is not float64, so float32 pods never serve float64 entries
+    key_version = f"{version}:{precision['dtype']}" if precision and precision["active"] else version
+    key_builder = FeatureKeyBuilder(
+        FEATURE_NAMES,
+        parse_precision(CACHE_KEY_PRECISION, FEATURE_NAMES),
+        key_version,
+    )
+    approximation = approximation_report if APPROX_MODE == "nystroem" else None
+    return ServedModel(version, path, model, predictor, executor, key_builder, approximation, precision)
+
+
+def reference_batch():
+    # Rows used to warm a new model version and compare it with the active one
+    active = models.active
+    if active is not None and isinstance(active.predictor, FusedSVRPredictor):
+        return reference_features(active.predictor, size=MODEL_REFERENCE_ROWS)
+    return array([[8.3252, 41.0, 6.984127, 1.02381, 322.0, 2.555556, 37.88, -122.23]])
+
+
+async def predict_rows(features):
+    # Run the request's model version over a feature matrix of shape (N, 8)
+    served = models.current()
+    metrics.observe("model_batch_rows", len(features), buckets=BATCH_SIZE_BUCKETS)
+    metrics.inc("model_rows_total", (("version", served.version),), len(features))
+    with stage("model"):
+        predictions = await served.predict(features)
+    models.shadow(served, features, predictions)
+    return predictions
+
+
+async def cached_predict_rows(features, batch_entry=True):
+    """
+    Predict a feature matrix using per-row cache entries.
+    All rows are looked up with one multi-key read, only the distinct missing
+    rows are sent to the model in a single call, and their predictions are
+    written back with one pipelined write. Batches of CACHE_BATCH_MIN_ROWS
+    or more are also cached whole, so repeating one costs a single read.
+    Args:
+        features (array, required): Feature matrix of shape (N, 8).
+        batch_entry (bool, optional): Allow the whole-batch entry; off for
+            batches that are not expected to repeat.
+    Returns:
+        Array of N predictions in row order.
+    """
+    backend = FastAPICache.get_backend()
+    key_builder = models.current().key_builder
+    batch_key = None
+    if batch_entry and CACHE_BATCH_MIN_ROWS and len(features) >= CACHE_BATCH_MIN_ROWS:
+        batch_key = key_builder.batch_key(features, FastAPICache.get_prefix())
+        cached_batch = await backend.get(batch_key)
+        if cached_batch is not None:
+            note(cache_hits=len(features))
+            return codec.decode(cached_batch)
+
+    keys = key_builder.row_keys(features, FastAPICache.get_prefix())
+    # Redis failures surface as misses through the circuit breaker
+    cached = await backend.get_many(keys)
+    predictions = codec.decode_rows(cached)
+    missing = {}
+    for index, (key, value) in enumerate(zip(keys, cached)):
+        if value is None:
+            missing.setdefault(key, []).append(index)
+
+    note(cache_hits=len(keys) - sum(map(len, missing.values())))
+    writes = {}
+    if missing:
+        first_rows = [indices[0] for indices in missing.values()]
+        computed = await predict_rows(features[first_rows])
+        for indices, prediction in zip(missing.values(), computed):
+            predictions[indices] = prediction
+        writes = dict(zip(missing, codec.encode_rows(computed)))
+    if batch_key is not None:
+        writes[batch_key] = codec.encode(predictions)
+    if writes:
+        await backend.set_many(writes, FastAPICache.get_expire())
+    return predictions
+
+
+async def predict_session_rows(features):
+    # A session batch mixes records from many clients: count them as hot inputs and
+    # look them all up in the cache with one read instead of a round trip per record
+    if WARMUP_ENABLED:
+        for row in features.tolist():
+            hot_inputs.record(tuple(row))
+    # Batches run outside any request, so hold the active version until the batch is done
+    with models.serving_active():
+        if FastAPICache.get_enable():
+            return await cached_predict_rows(features, batch_entry=False)
+        return await predict_rows(features)
+
+
+def predict_cache_key(func, namespace="", **kwargs):
+    # Every cached /predict lookup passes here, hits included, so count its input for warm-up
+    # and capture; the handler body corrects the capture's cache outcome on a miss
+    data = (kwargs.get("kwargs") or {}).get("data")
+    row = tuple(getattr(data, name) for name in FEATURE_NAMES)
+    if WARMUP_ENABLED:
+        hot_inputs.record(row)
+    note(features=row, cache_hits=1)
+    # Defer to the key builder of the model version serving this request
+    return models.current().key_builder(func, namespace, **kwargs)
+
+
+async def fill_cache(served) -> dict:
+    """
+    Precompute the most requested inputs with one model call and write their
+    /predict responses and per-row entries to every cache tier.
+    Args:
+        served (ServedModel, required): Version whose cache entries are filled.
+    Returns:
+        {"rows": <ROWS WRITTEN>}
+    """
+    features = await hot_inputs.top(WARMUP_ROWS)
+    if not len(features):
+        return {"rows": 0}
+    served.acquire()
+    try:
+        predictions = array(await served.predict(features), dtype=float)
+    finally:
+        served.release()
+    prefix = FastAPICache.get_prefix()
+    key_builder = served.key_builder
+    writes = dict(zip(key_builder.row_keys(features, prefix), codec.encode_rows(predictions)))
+    writes.update(zip(key_builder.row_keys(features, prefix, "predict-json"),
+                      (ResponseCoder.encode(prediction_response(prediction)) for prediction in predictions)))
+    await FastAPICache.get_backend().set_many(writes, FastAPICache.get_expire())
+    return {"rows": len(features)}
+
+
+async def warm_cache(served) -> dict:
+    # Set as models.warm_cache, so hot-reloaded versions are warmed before they serve
+    return await warm_up(fill_cache, served, WARMUP_BUDGET_MS / 1000, enabled=WARMUP_ENABLED)
+
 
 @asynccontextmanager
 async def lifespan_mechanism(app: FastAPI):
     logging.info("Starting up  API")
+    started = time.perf_counter()
+    # Time from process start to here: interpreter boot and imports
+    stages = {"boot": process_uptime()}
 
     # Load the Model on Startup
-    global model
-    model = load("model_pipeline.pkl")
+    global startup_report
+    served = build_served_model(MODEL_PATH, stages=stages, loaded=preloaded)
+    models.activate(served)
+    if MODEL_DIR:
+        models.start_watching(MODEL_DIR, MODEL_WATCH_INTERVAL, build_served_model, reference_batch,
+                              MODEL_ROLLOUT, MODEL_CANDIDATE_PERCENT)
 
     # Load the Redis Cache
     HOST_URL = LOCAL_REDIS_URL  
-    redis = asyncio.from_url(HOST_URL, encoding="utf8", decode_responses=True)
+    redis = asyncio.from_url(HOST_URL, encoding="utf8", decode_responses=True,
+                             socket_connect_timeout=CACHE_TIMEOUT_MS / 1000)
+    # Cached predictions are binary, so the cache gets its own client without decode_responses
+    cache_redis = redis_client(HOST_URL, REDIS_MAX_CONNECTIONS, CACHE_TIMEOUT_MS / 1000,
+                               socket_connect_timeout=CACHE_TIMEOUT_MS / 1000)
+
+    backend = CircuitBreakerBackend(
+        PipelinedRedisBackend(cache_redis),
+        timeout=CACHE_TIMEOUT_MS / 1000,
+        failure_threshold=CACHE_FAILURE_THRESHOLD,
+        probe_interval=CACHE_PROBE_INTERVAL,
+    )
+    if L1_CACHE_ENABLED:
+        backend = TieredBackend(
+            backend,
+            LRUCache(L1_CACHE_MAX_ENTRIES, L1_CACHE_MAX_BYTES, L1_CACHE_TTL),
+            single_flight=CACHE_SINGLE_FLIGHT,
+        )
+
+    FastAPICache.init(InstrumentedBackend(backend), prefix=<PREFIX>)
+
+    # Precompute the fleet's most requested inputs before reporting ready, within WARMUP_BUDGET_MS
+    warmup = None
+    if WARMUP_ENABLED:
+        hot_inputs.start(cache_redis, HOT_INPUTS_FLUSH_INTERVAL)
+        models.warm_cache = warm_cache
+        warmup = await warm_cache(served)
+        stages["warmup"] = warmup["seconds"]
+
+    # Background scoring jobs keep their JSON records through the text client
+    global jobs
+    store = MemoryJobStore(JOB_RESULT_TTL) if JOB_STORE == "memory" else RedisJobStore(redis, ttl=JOB_RESULT_TTL)
+    jobs = JobRunner(store, models, metrics, chunk_size=JOB_CHUNK_SIZE,
+                     max_running=JOB_MAX_RUNNING, max_pending=JOB_MAX_PENDING)
+
+    # Start the micro-batcher if enabled
+    global batcher
+    if BATCHING_ENABLED:
+        batcher = MicroBatcher(
+            predict_rows,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_us=BATCH_MAX_WAIT_US,
+            max_queue_depth=BATCH_MAX_QUEUE,
+        )
+        await batcher.start()
+    global session_batcher
+    session_batcher = MicroBatcher(
+        predict_session_rows,
+        max_batch_size=WS_BATCH_MAX_SIZE,
+        max_wait_us=WS_BATCH_MAX_WAIT_US,
+        max_queue_depth=WS_BATCH_MAX_QUEUE,
+    )
+    await session_batcher.start()
 
-    FastAPICache.init(RedisBackend(redis), prefix=<PREFIX>)
+    if CAPTURE_SAMPLE_RATE > 0:
+        capture.open()
+
+    # Share metrics and cache stats with sibling workers
+    global state_publisher
+    if WORKER_STATE_DIR:
+        state_publisher = StatePublisher(WORKER_STATE_DIR, worker_state, WORKER_STATE_INTERVAL)
+        await state_publisher.start()
+
+    stages["lifespan"] = time.perf_counter() - started
+    startup_report = {
+        "model_source": "artifact" if isinstance(served.model, FusedSVRPredictor) else "pickle",
+        "preloaded": preloaded is not None,
+        "stages_seconds": stages,
+        "warmup": warmup,
+    }
+    for name, seconds in stages.items():
+        if seconds is not None:
+            metrics.set_gauge("startup_stage_seconds", seconds, (("stage", name),))
+    logger.info("Startup finished: %s", startup_report)
 
     yield
 
+    if state_publisher is not None:
+        await state_publisher.stop()
+        state_publisher = None
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+    await session_batcher.stop()
+    session_batcher = None
+    capture.close()
+    await jobs.close()
+    jobs = None
+    await models.close()
+    await hot_inputs.stop()
+    await FastAPICache.get_backend().close()
+    await cache_redis.close(close_connection_pool=True)
+
     logging.info("Shutting down API")
 
 
 # Create instance of subapplication
 sub_application_housing_predict = FastAPI(lifespan=lifespan_mechanism)
+sub_application_housing_predict.add_middleware(ModelRoutingMiddleware, manager=models)
+if ADMISSION_ENABLED:
+    sub_application_housing_predict.add_middleware(AdmissionMiddleware, controller=admission)
+sub_application_housing_predict.add_middleware(MetricsMiddleware, registry=metrics)
+if CAPTURE_SAMPLE_RATE > 0:
+    sub_application_housing_predict.add_middleware(CaptureMiddleware, capture=capture)
+if PROFILE_SAMPLE_RATE > 0 or (PROFILE_ON_DEMAND and ADMIN_TOKEN):
+    sub_application_housing_predict.add_middleware(
+        ProfilingMiddleware,
+        store=profiles,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        admin_token=ADMIN_TOKEN if PROFILE_ON_DEMAND else None,
+        interval=PROFILE_INTERVAL_MS / 1000,
+    )
 
 
 # Define input model for single prediction
@@ -73,6 +592,10 @@ class HousingPrediction(BaseModel):
         return v
 
 
+# Column order expected by the model
+FEATURE_NAMES = tuple(HousingPrediction.model_fields)
+
+
 # Define output model for single prediction
 class Output(BaseModel):
     prediction: float
@@ -92,6 +615,20 @@ class MultiplePredictions(BaseModel):
         feature_vals = array(feature_vals)
         return feature_vals
 
+    # Validate a decoded request body straight into a feature matrix
+    @classmethod
+    def features_from_payload(cls, payload):
+        houses = payload.get("houses") if isinstance(payload, dict) else None
+        if isinstance(houses, list):
+            return decode_records(houses, HousingPrediction, FEATURE_NAMES, loc=("houses",))
+        # Malformed envelope: let pydantic describe it
+        try:
+            return cls.model_validate(payload, from_attributes=True).feature_array()
+        except ValidationError as exc:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+            ) from None
+
 # Define output model for multiple predictions
 class ListOutput(BaseModel):
     predictions: list[float]
@@ -106,10 +643,15 @@ async def health():
     Returns:
        Dynamic structure of
        {
-            "time": <CURRENT DATE/TIME>
+            "time": <CURRENT DATE/TIME>,
+            "approximation": <APPROXIMATE INFERENCE REPORT OR NULL>,
+            "precision": <REDUCED PRECISION REPORT OR NULL>
         }
     """
-    return {"time": datetime.now().isoformat()}
+    active = models.active
+    return {"time": datetime.now().isoformat(),
+            "approximation": active.approximation if active is not None else None,
+            "precision": active.precision if active is not None else None}
 
 
 @sub_application_housing_predict.get("/hello")
@@ -128,8 +670,362 @@ async def hello(name: str):
     return {"message": greeting}
 
 
+def worker_state() -> dict:
+    # This worker's state, as published to its siblings
+    return {
+        "metrics": metrics.snapshot(),
+        "cache": FastAPICache.get_backend().stats(),
+        "batching": batcher.stats() if batcher is not None else None,
+        "admission": admission.stats() if ADMISSION_ENABLED else None,
+    }
+
+
+def aggregated_state() -> dict:
+    """
+    Combine this worker's live state with the states its siblings last published.
+    Counters, histograms and cache/batching/admission stats are summed; gauges
+    get a worker label. Outside multi-worker mode this is this worker's state alone.
+    Returns:
+        {"registry": <MetricsRegistry>, "cache": <STATS>, "batching": <STATS OR NONE>,
+         "admission": <STATS OR NONE>}
+    """
+    states = [(os.getpid(), worker_state())]
+    if WORKER_STATE_DIR:
+        states += read_peers(WORKER_STATE_DIR)
+    registry = MetricsRegistry()
+    cache_stats, batching_stats, admission_stats = {}, None, None
+    for pid, state in states:
+        registry.merge(state["metrics"], (("worker", pid),) if WORKER_STATE_DIR else ())
+        merge_stats(cache_stats, state["cache"])
+        if state["batching"] is not None:
+            batching_stats = merge_stats(batching_stats or {}, state["batching"])
+        if state["admission"] is not None:
+            admission_stats = merge_stats(admission_stats or {}, state["admission"])
+    return {"registry": registry, "cache": cache_stats, "batching": batching_stats,
+            "admission": admission_stats}
+
+
+@sub_application_housing_predict.get("/cache")
+async def cache_stats():
+    """
+    Report prediction cache hit/miss counters per tier.
+    Args:
+        None
+    Returns:
+        {
+            "l1_hits": <COUNT>, "l1_misses": <COUNT>,
+            "remote_hits": <COUNT>, "remote_misses": <COUNT>,
+            "single_flight_waits": <COUNT>,
+            "l1_entries": <COUNT>, "l1_bytes": <BYTES>,
+            "breaker_state": <"closed" OR "open">,
+            "errors": <COUNT>, "timeouts": <COUNT>, "short_circuits": <COUNT>, "opened": <COUNT>,
+            "remote_latency_seconds": <HISTOGRAM OF REDIS OPERATION LATENCY>
+        }
+        The L1 fields are omitted when the L1 cache is disabled. In multi-worker
+        mode the counts are summed over workers and breaker_state is "mixed"
+        when workers disagree.
+    """
+    return aggregated_state()["cache"]
+
+
+@sub_application_housing_predict.get("/startup")
+async def startup():
+    """
+    Report how long startup took and where the model was loaded from.
+    Args:
+        None
+    Returns:
+        {
+            "model_source": <"artifact" OR "pickle">,
+            "preloaded": <TRUE WHEN LOADED BY THE MULTI-WORKER PARENT>,
+            "stages_seconds": {
+                "boot": <PROCESS START TO LIFESPAN START, NULL OFF LINUX>,
+                "model_load": <SECONDS>, "predictor": <SECONDS>, "executor": <SECONDS>,
+                "warmup": <SECONDS>, "lifespan": <TOTAL LIFESPAN STARTUP>
+            },
+            "warmup": {"status": <"warmed", "timeout" OR "failed">, "rows": <INPUTS PRECOMPUTED>,
+                       "seconds": <SECONDS>} OR NULL when disabled
+        }
+    """
+    return startup_report
+
+
+def _cache_metric_lines(stats) -> list:
+    lines = []
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            lines.append(f"# TYPE cache_{name} histogram")
+            lines += render_histogram(f"cache_{name}", value)
+        elif name == "breaker_state":
+            lines.append("# TYPE cache_breaker_open gauge")
+            lines.append(f"cache_breaker_open {int(value != 'closed')}")
+        else:
+            lines.append(f"# TYPE cache_{name} gauge")
+            lines.append(f"cache_{name} {value}")
+    return lines
+
+
+@sub_application_housing_predict.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Expose request, stage, cache and batching metrics in Prometheus text format.
+    Args:
+        None
+    Returns:
+        Prometheus exposition text including
+            http_requests_total{route, method, status}
+            http_requests_in_flight
+            http_request_duration_seconds{route}
+            http_request_stage_seconds{route, stage}: stage is one of validation,
+                cache_lookup, features, model, cache_write, serialization
+            model_batch_rows
+            startup_stage_seconds{stage}
+            cache_* counters and gauges
+            batcher_* histograms when micro-batching is enabled
+        In multi-worker mode series are summed over workers, except gauges,
+        which carry a worker label.
+    """
+    state = aggregated_state()
+    lines = [state["registry"].render().rstrip("\n")]
+    lines += _cache_metric_lines(state["cache"])
+    stats = state["batching"]
+    if stats is not None:
+        lines.append("# TYPE batcher_queue_depth gauge")
+        lines.append(f"batcher_queue_depth {stats['queue_depth']}")
+        for name in ("batch_size", "queue_wait_seconds"):
+            lines.append(f"# TYPE batcher_{name} histogram")
+            lines += render_histogram(f"batcher_{name}", stats[name])
+    return "\n".join(lines) + "\n"
+
+
+def require_admin(token: str | None):
+    # Admin endpoints do not exist unless an admin token is configured
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token_matches(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@sub_application_housing_predict.get("/admin/profiles")
+async def list_profiles(x_admin_token: str | None = Header(default=None)):
+    """
+    List recently captured request profiles.
+    Args:
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        {
+            "profiles": [{"id": <ID>, "path": <PATH>, "started": <UNIX TIME>,
+                          "duration_seconds": <FLOAT>, "sample_count": <INT>}, ...]
+        }
+    """
+    require_admin(x_admin_token)
+    return {"profiles": profiles.summary()}
+
+
+@sub_application_housing_predict.get("/admin/profiles/flamegraph", response_class=PlainTextResponse)
+async def profiles_flamegraph(x_admin_token: str | None = Header(default=None)):
+    """
+    Download the stack samples of all retained profiles, aggregated.
+    Args:
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        Collapsed stacks, one "thread;outer;...;inner <COUNT>" line per stack,
+        suitable for flamegraph.pl or speedscope.
+    """
+    require_admin(x_admin_token)
+    return collapsed(profiles.aggregate())
+
+
+@sub_application_housing_predict.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def download_profile(profile_id: int, x_admin_token: str | None = Header(default=None)):
+    """
+    Download one request profile.
+    Args:
+        profile_id (int, required): Id from the X-Profile-Id response header.
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        Collapsed stacks for the request in flamegraph format.
+    """
+    require_admin(x_admin_token)
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return collapsed(profile["samples"])
+
+
+# Define input model for loading a model version
+class ModelLoad(BaseModel):
+    name: str
+    rollout: Literal["replace", "canary", "shadow"] = "replace"
+    percent: float = Field(default=0.0, ge=0, le=100)
+
+    # Forbid extra inputs
+    model_config = ConfigDict(extra='forbid')
+
+
+# Define input model for changing how a candidate receives traffic
+class CandidateUpdate(BaseModel):
+    rollout: Literal["canary", "shadow"]
+    percent: float = Field(ge=0, le=100)
+
+    # Forbid extra inputs
+    model_config = ConfigDict(extra='forbid')
+
+
+def resolve_file(directory: str, name: str, kind: str) -> str:
+    # Only files directly inside the directory can be read
+    directory = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(directory, name))
+    if os.path.dirname(path) != directory or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"{kind} not found: {name}")
+    return path
+
+
+def resolve_model_path(name: str) -> str:
+    return resolve_file(MODEL_DIR or ".", name, "Model file")
+
+
+@sub_application_housing_predict.get("/admin/models")
+async def list_models(x_admin_token: str | None = Header(default=None)):
+    """
+    Describe the loaded model versions.
+    Args:
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        {
+            "active": {"version", "path", "loaded_at", "in_flight", "approximation", "precision"},
+            "candidate": <SAME FIELDS OR NULL>,
+            "rollout": <"canary" OR "shadow" OR NULL>,
+            "percent": <SHARE OF TRAFFIC FOR THE CANDIDATE OR NULL>,
+            "reports": {<VERSION>: <WARM-UP REPORT>, ...}
+        }
+    """
+    require_admin(x_admin_token)
+    return models.info()
+
+
+@sub_application_housing_predict.post("/admin/models")
+async def load_model_version(data: ModelLoad, x_admin_token: str | None = Header(default=None)):
+    """
+    Load a model file from MODEL_DIR, warm it and roll it out.
+    Args:
+        name (str, required): File name inside MODEL_DIR.
+        rollout (str, optional): "replace" (default) swaps it in once warm,
+            "canary" sends it `percent` of requests, "shadow" mirrors
+            `percent` of batches to it for comparison only.
+        percent (float, optional): 0 to 100.
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        {
+            "version": <VERSION>, "rollout": <ROLLOUT>, "percent": <PERCENT>,
+            "warm_seconds": <SECONDS>, "reference_rows": <ROWS>,
+            "max_abs_diff": <VS ACTIVE MODEL>, "mean_abs_diff": <VS ACTIVE MODEL>
+        }
+    """
+    require_admin(x_admin_token)
+    path = resolve_model_path(data.name)
+    try:
+        return await models.load(build_served_model, path, reference_batch(), data.rollout, data.percent)
+    except ModelLoadError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@sub_application_housing_predict.post("/admin/models/promote")
+async def promote_model(x_admin_token: str | None = Header(default=None)):
+    """
+    Make the candidate the active model. The previous version finishes its
+    in-flight requests and is then released.
+    Args:
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        Same structure as GET /admin/models.
+    """
+    require_admin(x_admin_token)
+    try:
+        models.promote()
+    except ModelLoadError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return models.info()
+
+
+@sub_application_housing_predict.patch("/admin/models/candidate")
+async def update_candidate(data: CandidateUpdate, x_admin_token: str | None = Header(default=None)):
+    """
+    Change how the candidate receives traffic, e.g. to ramp up a canary.
+    Args:
+        rollout (str, required): "canary" or "shadow".
+        percent (float, required): 0 to 100.
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        Same structure as GET /admin/models.
+    """
+    require_admin(x_admin_token)
+    if models.candidate is None:
+        raise HTTPException(status_code=409, detail="No candidate model")
+    models.rollout, models.percent = data.rollout, data.percent
+    return models.info()
+
+
+@sub_application_housing_predict.delete("/admin/models/candidate")
+async def discard_candidate(x_admin_token: str | None = Header(default=None)):
+    """
+    Stop routing traffic to the candidate and release it.
+    Args:
+        X-Admin-Token header (str, required): Must match ADMIN_TOKEN.
+    Returns:
+        Same structure as GET /admin/models.
+    """
+    require_admin(x_admin_token)
+    if models.candidate is None:
+        raise HTTPException(status_code=409, detail="No candidate model")
+    models.discard()
+    return models.info()
+
+
+@sub_application_housing_predict.get("/batching")
+async def batching():
+    """
+    Report micro-batcher histograms.
+    Args:
+        None
+    Returns:
+        {
+            "enabled": <BOOL>,
+            "queue_depth": <ROWS WAITING>,
+            "batch_size": <HISTOGRAM OF ROWS PER FLUSH>,
+            "queue_wait_seconds": <HISTOGRAM OF TIME SPENT QUEUED>
+        }
+    """
+    stats = aggregated_state()["batching"]
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
+
+@sub_application_housing_predict.get("/admission")
+async def admission_stats():
+    """
+    Report admission control budgets and their current use.
+    Args:
+        None
+    Returns:
+        {
+            "enabled": <BOOL>,
+            "classes": {<CLASS>: {"concurrency", "in_flight", "queued", "max_queue"}, ...},
+            "rows_in_flight": <ROWS BEING SCORED>,
+            "max_rows": <ROW CAP>
+        }
+    """
+    stats = aggregated_state()["admission"]
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
+
 @sub_application_housing_predict.post("/predict", response_model=Output)
-@cache()
+@timed_handler
+# Cached as rendered JSON; the namespace keeps entries from the earlier dict format apart
+@cache(key_builder=predict_cache_key, coder=ResponseCoder, namespace="predict-json")
 async def predict(data: HousingPrediction):
     """
     Obtain prediction for house value.
@@ -148,15 +1044,33 @@ async def predict(data: HousingPrediction):
             "prediction": <AVG HOUSE VALUE>
         }
     """
-    features = data.model_dump()
-    feature_values = array([x for x in features.values()]).reshape(-1, 8)
-    prediction = model.predict(feature_values)[0]
-    return {"prediction": prediction}
+    with stage("features"):
+        features = data.model_dump()
+        feature_values = array([x for x in features.values()])
+    note(features=feature_values, cache_hits=0)
+    # The batcher serves the active version; pinned or canary requests call their model directly
+    if batcher is not None and models.current() is models.active:
+        try:
+            prediction = await batcher.submit(feature_values)
+        except BatchQueueFull:
+            raise HTTPException(status_code=503, detail="Prediction queue is full",
+                                headers={"Retry-After": "1"})
+    else:
+        prediction = (await predict_rows(feature_values.reshape(-1, 8)))[0]
+    return prediction_response(prediction)
 
 
-@sub_application_housing_predict.post("/bulk-predict", response_model=ListOutput)
-@cache()
-async def multi_predict(data: MultiplePredictions):
+# The body is validated column-wise by MultiplePredictions.features_from_payload;
+# the schema is still documented as MultiplePredictions
+@sub_application_housing_predict.post(
+    "/bulk-predict",
+    response_model=ListOutput,
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {
+        "schema": MultiplePredictions.model_json_schema(ref_template="#/components/schemas/{model}")
+    }}}},
+)
+@timed_handler
+async def multi_predict(data: Any = Body()):
     """
     Obtain list of predictions for house values.
     Args:
@@ -175,6 +1089,241 @@ async def multi_predict(data: MultiplePredictions):
             "predictions": <List of AVG HOUSE VALUES>
         }
     """
-    features = data.feature_array()
-    predictions = model.predict(features)
-    return {"predictions": predictions.tolist()}
+    with stage("validation"):
+        features = MultiplePredictions.features_from_payload(data)
+    note(features=features)
+    reserve_rows(len(features))
+    if FastAPICache.get_enable():
+        predictions = await cached_predict_rows(features)
+    else:
+        predictions = await predict_rows(features)
+    return predictions_response(predictions)
+
+
+@sub_application_housing_predict.post("/bulk-predict/columnar")
+@timed_handler
+async def columnar_predict(request: Request):
+    """
+    Obtain predictions for a column-oriented batch of houses.
+    Args:
+        Body in one of the following formats, selected by Content-Type:
+            application/json: {"MedInc": [...], ..., "Longitude": [...]}
+            application/octet-stream: little-endian float64 bytes of shape (N, 8)
+            application/x-npy: .npy array of shape (N, 8)
+            application/vnd.apache.arrow.stream: Arrow IPC stream with the 8 columns
+        Columns are ordered MedInc, HouseAge, AveRooms, AveBedrms, Population,
+        AveOccup, Latitude, Longitude. Latitude must be in the range of -90 to 90
+        and Longitude in the range of -180 to 180.
+    Returns:
+        Predictions in the request's format; JSON responses are
+        {
+            "predictions": <List of AVG HOUSE VALUES>
+        }
+    """
+    media = media_type(request.headers.get("content-type"))
+    with stage("features"):
+        features = decode_features(await request.body(), media, FEATURE_NAMES)
+        validate_latlong(features, FEATURE_NAMES)
+    reserve_rows(len(features))
+    predictions = await predict_rows(features) if len(features) else features[:, 0]
+    with stage("serialization"):
+        return Response(content=encode_predictions(predictions, media), media_type=media)
+
+
+@sub_application_housing_predict.websocket("/predict/ws")
+async def predict_session(websocket: WebSocket):
+    """
+    Stream single-house predictions over a WebSocket.
+    Records from all connections are scored together in micro-batches, so a
+    high-rate client pays neither per-request HTTP handling nor a cache round
+    trip per house. At most WS_MAX_IN_FLIGHT records per connection await
+    their result; further messages are not read until results are sent.
+    Args:
+        Text messages holding one house, or a JSON array of houses, each =
+            {id (any, required): Returned with the house's result,
+            MedInc (float, required)
+            HouseAge (float, required)
+            AveRooms (float, required)
+            AveBedrms (float, required)
+            Population (float, required)
+            AveOccup (float, required)
+            Latitude (float, required): Must be in the range of -90 to 90.
+            Longitude (float, required): Must be in the range of -180 to 180.}
+    Returns:
+        Text messages, each a JSON array of results in completion order =
+        [{"id": <ID>, "prediction": <AVG HOUSE VALUE>}
+         or {"id": <ID>, "errors": <List of validation errors>}
+         or {"id": <ID>, "error": <MESSAGE>}, ...]
+    """
+    await websocket.accept()
+    metrics.inc("sessions_total")
+    await PredictionSession(websocket, HousingPrediction, session_batcher, WS_MAX_IN_FLIGHT, metrics).run()
+
+
+@sub_application_housing_predict.post("/bulk-predict/stream")
+@timed_handler
+async def stream_predict(request: Request):
+    """
+    Obtain predictions for a newline-delimited stream of houses.
+    Records are read and predicted in fixed-size chunks, so memory use does not
+    grow with the number of houses.
+    Args:
+        NDJSON body with one house per line:
+            {MedInc (float, required)
+            HouseAge (float, required)
+            AveRooms (float, required)
+            AveBedrms (float, required)
+            Population (float, required)
+            AveOccup (float, required)
+            Latitude (float, required): Must be in the range of -90 to 90.
+            Longitude (float, required): Must be in the range of -180 to 180.}
+    Returns:
+        Chunked NDJSON with one line per house, in input order =
+        {"row": <INDEX>, "prediction": <AVG HOUSE VALUE>}
+        or, for a house that fails validation,
+        {"row": <INDEX>, "errors": <List of validation errors>}
+    """
+    # At most one chunk of rows is scored at a time
+    reserve_rows(STREAM_CHUNK_SIZE)
+    lines = iter_lines(request.stream(), STREAM_MAX_LINE_BYTES)
+    return DuplexStreamingResponse(
+        predict_ndjson(lines, HousingPrediction, predict_rows, STREAM_CHUNK_SIZE),
+        media_type=NDJSON,
+    )
+
+
+# Define input model for batch-scoring jobs
+class JobSubmit(BaseModel):
+    houses: list[Any] | None = None
+    file: str | None = None
+
+    # Forbid extra inputs
+    model_config = ConfigDict(extra='forbid')
+
+    # Exactly one input
+    @model_validator(mode="after")
+    def check_input(self):
+        if (self.houses is None) == (self.file is None):
+            raise ValueError("Provide either houses or file")
+        return self
+
+
+async def get_job(job_id: str) -> dict:
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def finished_job(job_id: str) -> dict:
+    job = await get_job(job_id)
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job
+
+
+@sub_application_housing_predict.post("/jobs", status_code=202)
+async def submit_job(data: JobSubmit):
+    """
+    Queue a batch of houses for background scoring.
+    Jobs are scored JOB_CHUNK_SIZE rows at a time by at most JOB_MAX_RUNNING
+    jobs per worker, so they do not starve interactive predictions.
+    Args:
+        houses (list, optional): Houses in the /bulk-predict format.
+        file (str, optional): Name of a .npy, .json (columns), .f64 or .arrow
+            feature file inside JOB_INPUT_DIR.
+        Exactly one of houses and file is required.
+    Returns:
+        Job record =
+        {
+            "id": <JOB ID>, "status": "queued", "source": <"inline" OR FILE NAME>,
+            "chunk_size": <ROWS PER CHUNK>, "rows_total": <ROWS OR NULL>,
+            "rows_done": 0, "chunks_done": 0, "model_version": null,
+            "submitted_at": <TIMESTAMP>, "started_at": null, "finished_at": null,
+            "error": null, "errors": null
+        }
+    """
+    if data.houses is not None:
+        features = decode_records(data.houses, HousingPrediction, FEATURE_NAMES, loc=("houses",))
+        source, load = "inline", lambda: features
+    else:
+        if not JOB_INPUT_DIR:
+            raise HTTPException(status_code=404, detail="Job input files are not enabled")
+        path = resolve_file(JOB_INPUT_DIR, data.file, "Job input file")
+        source, load = data.file, lambda: read_features(path, FEATURE_NAMES)
+    try:
+        return await jobs.submit(source, load)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many unfinished jobs",
+                            headers={"Retry-After": "30"})
+
+
+@sub_application_housing_predict.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    Report a job's status and progress.
+    Args:
+        job_id (str, required)
+    Returns:
+        Job record as returned by POST /jobs; status is "queued", "running",
+        "succeeded", "failed" or "cancelled", and errors lists validation
+        errors of a failed file input.
+    """
+    return await get_job(job_id)
+
+
+@sub_application_housing_predict.get("/jobs/{job_id}/results")
+async def job_results(job_id: str, offset: int = Query(default=0, ge=0),
+                      limit: int = Query(default=1000, ge=1)):
+    """
+    Page through the predictions of a finished job.
+    Args:
+        job_id (str, required)
+        offset (int, optional): First row.
+        limit (int, optional): Rows per page, at most JOB_PAGE_MAX_ROWS.
+    Returns:
+        {
+            "predictions": <List of AVG HOUSE VALUES>,
+            "offset": <FIRST ROW>,
+            "next_offset": <FIRST ROW OF THE NEXT PAGE OR NULL>
+        }
+    """
+    job = await finished_job(job_id)
+    limit = min(limit, JOB_PAGE_MAX_ROWS)
+    predictions = await jobs.results(job, offset, limit)
+    end = offset + len(predictions)
+    return {"predictions": predictions, "offset": offset,
+            "next_offset": end if end < job["rows_total"] else None}
+
+
+@sub_application_housing_predict.get("/jobs/{job_id}/results/stream")
+async def job_results_stream(job_id: str):
+    """
+    Stream all predictions of a finished job.
+    Args:
+        job_id (str, required)
+    Returns:
+        Chunked NDJSON with one line per house, in input order =
+        {"row": <INDEX>, "prediction": <AVG HOUSE VALUE>}
+    """
+    job = await finished_job(job_id)
+    return StreamingResponse(jobs.stream(job), media_type=NDJSON)
+
+
+@sub_application_housing_predict.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """
+    Cancel a job if it is unfinished and delete it with its results.
+    Args:
+        job_id (str, required)
+    Returns:
+        {"id": <JOB ID>, "deleted": true}
+    """
+    job = await get_job(job_id)
+    if job["status"] not in FINISHED and not await jobs.cancel(job_id):
+        # Not running here: it may have just finished, or belong to another worker
+        job = await get_job(job_id)
+        if job["status"] not in FINISHED:
+            raise HTTPException(status_code=409, detail="Job is running in another worker")
+    await jobs.store.delete(job_id)
+    return {"id": job_id, "deleted": True}
@@ -0,0 +1,86 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+EXECUTOR_KINDS = ("inline", "thread", "process")
+
+# Model held by each process-pool worker, loaded once by the initializer
+_worker_model = None
+
+
+def _init_worker(model_path: str, prepare=None, loader=None):
+    global _worker_model
+    if loader is None:
+        from joblib import load as loader
+    _worker_model = loader(model_path)
+    if prepare is not None:
+        _worker_model = prepare(_worker_model)
+
+
+def _worker_predict(features):
+    return _worker_model.predict(features)
+
+
+class InferenceExecutor:
+    """
+    Run blocking model.predict calls off the event loop.
+    Args:
+        model (Pipeline, required): Fitted model (or anything with a predict
+            method) used by inline and thread modes.
+        kind (str, optional): "inline" runs on the event loop, "thread" uses a
+            thread pool and "process" uses a process pool whose workers each
+            load model_path once.
+        workers (int, optional): Pool size. Defaults to the CPUs of the
+            container's quota, as for the number of server workers.
+        model_path (str, optional): Model artifact loaded by process workers.
+        prepare (callable, optional): Picklable function applied by process
+            workers to the loaded model, e.g. build_predictor.
+        loader (callable, optional): Picklable function process workers use to
+            load model_path. Defaults to joblib.load.
+    """
+
+    def __init__(self, model, kind="thread", workers=None, model_path="model_pipeline.pkl",
+                 prepare=None, loader=None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Invalid inference executor: {kind}")
+        self.model = model
+        self.kind = kind
+        if not workers:
+            # cgroup-aware, so a pod does not size its pool by the host's CPUs
+            from src.serve import default_workers
+
+            workers = default_workers()
+        self.workers = workers
+        self.pool = None
+        if kind == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix="inference")
+        elif kind == "process":
+            # Spawn rather than fork so workers do not inherit the event loop
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model_path, prepare, loader),
+            )
+
+    async def predict(self, features):
+        """
+        Predict over a feature matrix without blocking the event loop.
+        Args:
+            features (array, required): Feature matrix of shape (N, 8).
+        Returns:
+            Array of N predictions.
+        """
+        if self.pool is None:
+            return self.model.predict(features)
+        loop = asyncio.get_running_loop()
+        if self.kind == "process":
+            return await loop.run_in_executor(self.pool, _worker_predict, features)
+        return await loop.run_in_executor(self.pool, self.model.predict, features)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+
+from src.metrics import LATENCY_BUCKETS
+
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED = ("succeeded", "failed", "cancelled")
+
+# Validation errors kept on a failed job
+MAX_JOB_ERRORS = 100
+
+
+class JobQueueFull(Exception):
+    """Raised when this process already holds its limit of unfinished jobs."""
+
+
+class MemoryJobStore:
+    """
+    In-process job store with the same interface as RedisJobStore, for tests
+    and single-process deployments. Entries expire ttl seconds after their
+    last write.
+    Args:
+        ttl (int, optional): Seconds a job and its results are kept.
+    """
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self._jobs = {}
+        self._results = {}
+
+    def _purge(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, (expires, _) in self._jobs.items() if expires <= now]:
+            del self._jobs[job_id]
+            self._results.pop(job_id, None)
+
+    async def save(self, job: dict):
+        self._purge()
+        self._jobs[job["id"]] = (time.monotonic() + self.ttl, dict(job))
+
+    async def get(self, job_id: str):
+        self._purge()
+        entry = self._jobs.get(job_id)
+        return dict(entry[1]) if entry is not None else None
+
+    async def append_chunk(self, job_id: str, chunk: str):
+        self._results.setdefault(job_id, []).append(chunk)
+
+    async def chunks(self, job_id: str, start: int, stop: int) -> list:
+        return self._results.get(job_id, [])[start:stop]
+
+    async def delete(self, job_id: str):
+        self._jobs.pop(job_id, None)
+        self._results.pop(job_id, None)
+
+    async def close(self):
+        pass
+
+
+class RedisJobStore:
+    """
+    Job state in Redis, so any worker or pod can report on a job.
+    The job record is one JSON string and its results a list holding one
+    JSON array of predictions per chunk.
+    Args:
+        redis (redis.asyncio.Redis, required): Client with decode_responses=True.
+        prefix (str, optional): Key prefix.
+        ttl (int, optional): Seconds a job and its results are kept.
+    """
+
+    def __init__(self, redis, prefix="jobs", ttl=86400):
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, job_id, suffix=""):
+        return f"{self.prefix}:{job_id}{suffix}"
+
+    async def save(self, job: dict):
+        await self.redis.set(self._key(job["id"]), json.dumps(job), ex=self.ttl)
+
+    async def get(self, job_id: str):
+        value = await self.redis.get(self._key(job_id))
+        return json.loads(value) if value is not None else None
+
+    async def append_chunk(self, job_id: str, chunk: str):
+        key = self._key(job_id, ":results")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, chunk)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def chunks(self, job_id: str, start: int, stop: int) -> list:
+        if stop <= start:
+            return []
+        return await self.redis.lrange(self._key(job_id, ":results"), start, stop - 1)
+
+    async def delete(self, job_id: str):
+        await self.redis.delete(self._key(job_id), self._key(job_id, ":results"))
+
+    async def close(self):
+        pass
+
+
+class JobRunner:
+    """
+    Score large batches in the background, one chunk per model call.
+    At most max_running jobs score at once and each waits for its previous
+    chunk before sending the next, so a job holds at most one inference
+    worker and interactive requests keep the rest.
+    Args:
+        store (MemoryJobStore or RedisJobStore, required): Where jobs are kept.
+        manager (ModelManager, required): Jobs are scored by the model version
+            active when they start, for their whole run.
+        registry (MetricsRegistry, required): Where job metrics are recorded.
+        chunk_size (int, optional): Rows per model call.
+        max_running (int, optional): Jobs scoring at the same time.
+        max_pending (int, optional): Unfinished jobs accepted by this process.
+    """
+
+    def __init__(self, store, manager, registry, chunk_size=2048, max_running=1, max_pending=16):
+        self.store = store
+        self.manager = manager
+        self.registry = registry
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self._running = asyncio.Semaphore(max_running)
+        self._tasks = {}
+        self._closing = False
+
+    async def submit(self, source: str, load) -> dict:
+        """
+        Accept a job; it is scored once a running slot is free.
+        Args:
+            source (str, required): Describes the input, e.g. "inline" or a file name.
+            load (callable, required): Blocking function returning the (N, 8)
+                feature matrix; run in a thread when the job starts.
+        Returns:
+            The job record.
+        Raises:
+            JobQueueFull: If max_pending jobs are already unfinished here.
+        """
+        if len(self._tasks) >= self.max_pending:
+            raise JobQueueFull("Too many unfinished jobs")
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "source": source,
+            "chunk_size": self.chunk_size,
+            "rows_total": None,
+            "rows_done": 0,
+            "chunks_done": 0,
+            "model_version": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "errors": None,
+        }
+        await self.store.save(job)
+        task = asyncio.get_running_loop().create_task(self._run(job, load))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["id"], None))
+        return job
+
+    async def _finish(self, job, status, error=None, errors=None):
+        job.update(status=status, error=error, errors=errors, finished_at=time.time())
+        await self.store.save(job)
+        self.registry.inc("jobs_total", (("status", status),))
+        if job["started_at"] is not None:
+            self.registry.observe("job_duration_seconds", job["finished_at"] - job["started_at"],
+                                  buckets=(*LATENCY_BUCKETS, 30, 60, 300, 900, 3600))
+
+    async def _run(self, job, load):
+        try:
+            async with self._running:
+                served = self.manager.active
+                served.acquire()
+                try:
+                    job.update(status="running", started_at=time.time(), model_version=served.version)
+                    await self.store.save(job)
+                    features = await asyncio.get_running_loop().run_in_executor(None, load)
+                    job["rows_total"] = len(features)
+                    await self.store.save(job)
+                    for start in range(0, len(features), self.chunk_size):
+                        chunk = np.ascontiguousarray(features[start:start + self.chunk_size], dtype=np.float64)
+                        predictions = np.asarray(await served.predict(chunk), dtype=np.float64)
+                        # Inputs are checked when read; NaN or inf here would make invalid results JSON
+                        invalid = np.flatnonzero(~np.isfinite(predictions))
+                        if len(invalid):
+                            raise ValueError(f"Non-finite prediction for row {start + invalid[0]}")
+                        await self.store.append_chunk(job["id"], json.dumps(predictions.tolist()))
+                        job["rows_done"] += len(chunk)
+                        job["chunks_done"] += 1
+                        await self.store.save(job)
+                        self.registry.inc("job_rows_total", amount=len(chunk))
+                finally:
+                    served.release()
+            await self._finish(job, "succeeded")
+        except asyncio.CancelledError:
+            if self._closing:
+                await self._finish(job, "failed", "Interrupted by shutdown")
+            else:
+                await self._finish(job, "cancelled")
+        except RequestValidationError as exc:
+            await self._finish(job, "failed", "Invalid input",
+                               jsonable_encoder(exc.errors()[:MAX_JOB_ERRORS]))
+        except Exception as exc:
+            logger.exception("Job %s failed", job["id"])
+            await self._finish(job, "failed", str(getattr(exc, "detail", None) or exc))
+
+    async def get(self, job_id: str):
+        return await self.store.get(job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        # Only the process running a job can stop it; returns whether it did
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    async def results(self, job: dict, offset: int, limit: int) -> list:
+        """
+        Predictions for rows offset to offset + limit of a finished job.
+        """
+        size = job["chunk_size"]
+        first = offset // size
+        chunks = await self.store.chunks(job["id"], first, (offset + limit - 1) // size + 1)
+        predictions = [value for chunk in chunks for value in json.loads(chunk)]
+        skip = offset - first * size
+        return predictions[skip:skip + limit]
+
+    async def stream(self, job: dict, chunks_per_read=16):
+        """
+        Yield a finished job's predictions as NDJSON lines, reading a few
+        chunks at a time.
+        """
+        row = 0
+        for first in range(0, job["chunks_done"], chunks_per_read):
+            for chunk in await self.store.chunks(job["id"], first, first + chunks_per_read):
+                values = json.loads(chunk)
+                yield "".join(f'{{"row":{row + index},"prediction":{value!r}}}\n'
+                              for index, value in enumerate(values)).encode()
+                row += len(values)
+
+    async def close(self):
+        self._closing = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.store.close()
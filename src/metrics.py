@@ -0,0 +1,286 @@
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+
+# Default bucket boundaries
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram of observed values.
+    Args:
+        buckets (tuple[float], required): Sorted upper bounds of each bucket.
+            Values above the last bound are counted in an implicit +Inf bucket.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def snapshot(self) -> dict:
+        """
+        Return cumulative bucket counts keyed by upper bound.
+        Returns:
+            {
+                "buckets": {"<UPPER BOUND>": <CUMULATIVE COUNT>, ..., "+Inf": <COUNT>},
+                "count": <NUMBER OF OBSERVATIONS>,
+                "sum": <SUM OF OBSERVATIONS>
+            }
+        """
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = running + self.counts[-1]
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{str(value)}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def render_histogram(name, snapshot, labels=()) -> list:
+    """
+    Render a Histogram.snapshot() in Prometheus text format.
+    Returns:
+        List of exposition lines without the TYPE header.
+    """
+    lines = [f"{name}_bucket{_format_labels((*labels, ('le', bound)))} {count}"
+             for bound, count in snapshot["buckets"].items()]
+    lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+    return lines
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms keyed by metric name and labels.
+    Labels are tuples of (name, value) pairs.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, labels=(), amount=1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def set_gauge(self, name, value, labels=()):
+        self.gauges.setdefault(name, {})[labels] = value
+
+    def add_gauge(self, name, amount, labels=()):
+        series = self.gauges.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(buckets)
+        histogram.observe(value)
+
+    def reset(self):
+        self.counters.clear()
+        self.gauges.clear()
+        self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Return every series in a JSON-serializable form accepted by merge().
+        """
+        def series(metrics, value):
+            return {name: [[list(map(list, labels)), value(item)] for labels, item in entries.items()]
+                    for name, entries in metrics.items()}
+
+        return {
+            "counters": series(self.counters, lambda value: value),
+            "gauges": series(self.gauges, lambda value: value),
+            "histograms": series(self.histograms, lambda histogram: {
+                "buckets": list(histogram.buckets), "counts": list(histogram.counts),
+                "count": histogram.count, "sum": histogram.sum,
+            }),
+        }
+
+    def merge(self, snapshot, extra_gauge_labels=()):
+        """
+        Add another registry's snapshot into this one.
+        Counters and histograms are summed. Gauges are point-in-time values
+        that may not add up (e.g. startup durations), so they are kept as
+        separate series distinguished by extra_gauge_labels.
+        Args:
+            snapshot (dict, required): Output of MetricsRegistry.snapshot().
+            extra_gauge_labels (tuple, optional): Labels added to merged gauges.
+        """
+        for name, entries in snapshot["counters"].items():
+            for labels, value in entries:
+                self.inc(name, tuple(map(tuple, labels)), value)
+        for name, entries in snapshot["gauges"].items():
+            for labels, value in entries:
+                self.set_gauge(name, value, (*map(tuple, labels), *extra_gauge_labels))
+        for name, entries in snapshot["histograms"].items():
+            series = self.histograms.setdefault(name, {})
+            for labels, data in entries:
+                labels = tuple(map(tuple, labels))
+                histogram = series.get(labels)
+                if histogram is None:
+                    histogram = series[labels] = Histogram(data["buckets"])
+                histogram.counts = [left + right for left, right in zip(histogram.counts, data["counts"])]
+                histogram.count += data["count"]
+                histogram.sum += data["sum"]
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        lines = []
+        for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, series in metrics.items():
+                lines.append(f"# TYPE {name} {kind}")
+                lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in series.items()]
+        for name, series in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                lines += render_histogram(name, histogram.snapshot(), labels)
+        return "\n".join(lines) + "\n"
+
+
+# Timings for the request being served, set by MetricsMiddleware
+_request_timing = ContextVar("request_timing", default=None)
+
+
+@contextmanager
+def record_duration(durations, name):
+    # Add the time spent in the block to durations[name]
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        durations[name] = durations.get(name, 0.0) + time.perf_counter() - started
+
+
+@contextmanager
+def stage(name):
+    """
+    Add the time spent in the block to the current request's stage breakdown.
+    Does nothing outside a request handled by MetricsMiddleware.
+    """
+    timing = _request_timing.get()
+    if timing is None:
+        yield
+        return
+    with record_duration(timing["stages"], name):
+        yield
+
+
+def process_uptime():
+    """
+    Seconds since this process started, from /proc on Linux.
+    Returns:
+        Float seconds, or None where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/stat") as stat:
+            # Fields after the parenthesised command name; starttime is field 22
+            started_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            system_uptime = float(uptime.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return system_uptime - started_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def timed_handler(func):
+    """
+    Mark handler entry and exit so the middleware can attribute time to
+    body parsing/validation (before entry, less any admission wait) and
+    serialization (after exit).
+    """
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        timing = _request_timing.get()
+        if timing is None:
+            return await func(*args, **kwargs)
+        entered = time.perf_counter()
+        stages = timing["stages"]
+        stages["validation"] = entered - timing["start"] - stages.get("admission", 0.0)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            timing["handler_end"] = time.perf_counter()
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route request counts, latency, in-flight
+    requests and the stage breakdown collected by stage() and timed_handler.
+    Args:
+        app (ASGI app, required): Application to wrap.
+        registry (MetricsRegistry, required): Where metrics are recorded.
+    """
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing = {"start": time.perf_counter(), "stages": {}}
+        token = _request_timing.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if "handler_end" in timing:
+                    stages = timing["stages"]
+                    stages["serialization"] = (stages.get("serialization", 0.0)
+                                               + time.perf_counter() - timing["handler_end"])
+            await send(message)
+
+        self.registry.add_gauge("http_requests_in_flight", 1)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - timing["start"]
+            _request_timing.reset(token)
+            self.registry.add_gauge("http_requests_in_flight", -1)
+
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            self.registry.inc("http_requests_total",
+                              (("route", route), ("method", scope["method"]), ("status", status)))
+            self.registry.observe("http_request_duration_seconds", elapsed, (("route", route),))
+            for name, seconds in timing["stages"].items():
+                self.registry.observe("http_request_stage_seconds", seconds,
+                                      (("route", route), ("stage", name)))
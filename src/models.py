@@ -0,0 +1,384 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+from src.metrics import LATENCY_BUCKETS
+
+
+logger = logging.getLogger(__name__)
+
+ROLLOUTS = ("replace", "canary", "shadow")
+VERSION_HEADER = "x-model-version"
+
+# Absolute differences between shadow and active predictions (in $100,000s)
+SHADOW_ERROR_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Model serving the request being handled, set by ModelRoutingMiddleware
+_request_model = ContextVar("request_model", default=None)
+
+
+class ModelLoadError(Exception):
+    """Raised when a new model version cannot be loaded or fails warm-up."""
+
+
+class ServedModel:
+    """
+    One loaded model version and everything needed to serve it.
+    Requests hold a ServedModel for their whole lifetime, so a version that
+    is swapped out keeps serving its in-flight requests until they finish.
+    Args:
+        version (str, required): Content hash of the model file.
+        path (str, required): Model file it was loaded from.
+        model (object, required): Loaded pipeline or artifact predictor.
+        predictor (object, required): Object whose predict() is served.
+        executor (InferenceExecutor, optional): Runs predict() off the event loop.
+        key_builder (FeatureKeyBuilder, required): Cache keys for this version.
+        approximation (dict, optional): Approximate inference report.
+        precision (dict, optional): Reduced precision report.
+    """
+
+    def __init__(self, version, path, model, predictor, executor, key_builder, approximation=None,
+                 precision=None):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.predictor = predictor
+        self.executor = executor
+        self.key_builder = key_builder
+        self.approximation = approximation
+        self.precision = precision
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self._idle = None
+
+    async def predict(self, features):
+        if self.executor is None:
+            return self.predictor.predict(features)
+        return await self.executor.predict(features)
+
+    def acquire(self):
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        if self.in_flight == 0 and self._idle is not None:
+            self._idle.set()
+
+    async def retire(self):
+        # Wait for in-flight requests, then release the executor's threads or processes
+        if self.in_flight:
+            self._idle = asyncio.Event()
+            await self._idle.wait()
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+        logger.info("Retired model version %s", self.version)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+            "approximation": self.approximation,
+            "precision": self.precision,
+        }
+
+
+class ModelManager:
+    """
+    Hold the active model version and an optional candidate.
+    A candidate is either canaried, answering `percent` of requests, or
+    shadowed, receiving a copy of `percent` of the active model's batches
+    whose predictions are only compared, never returned. Any request can
+    pin either version with the X-Model-Version header. When `warm_cache` is
+    set, each loaded version is passed to it before being staged, so its
+    cache entries exist before it answers requests.
+    Args:
+        registry (MetricsRegistry, required): Where shadow comparisons are recorded.
+        max_shadow_in_flight (int, optional): Shadow batches allowed to run at
+            once; further batches are not shadowed.
+    """
+
+    def __init__(self, registry, max_shadow_in_flight=4):
+        self.registry = registry
+        self.max_shadow_in_flight = max_shadow_in_flight
+        self.active = None
+        self.candidate = None
+        self.rollout = "replace"
+        self.percent = 0.0
+        self.reports = {}
+        self.warm_cache = None
+        self._load_lock = asyncio.Lock()
+        self._background = set()
+        self._shadow_in_flight = 0
+        self._watcher = None
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def activate(self, served: ServedModel):
+        # Atomic swap: requests already holding the old version finish on it
+        previous, self.active = self.active, served
+        if previous is not None and previous is not served:
+            self._spawn(previous.retire())
+        logger.info("Serving model version %s", served.version)
+
+    def current(self):
+        # Version pinned by the current request, or the active one outside requests
+        served = _request_model.get()
+        return served if served is not None else self.active
+
+    @contextmanager
+    def serving_active(self):
+        """
+        Serve the block with the active version outside a routed request:
+        it is counted in flight, so a hot swap cannot retire it mid-block,
+        and current() returns it for the block's duration.
+        Yields:
+            The active ServedModel.
+        """
+        served = self.active
+        served.acquire()
+        token = _request_model.set(served)
+        try:
+            yield served
+        finally:
+            _request_model.reset(token)
+            served.release()
+
+    def versions(self) -> list:
+        return [served for served in (self.active, self.candidate) if served is not None]
+
+    async def load(self, build, path, reference, rollout="replace", percent=0.0) -> dict:
+        """
+        Load a model version in the background, warm it and stage it.
+        Args:
+            build (callable, required): Blocking function building a
+                ServedModel from a path; run in a thread.
+            path (str, required): Model file to load.
+            reference (array, required): Feature matrix used to warm the new
+                version and compare it with the active one.
+            rollout (str, optional): "replace" swaps it in immediately,
+                "canary" and "shadow" stage it as the candidate.
+            percent (float, optional): Share of traffic for the candidate, 0-100.
+        Returns:
+            Warm-up report for the loaded version.
+        Raises:
+            ModelLoadError: If the model cannot be loaded or its warm-up
+                predictions are malformed.
+        """
+        if rollout not in ROLLOUTS:
+            raise ModelLoadError(f"Invalid rollout: {rollout}")
+        async with self._load_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                served = await loop.run_in_executor(None, build, path)
+            except Exception as exc:
+                raise ModelLoadError(f"Could not load {path}: {exc}") from exc
+
+            started = time.perf_counter()
+            try:
+                warm = np.asarray(await served.predict(reference), dtype=float)
+            except Exception as exc:
+                self._spawn(served.retire())
+                raise ModelLoadError(f"Warm-up of {path} failed: {exc}") from exc
+            if warm.shape != (len(reference),) or not np.isfinite(warm).all():
+                self._spawn(served.retire())
+                raise ModelLoadError(f"Warm-up of {path} returned malformed predictions")
+            report = {"version": served.version, "rollout": rollout, "percent": percent,
+                      "warm_seconds": time.perf_counter() - started, "reference_rows": len(reference),
+                      "max_abs_diff": None, "mean_abs_diff": None}
+            active = self.active
+            if active is not None:
+                active.acquire()
+                try:
+                    diff = np.abs(warm - np.asarray(await active.predict(reference), dtype=float))
+                finally:
+                    active.release()
+                report.update(max_abs_diff=float(diff.max()), mean_abs_diff=float(diff.mean()))
+            if self.warm_cache is not None:
+                report["cache_warmup"] = await self.warm_cache(served)
+            self.reports[served.version] = report
+
+            if rollout == "replace":
+                self.discard()
+                self.activate(served)
+            else:
+                if self.candidate is not None:
+                    self._spawn(self.candidate.retire())
+                self.candidate = served
+                self.rollout, self.percent = rollout, percent
+            logger.info("Loaded model version %s: %s", served.version, report)
+            return report
+
+    def promote(self):
+        if self.candidate is None:
+            raise ModelLoadError("No candidate model to promote")
+        candidate, self.candidate = self.candidate, None
+        self.activate(candidate)
+
+    def discard(self):
+        if self.candidate is not None:
+            self._spawn(self.candidate.retire())
+            self.candidate = None
+
+    def route(self, requested=None):
+        """
+        Pick the version serving a request.
+        Args:
+            requested (str, optional): Version named by the X-Model-Version header.
+        Returns:
+            ServedModel, or None if the requested version is not loaded.
+        """
+        if requested:
+            return next((served for served in self.versions() if served.version == requested), None)
+        if (self.candidate is not None and self.rollout == "canary"
+                and random.random() * 100 < self.percent):
+            return self.candidate
+        return self.active
+
+    def shadow(self, served, features, predictions):
+        # Mirror an active-model batch to a shadow candidate and record the difference
+        candidate = self.candidate
+        if (candidate is None or self.rollout != "shadow" or served is not self.active
+                or self._shadow_in_flight >= self.max_shadow_in_flight
+                or random.random() * 100 >= self.percent):
+            return
+        candidate.acquire()
+        self._shadow_in_flight += 1
+
+        async def compare():
+            labels = (("version", candidate.version),)
+            try:
+                started = time.perf_counter()
+                shadowed = await candidate.predict(features)
+                self.registry.observe("shadow_latency_seconds", time.perf_counter() - started,
+                                      labels, LATENCY_BUCKETS)
+                for error in np.abs(np.asarray(shadowed) - np.asarray(predictions)):
+                    self.registry.observe("shadow_abs_error", float(error), labels, SHADOW_ERROR_BUCKETS)
+            except Exception:
+                self.registry.inc("shadow_failures_total", labels)
+                logger.exception("Shadow prediction failed for model version %s", candidate.version)
+            finally:
+                self._shadow_in_flight -= 1
+                candidate.release()
+
+        self._spawn(compare())
+
+    async def watch(self, directory, interval, build, reference, rollout="replace", percent=0.0):
+        """
+        Poll a directory and load the newest *.pkl once it stops changing.
+        Each file is handled once until it is modified again, so copying an
+        older model back in rolls back to it.
+        """
+        from src.cache import model_version
+
+        previous = None
+        handled = set()
+        while True:
+            await asyncio.sleep(interval)
+            paths = glob.glob(os.path.join(directory, "*.pkl"))
+            try:
+                newest = max(paths, key=os.path.getmtime) if paths else None
+                signature = (newest, os.path.getsize(newest), os.path.getmtime(newest)) if newest else None
+            except OSError:
+                continue
+            # Only load files that did not change since the previous poll
+            stable, previous = signature == previous, signature
+            if not stable or signature is None or signature in handled:
+                continue
+            handled.add(signature)
+            try:
+                version = model_version(newest)
+            except OSError:
+                continue
+            if any(served.version == version for served in self.versions()):
+                continue
+            try:
+                await self.load(build, newest, reference(), rollout, percent)
+            except ModelLoadError as exc:
+                logger.error("Refusing model %s: %s", newest, exc)
+
+    def start_watching(self, *args, **kwargs):
+        if self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self.watch(*args, **kwargs))
+
+    async def close(self):
+        tasks = list(self._background)
+        if self._watcher is not None:
+            tasks.append(self._watcher)
+            self._watcher = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for served in self.versions():
+            if served.executor is not None:
+                served.executor.shutdown()
+        self.active = self.candidate = None
+        # Locks bind to the event loop that first waits on them
+        self._load_lock = asyncio.Lock()
+
+    def info(self) -> dict:
+        return {
+            "active": self.active.info() if self.active is not None else None,
+            "candidate": self.candidate.info() if self.candidate is not None else None,
+            "rollout": self.rollout if self.candidate is not None else None,
+            "percent": self.percent if self.candidate is not None else None,
+            "reports": self.reports,
+        }
+
+
+class ModelRoutingMiddleware:
+    """
+    ASGI middleware that picks the model version for each request, pins it
+    for the request's lifetime and names it in an X-Model-Version response
+    header. Requests naming an unknown version get a 404.
+    Args:
+        app (ASGI app, required): Application to wrap.
+        manager (ModelManager, required): Loaded model versions.
+    """
+
+    def __init__(self, app, manager):
+        self.app = app
+        self.manager = manager
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.manager.active is None:
+            return await self.app(scope, receive, send)
+
+        requested = next((value.decode("latin-1") for name, value in scope["headers"]
+                          if name == VERSION_HEADER.encode()), None)
+        served = self.manager.route(requested)
+        if served is None:
+            body = json.dumps({"detail": f"Unknown model version: {requested}"}).encode()
+            await send({"type": "http.response.start", "status": 404,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_version(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((VERSION_HEADER.encode(), served.version.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        served.acquire()
+        token = _request_model.set(served)
+        try:
+            await self.app(scope, receive, send_with_version)
+        finally:
+            _request_model.reset(token)
+            served.release()
@@ -0,0 +1,338 @@
+import logging
+import threading
+
+import numpy as np
+
+# sklearn is imported where a pipeline is converted, so serving from a
+# precompiled artifact never pays for importing it
+
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedModel(Exception):
+    """Raised when a fitted pipeline cannot be converted to a fused predictor."""
+
+
+def _imputer_params(step, n_features):
+    if step.add_indicator:
+        raise UnsupportedModel("SimpleImputer with add_indicator is not supported")
+    if not (isinstance(step.missing_values, float) and np.isnan(step.missing_values)):
+        raise UnsupportedModel("SimpleImputer must impute NaN values")
+    fill = np.asarray(step.statistics_, dtype=np.float64)
+    if fill.shape != (n_features,) or np.isnan(fill).any():
+        raise UnsupportedModel("SimpleImputer dropped features during fit")
+    return fill
+
+
+def _scaler_params(step, n_features):
+    from sklearn.preprocessing import RobustScaler, StandardScaler
+
+    if isinstance(step, RobustScaler):
+        center, scale = step.center_, step.scale_
+    elif isinstance(step, StandardScaler):
+        # mean_ is fitted even when with_mean=False, but the scaler does not subtract it
+        center = step.mean_ if step.with_mean else None
+        scale = step.scale_ if step.with_std else None
+    else:
+        raise UnsupportedModel(f"Unsupported scaler: {type(step).__name__}")
+    center = np.zeros(n_features) if center is None else np.asarray(center, dtype=np.float64)
+    scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+    return center, scale
+
+
+class FusedSVRPredictor:
+    """
+    NumPy re-implementation of an imputer -> scaler -> RBF SVR pipeline.
+    Imputation, scaling and the kernel expansion run in one vectorized pass
+    over preallocated per-thread buffers, skipping sklearn's per-call input
+    validation and estimator dispatch.
+    Args:
+        fill (array, required): Imputation value per feature.
+        center (array, required): Scaler center per feature.
+        scale (array, required): Scaler scale per feature.
+        support_vectors (array, required): Support vectors of shape (S, F).
+        dual_coef (array, required): Dual coefficients of shape (S,).
+        intercept (float, required): Decision function intercept.
+        gamma (float, required): RBF kernel coefficient.
+        chunk_size (int, optional): Rows evaluated per kernel block.
+        support_vectors_t (array, optional): Precomputed transpose of support_vectors.
+        support_norms (array, optional): Precomputed squared norm of each support vector.
+    """
+
+    def __init__(self, fill, center, scale, support_vectors, dual_coef, intercept, gamma,
+                 chunk_size=256, support_vectors_t=None, support_norms=None):
+        self.fill = fill
+        self.center = center
+        self.scale = scale
+        # Contiguous inputs, including memory-mapped ones, are used without copying
+        self.support_vectors = np.ascontiguousarray(support_vectors)
+        if support_vectors_t is None:
+            support_vectors_t = self.support_vectors.T
+        self.support_vectors_t = np.ascontiguousarray(support_vectors_t)
+        if support_norms is None:
+            support_norms = np.einsum("ij,ij->i", self.support_vectors, self.support_vectors)
+        self.support_norms = np.ascontiguousarray(support_norms)
+        self.dual_coef = np.ascontiguousarray(dual_coef)
+        self.intercept = float(intercept)
+        self.gamma = float(gamma)
+        self.chunk_size = chunk_size
+        self.n_features = self.support_vectors.shape[1]
+        self._local = threading.local()
+
+    @classmethod
+    def from_pipeline(cls, pipeline, **kwargs):
+        """
+        Extract fitted parameters from a pipeline.
+        Args:
+            pipeline (Pipeline, required): Fitted SimpleImputer -> scaler -> SVR pipeline.
+        Returns:
+            FusedSVRPredictor
+        Raises:
+            UnsupportedModel: If any step is not one of the supported estimators.
+        """
+        from sklearn.impute import SimpleImputer
+        from sklearn.pipeline import Pipeline
+        from sklearn.svm import SVR
+
+        if not isinstance(pipeline, Pipeline) or len(pipeline.steps) != 3:
+            raise UnsupportedModel("Expected a three-step Pipeline")
+        imputer, scaler, svr = (step for _, step in pipeline.steps)
+        if not isinstance(imputer, SimpleImputer):
+            raise UnsupportedModel(f"Unsupported imputer: {type(imputer).__name__}")
+        if type(svr) is not SVR or svr.kernel != "rbf" or svr._sparse:
+            raise UnsupportedModel("Only dense RBF SVR estimators are supported")
+
+        n_features = svr.n_features_in_
+        fill = _imputer_params(imputer, n_features)
+        center, scale = _scaler_params(scaler, n_features)
+        return cls(
+            fill=fill,
+            center=center,
+            scale=scale,
+            support_vectors=np.asarray(svr.support_vectors_, dtype=np.float64),
+            dual_coef=np.asarray(svr.dual_coef_, dtype=np.float64).ravel(),
+            intercept=svr.intercept_[0],
+            gamma=svr._gamma,
+            **kwargs,
+        )
+
+    def astype(self, dtype):
+        """
+        Copy of the predictor whose parameters, kernel and outputs use dtype.
+        Args:
+            dtype (dtype, required): e.g. np.float32, halving the working set.
+        Returns:
+            FusedSVRPredictor
+        """
+        return FusedSVRPredictor(
+            fill=self.fill.astype(dtype),
+            center=self.center.astype(dtype),
+            scale=self.scale.astype(dtype),
+            support_vectors=self.support_vectors.astype(dtype),
+            dual_coef=self.dual_coef.astype(dtype),
+            intercept=self.intercept,
+            gamma=self.gamma,
+            chunk_size=self.chunk_size,
+            # Norms are taken from the exact vectors, then rounded once
+            support_norms=self.support_norms.astype(dtype),
+        )
+
+    def _kernel_buffer(self, rows):
+        # Per-thread workspace so pool threads never share a buffer
+        buffer = getattr(self._local, "kernel", None)
+        if buffer is None:
+            buffer = np.empty((self.chunk_size, len(self.dual_coef)), dtype=self.support_vectors.dtype)
+            self._local.kernel = buffer
+        return buffer[:rows]
+
+    def _predict_chunk(self, features, out):
+        scaled = np.where(np.isnan(features), self.fill, features)
+        scaled -= self.center
+        scaled /= self.scale
+
+        # -gamma * ||x - sv||^2 expanded as 2 x.sv - |x|^2 - |sv|^2
+        kernel = self._kernel_buffer(len(scaled))
+        np.matmul(scaled, self.support_vectors_t, out=kernel)
+        kernel *= 2
+        kernel -= self.support_norms
+        kernel -= np.einsum("ij,ij->i", scaled, scaled)[:, None]
+        np.minimum(kernel, 0, out=kernel)
+        kernel *= self.gamma
+        np.exp(kernel, out=kernel)
+
+        np.matmul(kernel, self.dual_coef, out=out)
+        out += self.intercept
+
+    def predict(self, features):
+        """
+        Predict over a feature matrix.
+        Args:
+            features (array, required): Feature matrix of shape (N, F).
+        Returns:
+            Array of N predictions.
+        """
+        features = np.asarray(features, dtype=self.support_vectors.dtype)
+        if features.ndim != 2 or features.shape[1] != self.n_features:
+            raise ValueError(f"Expected features of shape (N, {self.n_features})")
+        out = np.empty(len(features), dtype=self.support_vectors.dtype)
+        for start in range(0, len(features), self.chunk_size):
+            stop = start + self.chunk_size
+            self._predict_chunk(features[start:stop], out[start:stop])
+        return out
+
+
+def rbf_kernel(left, right, gamma):
+    # exp(-gamma * ||l - r||^2) for every pair of rows
+    sq_dist = (np.einsum("ij,ij->i", left, left)[:, None]
+               + np.einsum("ij,ij->i", right, right)[None, :]
+               - 2 * left @ right.T)
+    return np.exp(-gamma * np.maximum(sq_dist, 0))
+
+
+def landmark_indices(predictor, components, seed=0):
+    # Support vectors sampled as Nystroem landmarks for a given seed
+    count = len(predictor.support_vectors)
+    return np.random.default_rng(seed).choice(count, min(components, count), replace=False)
+
+
+def nystroem_predictor(predictor, components, seed=0):
+    """
+    Approximate a fused SVR with a Nystroem expansion over fewer landmarks.
+    The decision function sum_i a_i k(x, sv_i) is projected onto the span of
+    k(x, l_j) for landmarks l sampled from the support vectors, giving an
+    expansion of the same form with `components` terms.
+    Args:
+        predictor (FusedSVRPredictor, required): Exact predictor to approximate.
+        components (int, required): Number of landmarks to keep.
+        seed (int, optional): Seed for landmark sampling.
+    Returns:
+        FusedSVRPredictor
+    """
+    support_vectors = predictor.support_vectors
+    landmarks = support_vectors[landmark_indices(predictor, components, seed)]
+    landmark_kernel = rbf_kernel(landmarks, landmarks, predictor.gamma)
+    cross_kernel = rbf_kernel(landmarks, support_vectors, predictor.gamma)
+    dual_coef = np.linalg.pinv(landmark_kernel, rcond=1e-8, hermitian=True) @ (cross_kernel @ predictor.dual_coef)
+    return FusedSVRPredictor(
+        fill=predictor.fill,
+        center=predictor.center,
+        scale=predictor.scale,
+        support_vectors=landmarks,
+        dual_coef=dual_coef,
+        intercept=predictor.intercept,
+        gamma=predictor.gamma,
+        chunk_size=predictor.chunk_size,
+    )
+
+
+def reference_features(predictor, size=2000, seed=1, exclude=None):
+    """
+    Training rows recovered from the support vectors by undoing the scaler.
+    Args:
+        predictor (FusedSVRPredictor, required): Predictor to sample from.
+        size (int, optional): Largest number of rows to return.
+        seed (int, optional): Seed for row sampling.
+        exclude (array, optional): Support vector indices not to sample,
+            such as the landmarks of an approximation being measured. Ignored
+            when it covers every support vector, as the approximation is then exact.
+    Returns:
+        Feature matrix of shape (N, F).
+    """
+    support_vectors = predictor.support_vectors
+    candidates = np.arange(len(support_vectors))
+    if exclude is not None and len(exclude) < len(support_vectors):
+        candidates = np.setdiff1d(candidates, exclude)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(candidates, min(size, len(candidates)), replace=False)
+    return support_vectors[rows] * predictor.scale + predictor.center
+
+
+def approximate_predictor(predictor, components, max_error, mean_error, reference=None):
+    """
+    Build a Nystroem approximation and gate it on its error against the exact model.
+    Args:
+        predictor (FusedSVRPredictor, required): Exact predictor.
+        components (int, required): Number of Nystroem landmarks.
+        max_error (float, required): Largest allowed absolute error on the reference set.
+        mean_error (float, required): Largest allowed mean absolute error on the reference set.
+        reference (array, optional): Reference feature matrix. Defaults to
+            training rows recovered from the support vectors that were not
+            picked as landmarks, so the error is measured away from them.
+    Returns:
+        Tuple of (predictor to serve, report dict). The exact predictor is
+        returned when the approximation exceeds either tolerance.
+    """
+    report = {"mode": "nystroem", "components": components, "active": False,
+              "max_abs_error": None, "mean_abs_error": None,
+              "max_error_tolerance": max_error, "mean_error_tolerance": mean_error}
+    if not isinstance(predictor, FusedSVRPredictor):
+        logger.warning("Approximate inference requires the fused SVR predictor; using exact model")
+        return predictor, report
+
+    approximate = nystroem_predictor(predictor, components)
+    if reference is None:
+        reference = reference_features(predictor, exclude=landmark_indices(predictor, components))
+    errors = np.abs(approximate.predict(reference) - predictor.predict(reference))
+    report["max_abs_error"] = float(errors.max())
+    report["mean_abs_error"] = float(errors.mean())
+    report["reference_rows"] = len(reference)
+
+    if report["max_abs_error"] > max_error or report["mean_abs_error"] > mean_error:
+        logger.warning("Approximate inference refused, error above tolerance: %s", report)
+        return predictor, report
+    report["active"] = True
+    logger.info("Approximate inference active: %s", report)
+    return approximate, report
+
+
+def reduced_precision_predictor(predictor, max_error, reference=None, dtype=np.float32):
+    """
+    Convert a fused predictor to a smaller float type and gate it on its
+    error against the float64 predictions.
+    Args:
+        predictor (FusedSVRPredictor, required): float64 predictor.
+        max_error (float, required): Largest allowed absolute error on the reference set.
+        reference (array, optional): Reference feature matrix. Defaults to
+            training rows recovered from the support vectors.
+        dtype (dtype, optional): Type to compute in.
+    Returns:
+        Tuple of (predictor to serve, report dict). The float64 predictor is
+        returned when the converted one exceeds the tolerance.
+    """
+    report = {"dtype": np.dtype(dtype).name, "active": False, "max_abs_error": None,
+              "mean_abs_error": None, "max_error_tolerance": max_error}
+    if not isinstance(predictor, FusedSVRPredictor):
+        logger.warning("Reduced precision requires the fused SVR predictor; using float64")
+        return predictor, report
+
+    reduced = predictor.astype(dtype)
+    if reference is None:
+        reference = reference_features(predictor)
+    errors = np.abs(reduced.predict(reference).astype(np.float64) - predictor.predict(reference))
+    report["max_abs_error"] = float(errors.max())
+    report["mean_abs_error"] = float(errors.mean())
+    report["reference_rows"] = len(reference)
+
+    if not report["max_abs_error"] <= max_error:
+        logger.warning("Reduced precision refused, error above tolerance: %s", report)
+        return predictor, report
+    report["active"] = True
+    logger.info("Reduced precision active: %s", report)
+    return reduced, report
+
+
+def build_predictor(pipeline):
+    """
+    Return a fused predictor for the pipeline, or the pipeline itself if the
+    estimator types are not supported.
+    """
+    if isinstance(pipeline, FusedSVRPredictor):
+        return pipeline
+    try:
+        predictor = FusedSVRPredictor.from_pipeline(pipeline)
+    except UnsupportedModel as exc:
+        logger.warning("Falling back to sklearn pipeline: %s", exc)
+        return pipeline
+    logger.info("Using fused SVR predictor with %d support vectors", len(predictor.dual_coef))
+    return predictor
@@ -0,0 +1,161 @@
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+
+PROFILE_HEADER = "x-profile"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Leaf frames in these files are threads parked waiting for work
+_IDLE_FILES = ("threading.py", "queue.py")
+
+
+class StackSampler:
+    """
+    Sample the Python stacks of every thread on a background thread.
+    Samples are counted as collapsed stacks ("thread;outer;...;inner"), the
+    input format for flamegraph tools. Threads parked on locks or queues are
+    skipped, so idle pool workers do not dominate the profile.
+    Args:
+        interval (float, required): Seconds between samples.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def collapsed(samples: Counter) -> str:
+    # One "stack count" line per distinct stack, heaviest first
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class ProfileStore:
+    """
+    Keep the most recent request profiles.
+    Args:
+        keep (int, required): Number of profiles retained.
+    """
+
+    def __init__(self, keep):
+        self.profiles = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+
+    def add(self, path, started, duration, samples) -> int:
+        profile_id = next(self._ids)
+        self.profiles.append({"id": profile_id, "path": path, "started": started,
+                              "duration_seconds": duration, "samples": samples})
+        return profile_id
+
+    def get(self, profile_id):
+        return next((profile for profile in self.profiles if profile["id"] == profile_id), None)
+
+    def summary(self) -> list:
+        return [{key: value for key, value in profile.items() if key != "samples"}
+                | {"sample_count": sum(profile["samples"].values())}
+                for profile in self.profiles]
+
+    def aggregate(self) -> Counter:
+        total = Counter()
+        for profile in self.profiles:
+            total.update(profile["samples"])
+        return total
+
+
+def token_matches(supplied, expected) -> bool:
+    if not expected or supplied is None:
+        return False
+    return hmac.compare_digest(supplied.encode(), expected.encode())
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that stack-samples selected requests.
+    A request is profiled when its X-Profile header carries the admin token
+    or when it falls in the random sample_rate fraction. Only one request is
+    profiled at a time; others run unprofiled. Profiled responses carry an
+    X-Profile-Id header naming the stored profile. Register it only when
+    profiling is configured, so a disabled profiler costs nothing.
+    Args:
+        app (ASGI app, required): Application to wrap.
+        store (ProfileStore, required): Where profiles are kept.
+        sample_rate (float, optional): Fraction of requests profiled at random.
+        admin_token (str, optional): Token that forces profiling via X-Profile.
+        interval (float, optional): Seconds between stack samples.
+    """
+
+    def __init__(self, app, store, sample_rate=0.0, admin_token=None, interval=0.005):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.interval = interval
+        self._busy = threading.Lock()
+
+    def _selected(self, scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return token_matches(value.decode("latin-1"), self.admin_token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._selected(scope) or not self._busy.acquire(False):
+            return await self.app(scope, receive, send)
+
+        sampler = StackSampler(self.interval)
+        # Reserve the id up front so it can go out in the response headers
+        profile_id = self.store.add(scope["path"], time.time(), None, Counter())
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(profile_id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            samples = sampler.stop()
+            self._busy.release()
+            profile = self.store.get(profile_id)
+            if profile is not None:
+                profile.update(duration_seconds=time.perf_counter() - started, samples=samples)
@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+from fastapi import Response
+from fastapi_cache.coder import Coder
+
+from src.metrics import stage
+
+try:
+    import orjson
+except ImportError:
+    # Optional: the standard library encoder below produces the same bytes, only slower
+    orjson = None
+
+
+JSON = "application/json"
+
+
+def dumps(content) -> bytes:
+    # Same bytes as fastapi.responses.JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _orjson_matches(values: np.ndarray) -> bool:
+    # orjson writes 1e-05 as 0.00001 and 1e+16 as 1e16, and NaN as null;
+    # within this range its shortest-repr floats match Python's exactly
+    magnitude = np.abs(values)
+    return bool((((magnitude >= 1e-4) & (magnitude < 1e16)) | (magnitude == 0)).all())
+
+
+def encode_predictions_json(predictions, key="predictions") -> bytes:
+    """
+    Encode a prediction array as {key: [...]} JSON bytes.
+    The output is byte-for-byte what FastAPI's JSONResponse produces for
+    {key: predictions.tolist()}, without building a list of Python floats.
+    Args:
+        predictions (array, required): 1-D predictions.
+        key (str, optional): Name of the JSON field.
+    Returns:
+        bytes
+    Raises:
+        ValueError: If a prediction is NaN or infinite, as JSONResponse does.
+    """
+    values = np.ascontiguousarray(predictions, dtype=np.float64)
+    if orjson is not None and _orjson_matches(values):
+        return orjson.dumps({key: values}, option=orjson.OPT_SERIALIZE_NUMPY)
+    return dumps({key: values.tolist()})
+
+
+def predictions_response(predictions) -> Response:
+    """
+    Respond with {"predictions": [...]} encoded straight from model output.
+    Returning a Response makes FastAPI skip response_model validation and
+    encoding, which only repeat work for trusted float arrays.
+    """
+    with stage("serialization"):
+        return Response(encode_predictions_json(predictions), media_type=JSON)
+
+
+def prediction_response(prediction) -> Response:
+    # Single prediction counterpart of predictions_response
+    with stage("serialization"):
+        return Response(dumps({"prediction": float(prediction)}), media_type=JSON)
+
+
+class ResponseCoder(Coder):
+    """
+    fastapi_cache coder storing rendered JSON bodies, so cache hits are
+    returned as responses without decoding, validating and re-encoding them.
+    """
+
+    @classmethod
+    def encode(cls, value: Response) -> bytes:
+        return value.body
+
+    @classmethod
+    def decode(cls, value) -> Response:
+        return Response(value, media_type=JSON)
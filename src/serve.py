@@ -0,0 +1,192 @@
+"""
+Multi-worker server for src.main:app.
+
+The parent process loads and warms the model once, binds the listening
+socket and forks uvicorn workers that share both. Workers that die are
+restarted; SIGTERM or SIGINT stops them all.
+
+Usage:
+    python -m src.serve --host 0.0.0.0 --port 8000 [--workers N]
+"""
+import argparse
+import gc
+import logging
+import math
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+# One BLAS thread per worker; parallelism comes from the worker processes.
+# Set before NumPy is first imported so its thread pools pick them up.
+for _variable in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_variable, "1")
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker must stay up before a crash is restarted without delay
+RESTART_BACKOFF = 1.0
+
+
+def cpu_quota(cgroup_root="/sys/fs/cgroup"):
+    """
+    CPUs allowed by the container's CFS quota, from cgroup v2 or v1.
+    Returns:
+        Float CPU count, or None when no quota is set.
+    """
+    try:
+        with open(os.path.join(cgroup_root, "cpu.max")) as cpu_max:
+            quota, period = cpu_max.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us")) as quota_file:
+            quota = int(quota_file.read())
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us")) as period_file:
+            period = int(period_file.read())
+    except (OSError, ValueError):
+        return None
+    return None if quota <= 0 else quota / period
+
+
+def default_workers(cgroup_root="/sys/fs/cgroup") -> int:
+    # One worker per CPU of the quota (rounded up), capped at the CPUs we may run on
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    quota = cpu_quota(cgroup_root)
+    if quota is None:
+        return available
+    return max(1, min(available, math.ceil(quota)))
+
+
+def bind(host, port) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, app, log_level):
+    import uvicorn
+
+    # Let uvicorn install its own graceful-shutdown handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, lifespan="on", log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """
+    Fork and babysit uvicorn workers sharing one listening socket.
+    Args:
+        sock (socket, required): Bound listening socket.
+        app (ASGI app, required): Application served by each worker.
+        workers (int, required): Number of worker processes.
+        state_dir (str, required): Directory workers publish their state to.
+        log_level (str, optional): uvicorn log level.
+    """
+
+    def __init__(self, sock, app, workers, state_dir, log_level="info"):
+        self.sock = sock
+        self.app = app
+        self.workers = workers
+        self.state_dir = state_dir
+        self.log_level = log_level
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, self.app, self.log_level)
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        logger.info("Started worker %d", pid)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        from src.worker_state import remove
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            remove(self.state_dir, pid)
+            if self.stopping or started is None:
+                continue
+            logger.warning("Worker %d exited with status %d, restarting", pid, status)
+            if time.monotonic() - started < RESTART_BACKOFF:
+                time.sleep(RESTART_BACKOFF)
+            self.spawn()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", "0")),
+                        help="Worker processes (default: from the container CPU quota)")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+    workers = args.workers or default_workers()
+
+    import src.housing_predict as housing_predict
+    from src.main import app
+
+    # Split the L1 cache budget so the pod's total stays as configured
+    housing_predict.L1_CACHE_MAX_ENTRIES = max(1, housing_predict.L1_CACHE_MAX_ENTRIES // workers)
+    housing_predict.L1_CACHE_MAX_BYTES = max(1, housing_predict.L1_CACHE_MAX_BYTES // workers)
+    # Likewise the inference pools, so the workers together use the pod's CPUs rather than a multiple
+    if not housing_predict.INFERENCE_WORKERS:
+        housing_predict.INFERENCE_WORKERS = max(1, default_workers() // workers)
+    state_dir = tempfile.mkdtemp(prefix="mlapi-workers-")
+    housing_predict.WORKER_STATE_DIR = state_dir
+
+    started = time.perf_counter()
+    housing_predict.preload_model()
+    logger.info("Preloaded model in %.3fs, starting %d workers", time.perf_counter() - started, workers)
+
+    sock = bind(args.host, args.port)
+    # Keep preloaded objects out of the collector so it never dirties their shared pages
+    gc.freeze()
+    try:
+        Supervisor(sock, app, workers, state_dir, args.log_level).run()
+    finally:
+        sock.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
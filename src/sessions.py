@@ -0,0 +1,118 @@
+import asyncio
+import json
+from functools import partial
+
+from numpy import array
+from pydantic import ValidationError
+
+from src.batching import BatchQueueFull
+
+
+class PredictionSession:
+    """
+    One WebSocket connection streaming houses for prediction.
+    Each incoming message is a JSON record, or an array of records, holding a
+    client-chosen "id" next to the house fields. Houses are validated exactly
+    as model_class and queued on a micro-batcher shared by all connections.
+    Results are sent as soon as their batch completes, so they can arrive
+    out of order; each outgoing message is a JSON array of every result
+    ready at that point:
+        {"id": <ID>, "prediction": <AVG HOUSE VALUE>}
+        {"id": <ID>, "errors": <VALIDATION ERRORS>}
+        {"id": <ID>, "error": <MESSAGE>} when a valid house could not be scored
+    Flow control: a record holds one of max_in_flight slots from the moment
+    it is read until its result has been sent. With every slot taken the
+    session stops reading the socket, so a client that outpaces the model
+    is pushed back by TCP instead of growing this process's queues.
+    Args:
+        websocket (WebSocket, required): Accepted connection.
+        model_class (BaseModel, required): Pydantic model for a single house.
+        batcher (MicroBatcher, required): Batched inference path.
+        max_in_flight (int, optional): Records per connection awaiting their result.
+        registry (MetricsRegistry, optional): Where session metrics are recorded.
+    """
+
+    def __init__(self, websocket, model_class, batcher, max_in_flight=256, registry=None):
+        self.websocket = websocket
+        self.model_class = model_class
+        self.batcher = batcher
+        self.registry = registry
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._results = []
+        self._ready = asyncio.Event()
+
+    async def run(self):
+        # Ends when the client disconnects or a send fails
+        loop = asyncio.get_running_loop()
+        tasks = {loop.create_task(self._receive()), loop.create_task(self._send())}
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for task in done:
+            task.result()
+
+    async def _receive(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            text = message.get("text")
+            if text is None:
+                text = (message.get("bytes") or b"").decode("utf-8", "replace")
+            try:
+                payload = json.loads(text)
+            except ValueError as exc:
+                await self._slots.acquire()
+                self._result({"id": None, "errors": [{"type": "json_invalid", "loc": [], "msg": "JSON decode error",
+                                                      "ctx": {"error": str(exc)}}]}, "invalid")
+                continue
+            for record in payload if isinstance(payload, list) else [payload]:
+                await self._slots.acquire()
+                self._submit(record)
+
+    def _submit(self, record):
+        errors = []
+        record_id = None
+        if isinstance(record, dict):
+            if "id" in record:
+                record_id = record.pop("id")
+            else:
+                errors.append({"type": "missing", "loc": ["id"], "msg": "Field required", "input": record})
+        try:
+            # from_attributes, as FastAPI validates request bodies
+            house = self.model_class.model_validate(record, from_attributes=True)
+        except ValidationError as exc:
+            errors += json.loads(exc.json(include_url=False))
+        if errors:
+            self._result({"id": record_id, "errors": errors}, "invalid")
+            return
+        try:
+            future = self.batcher.enqueue(array(list(house.model_dump().values())))
+        except BatchQueueFull:
+            self._result({"id": record_id, "error": "Prediction queue is full"}, "rejected")
+            return
+        future.add_done_callback(partial(self._predicted, record_id))
+
+    def _predicted(self, record_id, future):
+        if future.cancelled() or future.exception() is not None:
+            self._result({"id": record_id, "error": "Prediction failed"}, "failed")
+        else:
+            self._result({"id": record_id, "prediction": future.result()}, "predicted")
+
+    def _result(self, result, outcome):
+        self._results.append(result)
+        self._ready.set()
+        if self.registry is not None:
+            self.registry.inc("session_records_total", (("outcome", outcome),))
+
+    async def _send(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            results, self._results = self._results, []
+            await self.websocket.send_text(json.dumps(results))
+            for _ in results:
+                self._slots.release()
@@ -0,0 +1,112 @@
+import json
+
+from numpy import array
+from pydantic import ValidationError
+from starlette.responses import StreamingResponse
+
+
+NDJSON = "application/x-ndjson"
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response that can be written while the request body is still
+    being read. Starlette's StreamingResponse listens for disconnects by
+    calling receive(), which would consume request body messages meant for
+    the endpoint's own request.stream() loop.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_lines(chunks, max_line_bytes):
+    """
+    Split an async byte stream on newlines without holding more than one line.
+    Yields:
+        Each non-blank line as bytes, or None for a line longer than
+        max_line_bytes, which is discarded.
+    """
+    buffer = bytearray()
+    skipping = False
+    async for chunk in chunks:
+        view = memoryview(chunk)
+        start = 0
+        while start < len(chunk):
+            end = chunk.find(b"\n", start)
+            if skipping:
+                # Drop the rest of an oversized line without buffering it
+                if end < 0:
+                    break
+                skipping = False
+                start = end + 1
+                continue
+            stop = len(chunk) if end < 0 else end
+            if len(buffer) + stop - start > max_line_bytes:
+                buffer.clear()
+                skipping = True
+                yield None
+                continue
+            buffer += view[start:stop]
+            if end < 0:
+                break
+            if buffer.strip():
+                yield bytes(buffer)
+            buffer.clear()
+            start = end + 1
+    if not skipping and buffer.strip():
+        yield bytes(buffer)
+
+
+def _line(record: dict) -> bytes:
+    return (json.dumps(record) + "\n").encode()
+
+
+async def predict_ndjson(lines, model_class, predict_fn, chunk_size):
+    """
+    Validate newline-delimited records and predict them in fixed-size chunks.
+    Args:
+        lines (async iterator, required): Lines from iter_lines.
+        model_class (BaseModel, required): Pydantic model for a single record.
+        predict_fn (async callable, required): Takes an (N, 8) array and
+            returns N predictions.
+        chunk_size (int, required): Valid rows per model call.
+    Yields:
+        One NDJSON line per input record, in input order:
+        {"row": <INDEX>, "prediction": <AVG HOUSE VALUE>} or
+        {"row": <INDEX>, "errors": <PYDANTIC ERROR LIST>}
+    """
+    pending = []
+    rows = []
+    index = 0
+
+    async def flush():
+        predictions = iter((await predict_fn(array(rows))).tolist()) if rows else iter(())
+        for row_index, errors in pending:
+            if errors is None:
+                yield _line({"row": row_index, "prediction": next(predictions)})
+            else:
+                yield _line({"row": row_index, "errors": errors})
+        pending.clear()
+        rows.clear()
+
+    async for line in lines:
+        if line is None:
+            pending.append((index, [{"type": "line_too_long", "loc": [], "msg": "Line too long"}]))
+        else:
+            try:
+                record = model_class.model_validate_json(line)
+            except ValidationError as exc:
+                pending.append((index, json.loads(exc.json(include_url=False))))
+            else:
+                pending.append((index, None))
+                rows.append(list(record.model_dump().values()))
+        index += 1
+        if len(rows) >= chunk_size or len(pending) >= 4 * chunk_size:
+            async for output in flush():
+                yield output
+
+    async for output in flush():
+        yield output
@@ -0,0 +1,123 @@
+import asyncio
+import heapq
+import logging
+import time
+
+import numpy as np
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+
+class HotInputs:
+    """
+    Bounded, frequency-ranked record of the inputs requested most often.
+    Requests are counted in process; once more than twice `capacity` distinct
+    inputs are held, all but the `capacity` most counted are dropped. Counts
+    are periodically added to a Redis sorted set shared by every worker and
+    pod, trimmed to its `capacity` highest scores, so a pod starting cold can
+    read what the fleet has been asked for. The set is independent of the
+    model version and cache prefix, so it survives both changing.
+    Args:
+        capacity (int, required): Inputs kept in Redis, and in process between flushes.
+        key (str, optional): Redis key of the sorted set.
+        ttl (int, optional): Seconds the set is kept after its last update.
+    """
+
+    def __init__(self, capacity, key="hot-inputs", ttl=7 * 86400):
+        self.capacity = capacity
+        self.key = key
+        self.ttl = ttl
+        self.redis = None
+        self.counts = {}
+        self._flusher = None
+
+    def __len__(self):
+        return len(self.counts)
+
+    def record(self, row: tuple):
+        counts = self.counts
+        counts[row] = counts.get(row, 0) + 1
+        if len(counts) > 2 * self.capacity:
+            self.counts = dict(heapq.nlargest(self.capacity, counts.items(), key=lambda item: item[1]))
+
+    async def flush(self):
+        # Add the counts since the last flush to Redis; best effort, a failed flush drops them
+        counts, self.counts = self.counts, {}
+        if not counts or self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for row, count in counts.items():
+                    pipe.zincrby(self.key, count, np.array(row, dtype="<f8").tobytes())
+                pipe.zremrangebyrank(self.key, 0, -self.capacity - 1)
+                pipe.expire(self.key, self.ttl)
+                await pipe.execute()
+        except (RedisError, OSError) as exc:
+            logger.warning("Could not record hot inputs: %s", exc)
+
+    async def top(self, limit: int) -> np.ndarray:
+        """
+        Most requested inputs across the fleet, most frequent first.
+        Returns:
+            Feature matrix of shape (K, 8) with K <= limit; empty when Redis
+            cannot be reached.
+        """
+        members = []
+        if self.redis is not None and limit > 0:
+            try:
+                members = await self.redis.zrevrange(self.key, 0, limit - 1)
+            except (RedisError, OSError) as exc:
+                logger.warning("Could not read hot inputs: %s", exc)
+        rows = b"".join(member for member in members if len(member) == 64)
+        return np.frombuffer(rows, dtype="<f8").reshape(-1, 8).astype(np.float64)
+
+    async def _flush_every(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def start(self, redis, interval: float):
+        # redis must not decode responses: members are packed float64 rows
+        self.redis = redis
+        if self._flusher is None and interval > 0:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_every(interval))
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        self.redis = None
+
+
+async def warm_up(fill, served, budget: float, enabled=True) -> dict:
+    """
+    Fill the cache for a model version within a time budget.
+    Warm-up is best effort: it never fails startup or a model load, and is
+    abandoned once `budget` seconds have passed.
+    Args:
+        fill (callable, required): Coroutine function taking the ServedModel
+            and returning {"rows": <ROWS WRITTEN>}.
+        served (ServedModel, required): Version to warm.
+        budget (float, required): Seconds allowed.
+        enabled (bool, optional): Report "disabled" without warming when false.
+    Returns:
+        {"status": <"warmed", "timeout", "failed" OR "disabled">, "rows": <ROWS WRITTEN>, "seconds": <SECONDS>}
+    """
+    if not enabled:
+        return {"status": "disabled", "rows": 0, "seconds": 0.0}
+    started = time.perf_counter()
+    report = {"status": "warmed", "rows": 0}
+    try:
+        report.update(await asyncio.wait_for(fill(served), budget))
+    except asyncio.TimeoutError:
+        report["status"] = "timeout"
+    except Exception:
+        logger.exception("Cache warm-up for model version %s failed", served.version)
+        report["status"] = "failed"
+    report["seconds"] = time.perf_counter() - started
+    logger.info("Cache warm-up for model version %s: %s", served.version, report)
+    return report
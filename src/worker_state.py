@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+
+
+def merge_stats(total: dict, stats: dict) -> dict:
+    """
+    Add one worker's stats into a running total.
+    Numbers are summed, nested dicts such as histogram snapshots are merged
+    recursively, and strings are kept when all workers agree and become
+    "mixed" otherwise.
+    Args:
+        total (dict, required): Running total, updated in place.
+        stats (dict, required): Stats from one worker.
+    Returns:
+        total
+    """
+    for name, value in stats.items():
+        if name not in total:
+            total[name] = merge_stats({}, value) if isinstance(value, dict) else value
+        elif isinstance(value, dict):
+            merge_stats(total[name], value)
+        elif isinstance(value, str):
+            total[name] = value if total[name] == value else "mixed"
+        elif value is not None:
+            total[name] = (total[name] or 0) + value
+    return total
+
+
+def publish(directory: str, state: dict):
+    # Atomically replace this worker's state file
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    staging = f"{path}.tmp"
+    with open(staging, "w") as output:
+        json.dump(state, output)
+    os.replace(staging, path)
+
+
+def read_peers(directory: str) -> list:
+    """
+    Read the states published by the other workers.
+    Returns:
+        List of (pid, state) tuples, skipping this process and unreadable files.
+    """
+    own = f"{os.getpid()}.json"
+    peers = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json") or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as state_file:
+                peers.append((int(name[:-len(".json")]), json.load(state_file)))
+        except (OSError, ValueError):
+            # The worker exited or is mid-write; its next publish replaces the file
+            continue
+    return peers
+
+
+def remove(directory: str, pid: int):
+    try:
+        os.remove(os.path.join(directory, f"{pid}.json"))
+    except FileNotFoundError:
+        pass
+
+
+class StatePublisher:
+    """
+    Periodically write this worker's state where sibling workers can read it.
+    Args:
+        directory (str, required): Directory shared by all workers.
+        collect (callable, required): Returns the JSON-serializable state.
+        interval (float, optional): Seconds between publishes.
+    """
+
+    def __init__(self, directory, collect, interval=1.0):
+        self.directory = directory
+        self.collect = collect
+        self.interval = interval
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        remove(self.directory, os.getpid())
+
+    async def _run(self):
+        while True:
+            try:
+                publish(self.directory, self.collect())
+            except OSError as exc:
+                logger.warning("Could not publish worker state: %s", exc)
+            await asyncio.sleep(self.interval)
@@ -1,3 +1,33 @@
 from unittest import mock
 
+import numpy as np
+import pytest
+
 mock.patch("fastapi_cache.decorator.cache", lambda *args, **kwargs: lambda f: f).start()
+
+
+@pytest.fixture
+def random_features():
+    # Builds (rows, 8) matrices of valid houses; modules pick their own seed so their rows stay distinct
+    def build(rows, seed):
+        rng = np.random.default_rng(seed)
+        return np.column_stack([rng.uniform(1, 10, (rows, 6)), rng.uniform(33, 40, rows),
+                                rng.uniform(-123, -115, rows)])
+
+    return build
+
+
+@pytest.fixture
+def restore_app(monkeypatch):
+    # Undo the Redis stand-in and admission switch of benchmarks.bench_api.configure_app after the test
+    from redis import asyncio as redis_asyncio
+
+    import src.housing_predict as housing_predict
+
+    sub_application = housing_predict.sub_application_housing_predict
+    monkeypatch.setattr(redis_asyncio, "from_url", redis_asyncio.from_url)
+    monkeypatch.setattr(housing_predict, "redis_client", housing_predict.redis_client)
+    monkeypatch.setattr(housing_predict, "ADMISSION_ENABLED", housing_predict.ADMISSION_ENABLED)
+    monkeypatch.setattr(sub_application, "user_middleware", sub_application.user_middleware)
+    monkeypatch.setattr(sub_application, "middleware_stack", None)
+    monkeypatch.delenv("ADMISSION_ENABLED", raising=False)
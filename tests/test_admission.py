@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import src.housing_predict as housing_predict
+from src.admission import AdmissionController, AdmissionMiddleware, PriorityClass, Rejected, reserve_rows
+from src.main import app
+from src.metrics import MetricsMiddleware, MetricsRegistry, timed_handler
+
+
+HOUSE = {"MedInc": 8.3252, "HouseAge": 41.0, "AveRooms": 6.98, "AveBedrms": 1.02,
+         "Population": 322.0, "AveOccup": 2.55, "Latitude": 37.88, "Longitude": -122.23}
+
+
+def test_priority_class_queue():
+    # Waiters get freed slots in order; a full queue or an expired wait is refused
+    async def scenario():
+        priority = PriorityClass("bulk", concurrency=1, max_queue=1, max_wait=0.05)
+        await priority.acquire()
+        waiting = asyncio.ensure_future(priority.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected) as full:
+            await priority.acquire()
+        priority.release()
+        await waiting
+        handed_over = priority.in_flight
+        with pytest.raises(Rejected) as expired:
+            await priority.acquire()
+        priority.release()
+        return full.value, handed_over, expired.value, priority.in_flight, priority.queued
+
+    full, handed_over, expired, in_flight, queued = asyncio.run(scenario())
+    assert (full.status, full.reason) == (429, "queue_full")
+    assert handed_over == 1
+    assert (expired.status, expired.reason) == (429, "timeout")
+    assert (in_flight, queued) == (0, 0)
+
+
+def test_saturated_class_is_refused_fast():
+    # Requests beyond a class budget get a quick 429 while exempt routes keep answering
+    registry = MetricsRegistry()
+    controller = AdmissionController([PriorityClass("bulk", 2, max_queue=0)], {"/slow": "bulk"},
+                                     max_rows=10, retry_after=3, registry=registry)
+    inner = FastAPI()
+
+    @inner.get("/slow")
+    async def slow():
+        reserve_rows(4)
+        await asyncio.sleep(0.2)
+        return {"rows": controller.rows_in_flight}
+
+    @inner.get("/health")
+    async def inner_health():
+        return {"in_flight": controller.classes["bulk"].in_flight}
+
+    inner.add_middleware(AdmissionMiddleware, controller=controller)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=inner)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            requests = [asyncio.ensure_future(client.get("/slow")) for _ in range(5)]
+            await asyncio.sleep(0.05)
+            started = time.perf_counter()
+            health = await client.get("/health")
+            health_seconds = time.perf_counter() - started
+            return await asyncio.gather(*requests), health, health_seconds
+
+    responses, health, health_seconds = asyncio.run(scenario())
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 429, 429, 429]
+    refused = next(response for response in responses if response.status_code == 429)
+    assert refused.headers["retry-after"] == "3"
+    # Both admitted requests held their rows at once
+    assert max(response.json()["rows"] for response in responses if response.status_code == 200) == 8
+    assert health.json() == {"in_flight": 2} and health_seconds < 0.1
+    assert controller.rows_in_flight == 0 and controller.classes["bulk"].in_flight == 0
+    assert registry.counters["admission_rejected_total"] == {(("class", "bulk"), ("reason", "queue_full")): 3}
+
+
+def test_bulk_row_cap(monkeypatch):
+    # Bulk requests reserve their rows: too large is 413, over the shared cap is 503
+    monkeypatch.setattr(housing_predict.admission, "max_rows", 2)
+    with TestClient(app) as lifespanned_client:
+        too_large = lifespanned_client.post("/lab/bulk-predict", json={"houses": [HOUSE] * 3})
+        monkeypatch.setattr(housing_predict.admission, "rows_in_flight", 1)
+        over_cap = lifespanned_client.post("/lab/bulk-predict", json={"houses": [HOUSE] * 2})
+        monkeypatch.setattr(housing_predict.admission, "rows_in_flight", 0)
+        fits = lifespanned_client.post("/lab/bulk-predict", json={"houses": [HOUSE] * 2})
+        stats = lifespanned_client.get("/lab/admission").json()
+    assert too_large.status_code == 413
+    assert over_cap.status_code == 503 and over_cap.headers["retry-after"] == "1"
+    assert fits.status_code == 200
+    assert stats["enabled"] and stats["rows_in_flight"] == 0 and stats["max_rows"] == 2
+
+
+def test_interactive_unaffected_by_saturated_bulk(monkeypatch):
+    # A saturated bulk class does not refuse /predict or health probes
+    bulk = housing_predict.admission.classes["bulk"]
+    monkeypatch.setattr(bulk, "in_flight", bulk.concurrency)
+    monkeypatch.setattr(bulk, "max_queue", 0)
+    with TestClient(app) as lifespanned_client:
+        refused = lifespanned_client.post("/lab/bulk-predict", json={"houses": [HOUSE]})
+        predicted = lifespanned_client.post("/lab/predict", json=HOUSE)
+        health = lifespanned_client.get("/lab/health")
+        metrics_text = lifespanned_client.get("/lab/metrics").text
+    assert refused.status_code == 429 and refused.json() == {"detail": "Too many bulk requests"}
+    assert predicted.status_code == 200 and health.status_code == 200
+    assert 'http_requests_total{route="/bulk-predict",method="POST",status="429"} 1' in metrics_text
+    assert 'admission_rejected_total{class="bulk",reason="queue_full"}' in metrics_text
+
+
+def test_admission_wait_is_its_own_stage():
+    # Time queued for admission is reported as the admission stage, not as validation
+    registry = MetricsRegistry()
+    controller = AdmissionController([PriorityClass("bulk", 1, max_queue=1, max_wait=1)], {"/slow": "bulk"},
+                                     max_rows=10)
+    inner = FastAPI()
+
+    @inner.get("/slow")
+    @timed_handler
+    async def slow():
+        await asyncio.sleep(0.1)
+        return {}
+
+    inner.add_middleware(AdmissionMiddleware, controller=controller)
+    inner.add_middleware(MetricsMiddleware, registry=registry)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=inner)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await asyncio.gather(client.get("/slow"), client.get("/slow"))
+
+    asyncio.run(scenario())
+    stages = registry.histograms["http_request_stage_seconds"]
+    admission = stages[(("route", "/slow"), ("stage", "admission"))]
+    validation = stages[(("route", "/slow"), ("stage", "validation"))]
+    assert admission.count == 2 and admission.sum > 0.08
+    assert validation.sum < 0.05
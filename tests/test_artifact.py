@@ -0,0 +1,94 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from joblib import load
+from numpy.testing import assert_allclose
+
+import src.housing_predict as housing_predict
+from src.artifact import StaleArtifact, build_artifact, load_artifact
+from src.cache import model_version
+from src.inference import InferenceExecutor
+from src.main import app
+
+
+MODEL = load("model_pipeline.pkl")
+FEATURES = np.array([[8.3252, 41.0, 6.984127, 1.023810, 322.0, 2.555556, 37.88, -122.23],
+                     [np.nan, 80.0, 6.984127, 1.023810, 352.0, 2.555556, 37.98, -122.23]])
+
+
+def test_artifact_round_trip(tmp_path):
+    # The artifact predicts like the pipeline with its arrays memory-mapped
+    path = str(tmp_path / "artifact")
+    build_artifact("model_pipeline.pkl", path)
+    predictor = load_artifact(path, model_version("model_pipeline.pkl"))
+    assert_allclose(predictor.predict(FEATURES), MODEL.predict(FEATURES), rtol=1e-9, atol=1e-9)
+    for name in ("support_vectors", "support_vectors_t", "support_norms", "dual_coef"):
+        assert isinstance(getattr(predictor, name).base, np.memmap), name
+    assert len(predictor.dual_coef) == len(MODEL.steps[-1][1].support_)
+
+
+def test_stale_artifact(tmp_path):
+    # Missing, foreign-format and other-model artifacts are refused
+    path = str(tmp_path / "artifact")
+    with pytest.raises(StaleArtifact):
+        load_artifact(path)
+    build_artifact("model_pipeline.pkl", path)
+    with pytest.raises(StaleArtifact):
+        load_artifact(path, "retrained")
+    manifest_path = tmp_path / "artifact" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest_path.write_text(json.dumps({**manifest, "format": 0}))
+    with pytest.raises(StaleArtifact):
+        load_artifact(path)
+
+
+def test_artifact_skips_sklearn(tmp_path):
+    # Loading the artifact and predicting never imports sklearn
+    path = str(tmp_path / "artifact")
+    build_artifact("model_pipeline.pkl", path)
+    code = ("import sys; from src.artifact import load_artifact; "
+            f"load_artifact({path!r}).predict([[1.0] * 8]); print('sklearn' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_startup_from_artifact(tmp_path, monkeypatch):
+    # The app serves from the artifact and reports its startup breakdown
+    path = str(tmp_path / "artifact")
+    build_artifact("model_pipeline.pkl", path)
+    monkeypatch.setattr(housing_predict, "MODEL_ARTIFACT_PATH", path)
+    house = dict(zip(housing_predict.FEATURE_NAMES, FEATURES[0].tolist()))
+    with TestClient(app) as lifespanned_client:
+        report = lifespanned_client.get("/lab/startup").json()
+        response = lifespanned_client.post("/lab/bulk-predict", json={"houses": [house]})
+        metrics = lifespanned_client.get("/lab/metrics").text
+    assert report["model_source"] == "artifact"
+    assert {"boot", "model_load", "predictor", "executor", "lifespan"} <= set(report["stages_seconds"])
+    assert_allclose(response.json()["predictions"], MODEL.predict(FEATURES[:1]))
+    assert 'startup_stage_seconds{stage="model_load"}' in metrics
+
+
+def test_startup_falls_back_to_pickle(tmp_path, monkeypatch):
+    # Without an artifact the pickle is loaded instead
+    monkeypatch.setattr(housing_predict, "MODEL_ARTIFACT_PATH", str(tmp_path / "missing"))
+    with TestClient(app) as lifespanned_client:
+        assert lifespanned_client.get("/lab/startup").json()["model_source"] == "pickle"
+
+
+def test_process_workers_load_artifact(tmp_path, monkeypatch):
+    # Process workers load the same artifact through the app's loader
+    path = str(tmp_path / "artifact")
+    build_artifact("model_pipeline.pkl", path)
+    # Spawned workers read the artifact location from the environment
+    monkeypatch.setenv("MODEL_ARTIFACT_PATH", path)
+    executor = InferenceExecutor(None, kind="process", workers=1, loader=housing_predict.load_model)
+    try:
+        predictions = asyncio.run(executor.predict(FEATURES))
+    finally:
+        executor.shutdown()
+    assert_allclose(predictions, MODEL.predict(FEATURES), rtol=1e-9, atol=1e-9)
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from numpy import array
+
+import src.housing_predict as housing_predict
+from src.batching import BatchQueueFull, MicroBatcher
+from src.main import app
+
+
+HOUSE = {"MedInc": 8.3252,
+         "HouseAge": 41.0,
+         "AveRooms": 6.984127,
+         "AveBedrms": 1.023810,
+         "Population": 322.0,
+         "AveOccup": 2.555556,
+         "Latitude": 37.88,
+         "Longitude": -122.23}
+
+
+def test_batcher_coalesces_rows():
+    # Concurrent submissions are flushed as one matrix and returned in order
+    calls = []
+
+    async def fake_predict(features):
+        calls.append(features.shape)
+        return features[:, 0] * 2
+
+    async def run():
+        batcher = MicroBatcher(fake_predict, max_batch_size=8, max_wait_us=50_000)
+        await batcher.start()
+        results = await asyncio.gather(
+            *[batcher.submit(array([float(i)] * 8)) for i in range(5)]
+        )
+        await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert calls == [(5, 8)]
+    assert stats["batch_size"]["count"] == 1
+    assert stats["queue_wait_seconds"]["count"] == 5
+
+
+def test_batcher_flushes_at_size_limit():
+    # Batches never exceed max_batch_size
+    calls = []
+
+    async def fake_predict(features):
+        calls.append(len(features))
+        return features[:, 0]
+
+    async def run():
+        batcher = MicroBatcher(fake_predict, max_batch_size=2, max_wait_us=50_000)
+        await batcher.start()
+        await asyncio.gather(*[batcher.submit(array([1.0] * 8)) for _ in range(5)])
+        await batcher.stop()
+
+    asyncio.run(run())
+    assert calls == [2, 2, 1]
+
+
+def test_batcher_queue_full():
+    # Rows beyond the queue depth are rejected instead of queued
+    async def fake_predict(features):
+        return features[:, 0]
+
+    async def run():
+        batcher = MicroBatcher(fake_predict, max_queue_depth=1)
+        pending = asyncio.ensure_future(batcher.submit(array([1.0] * 8)))
+        await asyncio.sleep(0)
+        with pytest.raises(BatchQueueFull):
+            await batcher.submit(array([2.0] * 8))
+        await batcher.start()
+        assert await pending == 1.0
+        await batcher.stop()
+
+    asyncio.run(run())
+
+
+def test_batcher_survives_cancelled_prediction():
+    # A cancelled model call fails only its own batch; the worker keeps serving
+    calls = []
+
+    async def fake_predict(features):
+        calls.append(len(features))
+        if len(calls) == 1:
+            raise asyncio.CancelledError()
+        return features[:, 0]
+
+    async def run():
+        batcher = MicroBatcher(fake_predict, max_wait_us=0)
+        await batcher.start()
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await asyncio.wait_for(batcher.submit(array([1.0] * 8)), 1)
+        result = await asyncio.wait_for(batcher.submit(array([2.0] * 8)), 1)
+        await batcher.stop()
+        return result
+
+    assert asyncio.run(run()) == 2.0
+    assert calls == [1, 1]
+
+
+def test_predict_with_batching(monkeypatch):
+    # Batched endpoint returns the same prediction as the direct path
+    with TestClient(app) as lifespanned_client:
+        expected = lifespanned_client.post("/lab/predict", json=HOUSE).json()
+        assert lifespanned_client.get("/lab/batching").json() == {"enabled": False}
+
+    monkeypatch.setattr(housing_predict, "BATCHING_ENABLED", True)
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/predict", json=HOUSE)
+        assert response.status_code == 200
+        assert response.json()["prediction"] == pytest.approx(expected["prediction"])
+        stats = lifespanned_client.get("/lab/batching").json()
+        assert stats["enabled"] is True
+        assert stats["batch_size"]["count"] == 1
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import src.housing_predict as housing_predict
+from benchmarks.bench_api import HouseSource, compare, main, percentiles
+
+
+def result(p95_ms, requests_per_s, batch_size=10):
+    return {"endpoint": "/lab/bulk-predict", "batch_size": batch_size, "concurrency": 1,
+            "hit_ratio": 0.0, "p95_ms": p95_ms, "requests_per_s": requests_per_s}
+
+
+def test_percentiles():
+    # Latencies in seconds are reported as millisecond percentiles
+    stats = percentiles([0.001] * 99 + [0.1])
+    assert stats["p50_ms"] == pytest.approx(1.0)
+    assert stats["p99_ms"] > stats["p95_ms"]
+
+
+def test_house_source_hit_ratio():
+    # Roughly hit_ratio of generated houses come from the warmed set
+    source = HouseSource(0.5, hot_size=8)
+    hot = {json.dumps(house) for house in source.hot}
+    hits = sum(json.dumps(house) in hot for house in source.houses(2000))
+    assert 0.4 < hits / 2000 < 0.6
+
+
+def test_compare_flags_regressions():
+    # Slower p95 or lower throughput beyond the threshold are regressions
+    baseline = {"results": [result(10.0, 100.0), result(10.0, 100.0, batch_size=100)]}
+    current = {"results": [result(10.5, 99.0), result(20.0, 50.0, batch_size=100),
+                           result(1.0, 1.0, batch_size=1000)]}
+    regressions = compare(baseline, current, threshold=0.1)
+    assert len(regressions) == 2
+    assert all("100" in regression for regression in regressions)
+
+
+def test_benchmark_smoke(tmp_path, restore_app):
+    # A minimal sweep runs end to end and writes machine-readable results
+    pytest.importorskip("fakeredis")
+    output = tmp_path / "bench.json"
+    assert main(["--output", str(output), "--requests", "5", "--batch-sizes", "10",
+                 "--concurrency", "2", "--hit-ratios", "0.5"]) == 0
+    report = json.loads(output.read_text())
+    assert len(report["results"]) == 2
+    assert all(scenario["errors"] == 0 for scenario in report["results"])
+    assert {"p50_ms", "p95_ms", "p99_ms", "requests_per_s", "rss_mb"} <= set(report["results"][0])
+
+
+def test_benchmark_without_admission(tmp_path, restore_app):
+    # Admission control is switched off even though the app was imported with it on
+    pytest.importorskip("fakeredis")
+    output = tmp_path / "bench.json"
+    assert main(["--output", str(output), "--requests", "40", "--batch-sizes", "10",
+                 "--concurrency", "32", "--hit-ratios", "0"]) == 0
+    bulk = json.loads(output.read_text())["results"][1]
+    assert bulk["endpoint"] == "/lab/bulk-predict" and bulk["errors"] == 0
+    assert not housing_predict.ADMISSION_ENABLED
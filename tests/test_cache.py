@@ -0,0 +1,358 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+import numpy as np
+import pytest
+from numpy import array
+from numpy.testing import assert_allclose
+
+import src.housing_predict as housing_predict
+from src.cache import (
+    CircuitBreakerBackend,
+    FeatureKeyBuilder,
+    LRUCache,
+    PredictionCodec,
+    TieredBackend,
+    model_version,
+    parse_precision,
+    redis_client,
+)
+from src.main import app
+
+
+class FakeRemote:
+    # Minimal stand-in for RedisBackend that counts round trips
+    def __init__(self):
+        self.store = {}
+        self.gets = 0
+
+    async def get_with_ttl(self, key):
+        self.gets += 1
+        return (-1, self.store[key]) if key in self.store else (-2, None)
+
+    async def get(self, key):
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key, value, expire=None):
+        self.store[key] = value
+
+    async def get_many(self, keys):
+        self.gets += 1
+        return [self.store.get(key) for key in keys]
+
+    async def set_many(self, mapping, expire=None):
+        self.store.update(mapping)
+
+    async def clear(self, namespace=None, key=None):
+        self.store.pop(key, None)
+        return 1
+
+
+class FlakyRemote(FakeRemote):
+    # Remote that fails or stalls until told to recover
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.down = True
+        self.delay = delay
+        self.calls = 0
+
+    async def get_with_ttl(self, key):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.down:
+            raise ConnectionError("redis unavailable")
+        return await super().get_with_ttl(key)
+
+    async def get(self, key):
+        return (await self.get_with_ttl(key))[1]
+
+
+def test_lru_evicts_by_entries_and_bytes():
+    # Oldest entries are evicted once either bound is exceeded
+    cache = LRUCache(max_entries=2, max_bytes=10, ttl=60)
+    cache.set("a", "1234")
+    cache.set("b", "1234")
+    cache.get("a")
+    cache.set("c", "1234")
+    assert cache.get("b") == (0, None)
+    assert cache.get("a")[1] == "1234"
+    cache.set("d", "12345678")
+    assert len(cache) == 1 and cache.size == 8
+    cache.set("huge", "x" * 11)
+    assert cache.get("huge") == (0, None)
+
+
+def test_lru_ttl_expiry():
+    # Entries expire after their TTL
+    cache = LRUCache(max_entries=10, max_bytes=100, ttl=0.01)
+    cache.set("a", "value")
+    time.sleep(0.02)
+    assert cache.get("a") == (0, None)
+    assert cache.size == 0
+
+
+def test_tiered_fills_l1_on_remote_hit():
+    # A remote hit is served from L1 on the next lookup
+    remote = FakeRemote()
+    remote.store["key"] = "value"
+    backend = TieredBackend(remote, LRUCache(10, 1000, 60))
+
+    async def run():
+        first = await backend.get_with_ttl("key")
+        second = await backend.get_with_ttl("key")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first[1] == second[1] == "value"
+    assert remote.gets == 1
+    stats = backend.stats()
+    assert stats["remote_hits"] == 1 and stats["l1_hits"] == 1 and stats["l1_misses"] == 1
+
+
+def test_tiered_single_flight():
+    # Concurrent misses on one key compute once and share the result
+    remote = FakeRemote()
+    backend = TieredBackend(remote, LRUCache(10, 1000, 60))
+    computed = []
+
+    async def cached_call():
+        _, value = await backend.get_with_ttl("key")
+        if value is not None:
+            return value
+        computed.append(1)
+        await asyncio.sleep(0.01)
+        await backend.set("key", "value")
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*[cached_call() for _ in range(5)])
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert computed == [1]
+    assert backend.stats()["single_flight_waits"] == 4
+
+
+def test_tiered_single_flight_leader_fails():
+    # Waiters stop waiting as soon as the first caller fails or is cancelled, not at the timeout
+    backend = TieredBackend(FakeRemote(), LRUCache(10, 1000, 60), single_flight_timeout=5.0)
+
+    async def leader(failure):
+        assert await backend.get("key") is None
+        await asyncio.sleep(0.01)
+        raise failure
+
+    async def run(failure):
+        first = asyncio.get_running_loop().create_task(leader(failure))
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        values = await asyncio.gather(*[backend.get("key") for _ in range(3)])
+        with pytest.raises(type(failure)):
+            await first
+        return values, time.perf_counter() - started
+
+    for failure in (RuntimeError("model error"), asyncio.CancelledError()):
+        values, elapsed = asyncio.run(run(failure))
+        assert values == [None] * 3 and elapsed < 1
+        assert backend._inflight == {}
+
+
+def test_tiered_single_flight_timeout():
+    # Waiters compute themselves if the first caller never stores a value
+    backend = TieredBackend(FakeRemote(), LRUCache(10, 1000, 60), single_flight_timeout=0.01)
+
+    async def run():
+        assert await backend.get("key") is None
+        return await backend.get("key")
+
+    assert asyncio.run(run()) is None
+
+
+def test_cache_stats_endpoint():
+    # Tier counters are served from /lab/cache
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.get("/lab/cache")
+    assert response.status_code == 200
+    assert {"l1_hits", "remote_hits", "single_flight_waits"} <= set(response.json())
+
+
+def test_row_keys_canonical():
+    # Equal rows share a key regardless of dtype or sign of zero, different rows do not
+    builder = FeatureKeyBuilder(housing_predict.FEATURE_NAMES, version="v1")
+    features = array([[1, 2, 3, 4, 5, 6, 7, 8], [1, 2, 3, 4, 5, 6, 7, 8], [1, 2, 3, 4, 5, 6, 7, 9]])
+    keys = builder.row_keys(features, "prefix")
+    assert keys[0] == keys[1] != keys[2]
+    assert keys == builder.row_keys(features.astype(float), "prefix")
+    assert builder.row_keys([0.0] * 8, "p") == builder.row_keys([-0.0] * 8, "p")
+    assert keys[0].startswith("prefix:row:v1:")
+
+
+def test_parse_precision():
+    # Field-specific precision overrides the default for the remaining fields
+    names = housing_predict.FEATURE_NAMES
+    precision = parse_precision("HouseAge=0, 3,Latitude=2", names)
+    assert precision[names.index("HouseAge")] == 0
+    assert precision[names.index("Latitude")] == 2
+    assert precision[names.index("MedInc")] == 3
+    assert all(value != value for value in parse_precision("", names))
+
+
+def test_quantized_keys():
+    # Rounded fields map near-identical inputs to one key
+    names = housing_predict.FEATURE_NAMES
+    builder = FeatureKeyBuilder(names, parse_precision("HouseAge=0", names))
+    base = [8.3252, 41.0, 6.98, 1.02, 322.0, 2.55, 37.88, -122.23]
+    near = list(base)
+    near[1] = 41.00000001
+    other = list(base)
+    other[0] = 8.32520001
+    assert builder.row_keys(base, "p") == builder.row_keys(near, "p")
+    assert builder.row_keys(base, "p") != builder.row_keys(other, "p")
+
+
+def test_key_builder_for_predict():
+    # The fastapi_cache key builder reads the HousingPrediction and includes the model version
+    names = housing_predict.FEATURE_NAMES
+    house = housing_predict.HousingPrediction(**dict(zip(names, [41] * 6 + [37.88, -122.23])))
+    same = housing_predict.HousingPrediction(**dict(zip(names, [41.0] * 6 + [37.88, -122.23])))
+    old = FeatureKeyBuilder(names, version=model_version("model_pipeline.pkl"))
+    new = FeatureKeyBuilder(names, version="retrained")
+    key = old(housing_predict.predict, kwargs={"data": house})
+    assert key == old(housing_predict.predict, kwargs={"data": same})
+    assert key != new(housing_predict.predict, kwargs={"data": house})
+    assert ":predict:" in key
+
+
+def test_tiered_get_many():
+    # Multi-key lookups check L1 first and go remote once for the rest
+    remote = FakeRemote()
+    backend = TieredBackend(remote, LRUCache(10, 1000, 60))
+
+    async def run():
+        await backend.set_many({"a": "1", "b": "2"})
+        backend.l1.delete("b")
+        return await backend.get_many(["a", "b", "c"])
+
+    assert asyncio.run(run()) == ["1", "2", None]
+    assert remote.gets == 1
+    assert backend.stats()["l1_hits"] == 1 and backend.stats()["remote_hits"] == 1
+
+
+def test_cached_predict_rows_only_predicts_misses(monkeypatch):
+    # Overlapping batches only send new, distinct rows to the model
+    remote = FakeRemote()
+    monkeypatch.setattr(FastAPICache, "get_backend", classmethod(lambda cls: remote))
+    batches = []
+
+    async def fake_predict(features):
+        batches.append(features.copy())
+        return features[:, 0] * 10
+
+    monkeypatch.setattr(housing_predict, "predict_rows", fake_predict)
+    monkeypatch.setattr(housing_predict.models, "active",
+                        SimpleNamespace(key_builder=FeatureKeyBuilder(housing_predict.FEATURE_NAMES)))
+    first = array([[1.0] * 8, [2.0] * 8, [1.0] * 8])
+    second = array([[2.0] * 8, [3.0] * 8, [1.0] * 8])
+
+    assert_allclose(asyncio.run(housing_predict.cached_predict_rows(first)), [10, 20, 10])
+    assert_allclose(asyncio.run(housing_predict.cached_predict_rows(second)), [20, 30, 10])
+    assert [batch[:, 0].tolist() for batch in batches] == [[1.0, 2.0], [3.0]]
+    assert remote.gets == 2
+
+
+def test_prediction_codec():
+    # Packed values round-trip, compress only when it pays, and old text entries still decode
+    codec = PredictionCodec(compress_min_bytes=1024)
+    predictions = np.random.default_rng(0).uniform(0.5, 5, 1000)
+    packed = codec.encode(predictions)
+    repeated = codec.encode(np.repeat(predictions[:10], 100))
+    rows = codec.encode_rows(predictions[:3])
+
+    assert packed[:1] == b"d" and len(packed) == 8001
+    assert np.array_equal(codec.decode(packed), predictions)
+    assert repeated[:1] == b"D" and len(repeated) < 1000
+    assert np.array_equal(codec.decode(repeated), np.repeat(predictions[:10], 100))
+    assert np.array_equal(codec.decode_rows(rows), predictions[:3])
+    assert_allclose(codec.decode_rows([rows[0], None, b"2.5"]), [predictions[0], np.nan, 2.5])
+    assert_allclose(PredictionCodec("float32").decode(PredictionCodec("float32").encode(predictions)),
+                    predictions, rtol=1e-7)
+    with pytest.raises(ValueError):
+        PredictionCodec("float16")
+
+
+def test_cached_predict_rows_batch_entry(monkeypatch):
+    # Large batches are also stored whole, so repeating one is a single read
+    remote = FakeRemote()
+    monkeypatch.setattr(FastAPICache, "get_backend", classmethod(lambda cls: remote))
+    monkeypatch.setattr(housing_predict, "CACHE_BATCH_MIN_ROWS", 3)
+    calls = []
+
+    async def fake_predict(features):
+        calls.append(len(features))
+        return features[:, 0] * 10
+
+    monkeypatch.setattr(housing_predict, "predict_rows", fake_predict)
+    monkeypatch.setattr(housing_predict.models, "active",
+                        SimpleNamespace(key_builder=FeatureKeyBuilder(housing_predict.FEATURE_NAMES)))
+    features = array([[1.0] * 8, [2.0] * 8, [1.0] * 8])
+
+    first = asyncio.run(housing_predict.cached_predict_rows(features))
+    gets = remote.gets
+    second = asyncio.run(housing_predict.cached_predict_rows(features))
+
+    assert_allclose(first, [10, 20, 10])
+    assert_allclose(second, first)
+    assert calls == [2]
+    assert remote.gets == gets + 1
+    assert sorted(len(value) for value in remote.store.values()) == [9, 9, 25]
+
+
+def test_redis_client_pool_size():
+    # The cache client's pool is bounded and waits briefly for a free connection
+    client = redis_client("redis://localhost:6379/0", 7, 0.05)
+    assert client.connection_pool.max_connections == 7
+    assert client.connection_pool.timeout == 0.05
+
+
+def test_breaker_opens_and_recovers():
+    # Failures become misses, open the breaker, and a probe closes it again
+    remote = FlakyRemote()
+    breaker = CircuitBreakerBackend(remote, timeout=0.5, failure_threshold=2, probe_interval=0.01)
+
+    async def run():
+        assert await breaker.get_with_ttl("key") == (0, None)
+        assert await breaker.get_with_ttl("key") == (0, None)
+        assert breaker.state == "open"
+        calls = remote.calls
+        assert await breaker.get_many(["a", "b"]) == [None, None]
+        assert remote.calls == calls
+        remote.down = False
+        remote.store["key"] = "value"
+        await asyncio.sleep(0.05)
+        assert breaker.state == "closed"
+        assert await breaker.get("key") == "value"
+        await breaker.close()
+
+    asyncio.run(run())
+    stats = breaker.stats()
+    assert stats["errors"] == 2 and stats["opened"] == 1 and stats["short_circuits"] == 1
+    assert stats["remote_latency_seconds"]["count"] >= 3
+
+
+def test_breaker_timeout():
+    # Slow operations are cut off at the timeout and counted
+    breaker = CircuitBreakerBackend(FlakyRemote(delay=1.0), timeout=0.01, failure_threshold=1,
+                                    probe_interval=10)
+
+    async def run():
+        started = time.perf_counter()
+        assert await breaker.get_with_ttl("key") == (0, None)
+        elapsed = time.perf_counter() - started
+        await breaker.close()
+        return elapsed
+
+    assert asyncio.run(run()) < 0.5
+    assert breaker.counters["timeouts"] == 1
+    assert breaker.state == "open"
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from numpy.testing import assert_array_equal
+
+import src.housing_predict as housing_predict
+from benchmarks.replay import main, payload
+from src.capture import CaptureMiddleware, CaptureRecord, TrafficCapture, read_capture
+from src.housing_predict import FEATURE_NAMES
+from src.main import app
+
+
+def write_capture(directory, requests):
+    capture = TrafficCapture(str(directory), sample_rate=1)
+    capture.open()
+    for route, features, cache_hits in requests:
+        record = capture.start(route)
+        record.status, record.latency = 200, 0.002
+        record.features, record.cache_hits = features, cache_hits
+        capture.write(record)
+    capture.close()
+    return capture
+
+
+def test_capture_round_trip(tmp_path, random_features):
+    # Records are read back with their features exact, and the file stops growing at max_bytes
+    features = random_features(12, seed=10)
+    capture = write_capture(tmp_path, [(0, features[0], 1), (1, features[1:6], 2)])
+    capture.write(CaptureRecord(0, 0.0))
+    requests = list(read_capture(capture.path))
+    assert [(request["endpoint"], request["rows"], request["cache_hits"]) for request in requests] == [
+        ("/predict", 1, 1), ("/bulk-predict", 5, 2)]
+    assert_array_equal(requests[1]["features"], features[1:6])
+    assert json.loads(payload(requests[0])) == dict(zip(FEATURE_NAMES, features[0].tolist()))
+    assert requests[0]["time"] <= requests[1]["time"]
+
+    small = TrafficCapture(str(tmp_path / "small"), sample_rate=1, max_bytes=150)
+    small.open()
+    for row in features:
+        record = small.start(0)
+        record.features = row
+        small.write(record)
+    small.close()
+    assert small.records == 2 and not small.active
+
+
+def test_capture_middleware(tmp_path, monkeypatch, random_features):
+    # Sampled requests are logged with status, rows and cache outcome; invalid bodies are not
+    features = random_features(12, seed=10)
+    houses = [dict(zip(FEATURE_NAMES, row)) for row in features.tolist()]
+    capture = TrafficCapture(str(tmp_path), sample_rate=1)
+    monkeypatch.setattr(housing_predict, "CAPTURE_SAMPLE_RATE", 1)
+    monkeypatch.setattr(housing_predict, "capture", capture)
+    sub_application = housing_predict.sub_application_housing_predict
+    monkeypatch.setattr(sub_application, "middleware_stack",
+                        CaptureMiddleware(sub_application.build_middleware_stack(), capture))
+    with TestClient(app) as lifespanned_client:
+        lifespanned_client.post("/lab/predict", json=houses[6])
+        lifespanned_client.post("/lab/bulk-predict", json={"houses": houses[7:]})
+        lifespanned_client.post("/lab/bulk-predict", json={"houses": houses[7:]})
+        lifespanned_client.post("/lab/predict", json={"MedInc": 1.0})
+        lifespanned_client.get("/lab/health")
+
+    requests = list(read_capture(capture.path))
+    assert [(request["endpoint"], request["status"], request["rows"]) for request in requests] == [
+        ("/predict", 200, 1), ("/bulk-predict", 200, 5), ("/bulk-predict", 200, 5)]
+    assert [request["cache_hits"] for request in requests] == [0, 0, 5]
+    assert_array_equal(requests[1]["features"], features[7:])
+    assert all(request["latency"] > 0 for request in requests)
+
+
+def test_replay_smoke(tmp_path, restore_app, random_features):
+    # A capture replays end to end, reporting latency and throughput per endpoint
+    pytest.importorskip("fakeredis")
+    features = random_features(12, seed=10)
+    capture = write_capture(tmp_path, [(0, row, 0) for row in features[:4]] + [(1, features, 3)])
+    output = tmp_path / "replay.json"
+    for speed in ("0", "1000"):
+        assert main([capture.path, "--output", str(output), "--speed", speed, "--concurrency", "2"]) == 0
+        report = json.loads(output.read_text())
+        assert [(result["endpoint"], result["requests"], result["errors"]) for result in report["results"]] == [
+            ("/bulk-predict", 1, 0), ("/predict", 4, 0)]
+        assert {"p50_ms", "p95_ms", "p99_ms", "requests_per_s", "rows_per_s"} <= set(report["results"][0])
+    assert report["capture"]["rows"] == 16 and not housing_predict.ADMISSION_ENABLED
+    assert report["capture"]["duplicate_row_ratio"] == pytest.approx(0.25)
+    assert report["capture"]["recorded_cache_hit_ratio"] == pytest.approx(3 / 16)
+    assert main([capture.path, "--output", str(tmp_path / "again.json"), "--speed", "0",
+                 "--compare", str(output), "--threshold", "1000"]) == 0
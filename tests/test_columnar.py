@@ -0,0 +1,203 @@
+import io
+import json
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
+from fastapi.testclient import TestClient
+from numpy.testing import assert_allclose, assert_array_equal
+
+from src.columnar import decode_records
+from src.housing_predict import FEATURE_NAMES, HousingPrediction, MultiplePredictions
+from src.main import app
+from src.responses import dumps
+
+
+FEATURES = np.array([[7.3252, 32.0, 6.984127, 2.023810, 392.0, 2.755556, 37.78, -122.23],
+                     [8.3252, 41.0, 6.984127, 1.023810, 322.0, 2.555556, 37.88, -122.23],
+                     [5.3252, 80.0, 6.984127, 1.023810, 352.0, 2.555556, 37.98, -122.23]])
+
+
+def json_columns(features):
+    return {name: features[:, i].tolist() for i, name in enumerate(FEATURE_NAMES)}
+
+
+def expected_predictions(client):
+    houses = [dict(zip(FEATURE_NAMES, row)) for row in FEATURES.tolist()]
+    return client.post("/lab/bulk-predict", json={"houses": houses}).json()["predictions"]
+
+
+def test_columnar_json():
+    # JSON columns give the same predictions as /bulk-predict
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict/columnar", json=json_columns(FEATURES))
+        assert response.status_code == 200
+        assert_allclose(response.json()["predictions"], expected_predictions(lifespanned_client))
+        # Encoded compactly, as /bulk-predict and FastAPI's JSONResponse are
+        assert response.content == dumps(response.json())
+
+
+def test_columnar_raw_bytes():
+    # Raw float64 bytes round-trip as raw float64 bytes
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict/columnar",
+                                           content=FEATURES.astype("<f8").tobytes(),
+                                           headers={"Content-Type": "application/octet-stream"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/octet-stream"
+        predictions = np.frombuffer(response.content, dtype="<f8")
+        assert_allclose(predictions, expected_predictions(lifespanned_client))
+
+
+def test_columnar_npy():
+    # .npy payloads return a .npy array
+    buffer = io.BytesIO()
+    np.save(buffer, FEATURES)
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict/columnar", content=buffer.getvalue(),
+                                           headers={"Content-Type": "application/x-npy"})
+        assert response.status_code == 200
+        predictions = np.load(io.BytesIO(response.content))
+        assert_allclose(predictions, expected_predictions(lifespanned_client))
+
+
+def test_columnar_arrow():
+    # Arrow IPC payloads return an Arrow table with a prediction column
+    pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    table = pyarrow.table(json_columns(FEATURES))
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict/columnar",
+                                           content=sink.getvalue().to_pybytes(),
+                                           headers={"Content-Type": "application/vnd.apache.arrow.stream"})
+        assert response.status_code == 200
+        result = pyarrow.ipc.open_stream(response.content).read_all()
+        assert_allclose(result.column("prediction").to_numpy(), expected_predictions(lifespanned_client))
+
+
+def test_columnar_latlong_rows():
+    # Out-of-range coordinates are reported with their row index
+    features = FEATURES.copy()
+    features[1, 6] = 97
+    features[2, 7] = -200
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict/columnar", json=json_columns(features))
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert [error["loc"] for error in detail] == [["body", 1, "Latitude"], ["body", 2, "Longitude"]]
+    assert detail[0]["msg"] == "Value error, Invalid value for Latitude"
+
+
+def test_columnar_missing_and_extra_columns():
+    # Missing and extra columns are rejected
+    columns = json_columns(FEATURES)
+    del columns["AveOccup"]
+    columns["Should"] = [1, 2, 3]
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict/columnar", json=columns)
+    assert response.status_code == 422
+    assert [error["msg"] for error in response.json()["detail"]] == [
+        "Field required", "Extra inputs are not permitted"]
+
+
+def test_columnar_bad_shape_and_type():
+    # Truncated binary bodies and unknown media types are rejected
+    with TestClient(app) as lifespanned_client:
+        truncated = lifespanned_client.post("/lab/bulk-predict/columnar", content=b"\x00" * 60,
+                                            headers={"Content-Type": "application/octet-stream"})
+        unsupported = lifespanned_client.post("/lab/bulk-predict/columnar", content=b"a,b",
+                                              headers={"Content-Type": "text/csv"})
+    assert truncated.status_code == 422
+    assert unsupported.status_code == 415
+
+
+def test_columnar_rejects_non_numeric():
+    # Nulls, strings and non-finite cells are rejected by column, as are non-numeric arrays
+    columns = json_columns(FEATURES)
+    columns["MedInc"][1] = None
+    columns["HouseAge"][0] = "old"
+    strings, archive = io.BytesIO(), io.BytesIO()
+    np.save(strings, FEATURES.astype(str))
+    np.savez(archive, features=FEATURES)
+    with TestClient(app) as lifespanned_client:
+        non_numeric = lifespanned_client.post("/lab/bulk-predict/columnar", json=columns)
+        infinite = lifespanned_client.post(
+            "/lab/bulk-predict/columnar", content=json.dumps({**json_columns(FEATURES), "AveRooms": [1, float("inf"), 2]}),
+            headers={"Content-Type": "application/json"})
+        arrays = [lifespanned_client.post("/lab/bulk-predict/columnar", content=buffer.getvalue(),
+                                          headers={"Content-Type": "application/x-npy"})
+                  for buffer in (strings, archive)]
+    assert non_numeric.status_code == infinite.status_code == 422
+    assert [(error["loc"], error["msg"]) for error in non_numeric.json()["detail"]] == [
+        (["body", "MedInc"], "Input should be a valid number"), (["body", "HouseAge"], "Input should be a valid number")]
+    assert [error["loc"] for error in infinite.json()["detail"]] == [["body", "AveRooms"]]
+    assert [response.status_code for response in arrays] == [422, 422]
+
+
+def test_columnar_binary_rejects_non_finite():
+    # inf and NaN in raw and .npy bodies are rejected per column instead of predicted or imputed
+    features = FEATURES.copy()
+    features[0, 2], features[1, 0], features[2, 2] = np.inf, np.nan, -np.inf
+    buffer = io.BytesIO()
+    np.save(buffer, features)
+    with TestClient(app) as lifespanned_client:
+        responses = [lifespanned_client.post("/lab/bulk-predict/columnar", content=content,
+                                             headers={"Content-Type": media})
+                     for content, media in ((features.astype("<f8").tobytes(), "application/octet-stream"),
+                                            (buffer.getvalue(), "application/x-npy"))]
+    for response in responses:
+        assert response.status_code == 422
+        assert [(error["loc"], error["msg"]) for error in response.json()["detail"]] == [
+            (["body", "MedInc"], "Input should be a finite number"),
+            (["body", "AveRooms"], "Input should be a finite number")]
+
+
+def test_bulk_validation_matches_pydantic():
+    # Column-wise validation of /bulk-predict reports the same errors as per-row pydantic models
+    reference = FastAPI()
+
+    @reference.post("/bulk-predict")
+    async def reference_predict(data: MultiplePredictions):
+        return {"predictions": [0.0] * len(data.houses)}
+
+    house = dict(zip(FEATURE_NAMES, FEATURES[0].tolist()))
+    payloads = [
+        {"houses": [house, {**house, "Latitude": 97}, {**house, "Longitude": -200, "Latitude": -91}]},
+        {"houses": [{**house, "Latitude": 100}, {**house, "MedInc": "abc", "Extra": 1}, {**house, "Latitude": "95"}]},
+        {"houses": [house, {key: value for key, value in house.items() if key != "AveOccup"}, 5, None]},
+        {"houses": [{**house, "MedInc": "2.5", "HouseAge": True, "AveRooms": 10 ** 400}, [1, 2]]},
+        {"houses": "not a list"},
+        {"other": []},
+        [house],
+    ]
+    with TestClient(app) as lifespanned_client, TestClient(reference) as reference_client:
+        for payload in payloads:
+            response = lifespanned_client.post("/lab/bulk-predict", json=payload)
+            expected = reference_client.post("/bulk-predict", json=payload)
+            assert response.status_code == expected.status_code == 422
+            assert response.json() == expected.json()
+        # Coerced values are predicted as pydantic would parse them
+        coerced = {**house, "MedInc": str(house["MedInc"]), "HouseAge": int(house["HouseAge"])}
+        response = lifespanned_client.post("/lab/bulk-predict", json={"houses": [coerced, house]})
+        predictions = response.json()["predictions"]
+        assert predictions[0] == predictions[1]
+        schema = lifespanned_client.get("/lab/openapi.json").json()
+    body = schema["paths"]["/bulk-predict"]["post"]["requestBody"]["content"]["application/json"]["schema"]
+    assert body["properties"]["houses"]["items"] == {"$ref": "#/components/schemas/HousingPrediction"}
+
+
+def test_decode_records_large_batch():
+    # Large valid batches convert column-wise to the same matrix as pydantic builds
+    features = np.random.default_rng(5).uniform(-80, 80, (20000, 8))
+    houses = [dict(zip(FEATURE_NAMES, row)) for row in features.tolist()]
+    assert_array_equal(decode_records(houses, HousingPrediction, FEATURE_NAMES), features)
+    assert decode_records([], HousingPrediction, FEATURE_NAMES).shape == (0, 8)
+    houses[12345]["Longitude"] = 181
+    with pytest.raises(RequestValidationError) as raised:
+        decode_records(houses, HousingPrediction, FEATURE_NAMES, loc=("houses",))
+    assert [error["loc"] for error in raised.value.errors()] == [["body", "houses", 12345, "Longitude"]]
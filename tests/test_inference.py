@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from joblib import load
+from numpy import array
+from numpy.testing import assert_allclose
+
+import src.housing_predict as housing_predict
+from src.inference import InferenceExecutor
+from src.main import app
+
+
+FEATURES = array([[8.3252, 41.0, 6.984127, 1.023810, 322.0, 2.555556, 37.88, -122.23],
+                  [5.3252, 80.0, 6.984127, 1.023810, 352.0, 2.555556, 37.98, -122.23]])
+
+
+@pytest.mark.parametrize("kind", ["inline", "thread", "process"])
+def test_executor_matches_model(kind):
+    # Every executor kind returns the same predictions as the model itself
+    model = load("model_pipeline.pkl")
+    executor = InferenceExecutor(model, kind=kind, workers=1)
+    try:
+        predictions = asyncio.run(executor.predict(FEATURES))
+    finally:
+        executor.shutdown()
+    assert_allclose(predictions, model.predict(FEATURES))
+
+
+def test_executor_default_workers(monkeypatch):
+    # The default pool size follows the container's CPU quota, not the host's CPU count
+    monkeypatch.setattr("src.serve.default_workers", lambda: 3)
+    executor = InferenceExecutor(None, kind="inline")
+    assert executor.workers == 3
+
+
+def test_executor_invalid_kind():
+    # Unknown executor kinds are rejected
+    with pytest.raises(ValueError):
+        InferenceExecutor(None, kind="gpu")
+
+
+def test_bulk_predict_inline(monkeypatch):
+    # Inline mode still serves bulk predictions
+    monkeypatch.setattr(housing_predict, "INFERENCE_EXECUTOR", "inline")
+    houses = [dict(zip(housing_predict.HousingPrediction.model_fields, row)) for row in FEATURES.tolist()]
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict", json={"houses": houses})
+        assert response.status_code == 200
+        assert len(response.json()["predictions"]) == 2
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from numpy.testing import assert_allclose
+
+import src.housing_predict as housing_predict
+from src.housing_predict import FEATURE_NAMES
+from src.jobs import JobQueueFull, JobRunner, MemoryJobStore, RedisJobStore
+from src.main import app
+from src.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def memory_jobs(monkeypatch):
+    monkeypatch.setattr(housing_predict, "JOB_STORE", "memory")
+    monkeypatch.setattr(housing_predict, "JOB_CHUNK_SIZE", 100)
+
+
+def houses(features):
+    return [dict(zip(FEATURE_NAMES, row)) for row in features.tolist()]
+
+
+def wait_for(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/lab/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_inline_job_results(memory_jobs, random_features):
+    # An inline batch is scored in chunks and can be paged or streamed back
+    features = random_features(350, seed=7)
+    with TestClient(app) as lifespanned_client:
+        expected = lifespanned_client.post("/lab/bulk-predict",
+                                           json={"houses": houses(features)}).json()["predictions"]
+        submitted = lifespanned_client.post("/lab/jobs", json={"houses": houses(features)})
+        assert submitted.status_code == 202
+        job = wait_for(lifespanned_client, submitted.json()["id"])
+        pages, offset = [], 0
+        while offset is not None:
+            page = lifespanned_client.get(f"/lab/jobs/{job['id']}/results",
+                                          params={"offset": offset, "limit": 120}).json()
+            pages += page["predictions"]
+            offset = page["next_offset"]
+        streamed = lifespanned_client.get(f"/lab/jobs/{job['id']}/results/stream")
+        deleted = lifespanned_client.delete(f"/lab/jobs/{job['id']}")
+        missing = lifespanned_client.get(f"/lab/jobs/{job['id']}")
+
+    assert job["status"] == "succeeded"
+    assert (job["rows_total"], job["rows_done"], job["chunks_done"]) == (350, 350, 4)
+    assert job["model_version"] == streamed.headers["x-model-version"]
+    assert_allclose(pages, expected)
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [line["row"] for line in lines] == list(range(350))
+    assert_allclose([line["prediction"] for line in lines], expected)
+    assert deleted.json() == {"id": job["id"], "deleted": True}
+    assert missing.status_code == 404
+
+
+def test_job_submission_validation(memory_jobs, random_features):
+    # Invalid inline houses are rejected up front, like /bulk-predict
+    bad = houses(random_features(3, seed=7))
+    bad[2]["Latitude"] = 95
+    with TestClient(app) as lifespanned_client:
+        invalid = lifespanned_client.post("/lab/jobs", json={"houses": bad})
+        both = lifespanned_client.post("/lab/jobs", json={"houses": [], "file": "x.npy"})
+        disabled = lifespanned_client.post("/lab/jobs", json={"file": "x.npy"})
+    assert invalid.status_code == 422
+    assert invalid.json()["detail"][0]["loc"] == ["body", "houses", 2, "Latitude"]
+    assert both.status_code == 422
+    assert disabled.status_code == 404
+
+
+def test_file_job(memory_jobs, tmp_path, monkeypatch, random_features):
+    # Feature files are read from JOB_INPUT_DIR; invalid contents fail the job
+    features = random_features(350, seed=7)
+    monkeypatch.setattr(housing_predict, "JOB_INPUT_DIR", str(tmp_path))
+    np.save(tmp_path / "houses.npy", features)
+    invalid = features.copy()
+    invalid[5, 7] = -200
+    np.save(tmp_path / "invalid.npy", invalid)
+    with TestClient(app) as lifespanned_client:
+        job = wait_for(lifespanned_client,
+                       lifespanned_client.post("/lab/jobs", json={"file": "houses.npy"}).json()["id"])
+        first = lifespanned_client.get(f"/lab/jobs/{job['id']}/results", params={"limit": 5}).json()
+        failed = wait_for(lifespanned_client,
+                          lifespanned_client.post("/lab/jobs", json={"file": "invalid.npy"}).json()["id"])
+        unfinished = lifespanned_client.get(f"/lab/jobs/{failed['id']}/results")
+        escaped = lifespanned_client.post("/lab/jobs", json={"file": "../houses.npy"})
+        expected = lifespanned_client.post("/lab/bulk-predict",
+                                           json={"houses": houses(features[:5])}).json()["predictions"]
+
+    assert job["status"] == "succeeded" and job["source"] == "houses.npy"
+    assert_allclose(first["predictions"], expected)
+    assert first["next_offset"] == 5
+    assert failed["status"] == "failed" and failed["error"] == "Invalid input"
+    assert failed["errors"][0]["loc"] == ["body", 5, "Longitude"]
+    assert unfinished.status_code == 409
+    assert escaped.status_code == 404
+
+
+def test_file_job_rejects_non_finite(memory_jobs, tmp_path, monkeypatch, random_features):
+    # inf and NaN in binary files fail the job by column, and a non-finite prediction is never stored
+    features = random_features(350, seed=7)
+    features[200, 2], features[300, 0] = np.inf, np.nan
+    monkeypatch.setattr(housing_predict, "JOB_INPUT_DIR", str(tmp_path))
+    np.save(tmp_path / "houses.npy", features)
+    features.astype("<f8").tofile(tmp_path / "houses.f64")
+    with TestClient(app) as lifespanned_client:
+        failed = [wait_for(lifespanned_client,
+                           lifespanned_client.post("/lab/jobs", json={"file": name}).json()["id"])
+                  for name in ("houses.npy", "houses.f64")]
+        results = lifespanned_client.get(f"/lab/jobs/{failed[0]['id']}/results")
+
+    for job in failed:
+        assert job["status"] == "failed" and job["error"] == "Invalid input"
+        assert [error["loc"] for error in job["errors"]] == [["body", "MedInc"], ["body", "AveRooms"]]
+    assert results.status_code == 409
+
+    async def scenario():
+        async def predict(rows):
+            return np.where(rows[:, 0] > 5, np.nan, rows[:, 0])
+
+        served = SimpleNamespace(version="v1", predict=predict, acquire=lambda: None, release=lambda: None)
+        store = MemoryJobStore()
+        runner = JobRunner(store, SimpleNamespace(active=served), MetricsRegistry(), chunk_size=4)
+        rows = np.full((10, 8), 1.0)
+        rows[6, 0] = 9.0
+        job = await runner.submit("inline", lambda: rows)
+        while (await runner.get(job["id"]))["status"] in ("queued", "running"):
+            await asyncio.sleep(0.01)
+        return await runner.get(job["id"]), [line async for line in runner.stream(await runner.get(job["id"]))]
+
+    job, lines = asyncio.run(scenario())
+    assert job["status"] == "failed" and job["error"] == "Non-finite prediction for row 6"
+    assert job["chunks_done"] == 1 and b"nan" not in b"".join(lines)
+
+
+def test_runner_limits_and_cancellation(random_features):
+    # Jobs beyond max_running wait, beyond max_pending are refused, and shutdown fails the rest
+    features = random_features(10, seed=7)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def predict(rows):
+            await release.wait()
+            if rows[0, 0] == features[5, 0]:
+                # The third job never finishes on its own
+                await asyncio.Event().wait()
+            return rows[:, 0]
+
+        served = SimpleNamespace(version="v1", predict=predict, acquire=lambda: None, release=lambda: None)
+        registry = MetricsRegistry()
+        runner = JobRunner(MemoryJobStore(), SimpleNamespace(active=served), registry,
+                           chunk_size=2, max_running=1, max_pending=3)
+        first = await runner.submit("inline", lambda: features[:5])
+        second = await runner.submit("inline", lambda: features[:5])
+        third = await runner.submit("inline", lambda: features[5:10])
+        with pytest.raises(JobQueueFull):
+            await runner.submit("inline", lambda: features[:5])
+        await asyncio.sleep(0.05)
+        statuses = [(await runner.get(job["id"]))["status"] for job in (first, second)]
+
+        assert await runner.cancel(second["id"])
+        release.set()
+        while (await runner.get(third["id"]))["status"] != "running":
+            await asyncio.sleep(0.01)
+        await runner.close()
+        return statuses, [await runner.get(job["id"]) for job in (first, second, third)], registry
+
+    statuses, (first, second, third), registry = asyncio.run(scenario())
+    assert statuses == ["running", "queued"]
+    assert first["status"] == "succeeded" and first["chunks_done"] == 3
+    assert second["status"] == "cancelled"
+    assert third["status"] == "failed" and third["error"] == "Interrupted by shutdown"
+    assert registry.counters["jobs_total"] == {(("status", "succeeded"),): 1, (("status", "cancelled"),): 1,
+                                               (("status", "failed"),): 1}
+
+
+def test_redis_job_store():
+    # Job records and result chunks round-trip through Redis
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        store = RedisJobStore(fakeredis.FakeAsyncRedis(decode_responses=True), ttl=60)
+        await store.save({"id": "abc", "status": "running"})
+        for chunk in ("[1.0, 2.0]", "[3.0]"):
+            await store.append_chunk("abc", chunk)
+        job, chunks = await store.get("abc"), await store.chunks("abc", 1, 5)
+        ttl = await store.redis.ttl("jobs:abc:results")
+        await store.delete("abc")
+        return job, chunks, ttl, await store.get("abc")
+
+    job, chunks, ttl, deleted = asyncio.run(scenario())
+    assert job == {"id": "abc", "status": "running"}
+    assert chunks == ["[3.0]"]
+    assert 0 < ttl <= 60
+    assert deleted is None
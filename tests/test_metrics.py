@@ -0,0 +1,70 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from src.housing_predict import metrics
+from src.main import app
+from src.metrics import Histogram, MetricsRegistry, render_histogram
+
+
+HOUSE = {"MedInc": 8.3252,
+         "HouseAge": 41.0,
+         "AveRooms": 6.984127,
+         "AveBedrms": 1.023810,
+         "Population": 322.0,
+         "AveOccup": 2.555556,
+         "Latitude": 37.88,
+         "Longitude": -122.23}
+
+
+def test_histogram_snapshot_is_cumulative():
+    # Bucket counts accumulate and overflow lands in +Inf
+    histogram = Histogram((1, 10))
+    for value in (0.5, 5, 5, 50):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 1, "10": 3, "+Inf": 4}
+    assert snapshot["count"] == 4 and snapshot["sum"] == 60.5
+
+
+def test_registry_render():
+    # Counters, gauges and histograms render in Prometheus text format
+    registry = MetricsRegistry()
+    registry.inc("requests_total", (("route", "/predict"),))
+    registry.inc("requests_total", (("route", "/predict"),))
+    registry.set_gauge("in_flight", 3)
+    registry.observe("latency_seconds", 0.002, (("route", "/predict"),), buckets=(0.001, 0.01))
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/predict"} 2' in text
+    assert "in_flight 3" in text
+    assert 'latency_seconds_bucket{route="/predict",le="0.001"} 0' in text
+    assert 'latency_seconds_bucket{route="/predict",le="0.01"} 1' in text
+    assert 'latency_seconds_count{route="/predict"} 1' in text
+    assert render_histogram("h", Histogram((1,)).snapshot())[-1] == "h_count 0"
+
+
+def test_metrics_endpoint_stage_breakdown():
+    # Prediction requests are counted per route with their stage timings
+    metrics.reset()
+    uncached = [dict(HOUSE, MedInc=1.23456789), dict(HOUSE, MedInc=2.3456789)]
+    with TestClient(app) as lifespanned_client:
+        lifespanned_client.post("/lab/predict", json=HOUSE)
+        lifespanned_client.post("/lab/bulk-predict", json={"houses": uncached})
+        lifespanned_client.post("/lab/predict", json={"MedInc": "bad"})
+        lifespanned_client.post("/lab/bulk-predict/stream", content=json.dumps(HOUSE) + "\n",
+                                headers={"Content-Type": "application/x-ndjson"})
+        response = lifespanned_client.get("/lab/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_requests_total{route="/predict",method="POST",status="200"} 1' in text
+    assert 'http_requests_total{route="/predict",method="POST",status="422"} 1' in text
+    for stage in ("validation", "features", "model", "serialization"):
+        assert f'http_request_stage_seconds_count{{route="/predict",stage="{stage}"}} 1' in text
+    assert 'http_request_stage_seconds_count{route="/bulk-predict",stage="cache_lookup"} 1' in text
+    for stage in ("validation", "serialization"):
+        assert f'http_request_stage_seconds_count{{route="/bulk-predict/stream",stage="{stage}"}} 1' in text
+    assert 'model_batch_rows_sum 4' in text
+    assert "http_requests_in_flight 1" in text
+    assert "cache_l1_hits" in text
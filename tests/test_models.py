@@ -0,0 +1,175 @@
+import asyncio
+import shutil
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from joblib import dump, load
+from numpy.testing import assert_allclose
+
+import src.housing_predict as housing_predict
+from src.cache import model_version
+from src.main import app
+from src.metrics import MetricsRegistry
+from src.models import ModelManager, ServedModel
+
+
+HOUSES = [
+    {"MedInc": 8.3252, "HouseAge": 41.0, "AveRooms": 6.98, "AveBedrms": 1.02,
+     "Population": 322.0, "AveOccup": 2.55, "Latitude": 37.88, "Longitude": -122.23},
+    {"MedInc": 3.1, "HouseAge": 12.0, "AveRooms": 4.2, "AveBedrms": 1.1,
+     "Population": 1200.0, "AveOccup": 3.1, "Latitude": 34.05, "Longitude": -118.24},
+]
+HEADERS = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    # A model directory holding a "retrained" model whose scaler is shifted
+    retrained = load("model_pipeline.pkl")
+    retrained.steps[1][1].center_ = retrained.steps[1][1].center_ + 0.5
+    dump(retrained, tmp_path / "retrained.pkl")
+    monkeypatch.setattr(housing_predict, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(housing_predict, "ADMIN_TOKEN", "secret")
+    return tmp_path
+
+
+def bulk(client, **headers):
+    return client.post("/lab/bulk-predict", json={"houses": HOUSES}, headers=headers)
+
+
+def test_admin_reload_replaces_model(model_dir):
+    # A loaded version is warmed, compared with the active one and swapped in
+    retrained = load(model_dir / "retrained.pkl")
+    features = np.array([list(house.values()) for house in HOUSES])
+    with TestClient(app) as lifespanned_client:
+        before = bulk(lifespanned_client)
+        report = lifespanned_client.post("/lab/admin/models", json={"name": "retrained.pkl"},
+                                         headers=HEADERS).json()
+        after = bulk(lifespanned_client)
+        info = lifespanned_client.get("/lab/admin/models", headers=HEADERS).json()
+
+    version = model_version(model_dir / "retrained.pkl")
+    assert report["version"] == version and report["max_abs_diff"] > 0
+    assert before.headers["x-model-version"] == model_version("model_pipeline.pkl")
+    assert after.headers["x-model-version"] == version
+    assert info["active"]["version"] == version and info["candidate"] is None
+    assert_allclose(after.json()["predictions"], retrained.predict(features))
+
+
+def test_canary_routing_and_promotion(model_dir):
+    # Canary traffic share, explicit version pins and promotion
+    original = model_version("model_pipeline.pkl")
+    candidate = model_version(model_dir / "retrained.pkl")
+    with TestClient(app) as lifespanned_client:
+        lifespanned_client.post("/lab/admin/models", headers=HEADERS,
+                                json={"name": "retrained.pkl", "rollout": "canary", "percent": 100})
+        assert bulk(lifespanned_client).headers["x-model-version"] == candidate
+        assert bulk(lifespanned_client, **{"X-Model-Version": original}).headers["x-model-version"] == original
+        assert bulk(lifespanned_client, **{"X-Model-Version": "unknown"}).status_code == 404
+
+        lifespanned_client.patch("/lab/admin/models/candidate", headers=HEADERS,
+                                 json={"rollout": "canary", "percent": 0})
+        assert bulk(lifespanned_client).headers["x-model-version"] == original
+        assert bulk(lifespanned_client, **{"X-Model-Version": candidate}).headers["x-model-version"] == candidate
+
+        info = lifespanned_client.post("/lab/admin/models/promote", headers=HEADERS).json()
+        assert info["active"]["version"] == candidate and info["candidate"] is None
+        assert lifespanned_client.post("/lab/admin/models/promote", headers=HEADERS).status_code == 409
+
+
+def test_shadow_compares_without_serving(model_dir):
+    # Shadowed batches are answered by the active model and compared in the background
+    original = model_version("model_pipeline.pkl")
+    candidate = model_version(model_dir / "retrained.pkl")
+    with TestClient(app) as lifespanned_client:
+        lifespanned_client.post("/lab/admin/models", headers=HEADERS,
+                                json={"name": "retrained.pkl", "rollout": "shadow", "percent": 100})
+        # Distinct houses so the batch misses the prediction cache
+        houses = [{**house, "HouseAge": 30.123} for house in HOUSES]
+        response = lifespanned_client.post("/lab/bulk-predict", json={"houses": houses})
+        assert response.headers["x-model-version"] == original
+        deadline = time.monotonic() + 5
+        while f'shadow_abs_error_count{{version="{candidate}"}} 2' not in (
+                metrics := lifespanned_client.get("/lab/metrics").text):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        lifespanned_client.delete("/lab/admin/models/candidate", headers=HEADERS)
+        assert lifespanned_client.get("/lab/admin/models", headers=HEADERS).json()["candidate"] is None
+    assert f'model_rows_total{{version="{original}"}}' in metrics
+
+
+def test_rejected_loads(model_dir):
+    # Broken files fail warm-up without touching the active model; paths outside MODEL_DIR are refused
+    (model_dir / "broken.pkl").write_bytes(b"not a pickle")
+    with TestClient(app) as lifespanned_client:
+        assert lifespanned_client.post("/lab/admin/models", json={"name": "broken.pkl"},
+                                       headers=HEADERS).status_code == 422
+        assert lifespanned_client.post("/lab/admin/models", json={"name": "../model_pipeline.pkl"},
+                                       headers=HEADERS).status_code == 404
+        assert lifespanned_client.post("/lab/admin/models", json={"name": "retrained.pkl"}).status_code == 403
+        assert bulk(lifespanned_client).headers["x-model-version"] == model_version("model_pipeline.pkl")
+
+
+def test_watched_directory(tmp_path, monkeypatch):
+    # A model copied into the watched directory is picked up without an admin call
+    monkeypatch.setattr(housing_predict, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(housing_predict, "MODEL_WATCH_INTERVAL", 0.05)
+    retrained = load("model_pipeline.pkl")
+    retrained.steps[1][1].center_ = retrained.steps[1][1].center_ - 0.5
+    with TestClient(app) as lifespanned_client:
+        dump(retrained, tmp_path / "staging")
+        shutil.move(tmp_path / "staging", tmp_path / "next.pkl")
+        version = model_version(tmp_path / "next.pkl")
+        deadline = time.monotonic() + 10
+        while bulk(lifespanned_client).headers["x-model-version"] != version:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+
+def test_retire_waits_for_in_flight():
+    # A swapped-out version is released only after its requests finish
+    class Executor:
+        closed = False
+
+        def shutdown(self):
+            Executor.closed = True
+
+    served = ServedModel("v1", "model.pkl", None, None, Executor(), None)
+
+    async def run():
+        served.acquire()
+        retiring = asyncio.create_task(served.retire())
+        await asyncio.sleep(0.01)
+        assert not retiring.done() and not Executor.closed
+        served.release()
+        await asyncio.wait_for(retiring, 1)
+
+    asyncio.run(run())
+    assert Executor.closed
+
+
+def test_serving_active_holds_version():
+    # Work outside a request, such as a WebSocket session batch, keeps its version from being retired
+    class Executor:
+        closed = False
+
+        def shutdown(self):
+            Executor.closed = True
+
+    manager = ModelManager(MetricsRegistry())
+    manager.active = ServedModel("v1", "model.pkl", None, None, Executor(), None)
+
+    async def run():
+        with manager.serving_active() as served:
+            assert manager.current() is served and served.in_flight == 1
+            manager.active = ServedModel("v2", "model.pkl", None, None, None, None)
+            retiring = asyncio.create_task(served.retire())
+            await asyncio.sleep(0.01)
+            assert manager.current() is served and not Executor.closed
+        await asyncio.wait_for(retiring, 1)
+        return manager.current().version
+
+    assert asyncio.run(run()) == "v2"
+    assert Executor.closed
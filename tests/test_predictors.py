@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from joblib import load
+from numpy.testing import assert_allclose
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+import src.housing_predict as housing_predict
+from src.main import app
+from src.predictors import (
+    FusedSVRPredictor,
+    UnsupportedModel,
+    approximate_predictor,
+    build_predictor,
+    landmark_indices,
+    nystroem_predictor,
+    reduced_precision_predictor,
+    reference_features,
+)
+
+
+MODEL = load("model_pipeline.pkl")
+LOCATION = np.array([3.8, 28.0, 5.4, 1.1, 1430.0, 3.1, 35.6, -119.6])
+SPREAD = np.array([2.0, 12.0, 2.5, 0.5, 1100.0, 1.0, 2.1, 2.0])
+
+
+def random_houses(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return LOCATION + rng.normal(size=(rows, 8)) * SPREAD
+
+
+def test_fused_matches_pipeline_random():
+    # Fused predictor matches the pipeline across chunk boundaries
+    predictor = FusedSVRPredictor.from_pipeline(MODEL, chunk_size=64)
+    features = random_houses(500)
+    assert_allclose(predictor.predict(features), MODEL.predict(features), rtol=1e-9, atol=1e-9)
+
+
+def test_fused_matches_pipeline_edge_cases():
+    # Single rows, missing values and extreme inputs match the pipeline
+    predictor = FusedSVRPredictor.from_pipeline(MODEL)
+    features = np.array([
+        LOCATION,
+        [np.nan, 41.0, 6.98, 1.02, 322.0, 2.56, 37.88, -122.23],
+        [np.nan] * 8,
+        [0.0] * 6 + [-90.0, -180.0],
+        [1e6, 1e6, 1e6, 1e6, 1e9, 1e6, 90.0, 180.0],
+    ])
+    for row in features:
+        assert_allclose(predictor.predict(row.reshape(1, -1)), MODEL.predict(row.reshape(1, -1)),
+                        rtol=1e-9, atol=1e-9)
+    assert_allclose(predictor.predict(features), MODEL.predict(features), rtol=1e-9, atol=1e-9)
+    assert predictor.predict(np.empty((0, 8))).shape == (0,)
+
+
+def test_fused_standard_scaler():
+    # StandardScaler pipelines are supported as well as RobustScaler, including without centering or scaling
+    features = random_houses(200, seed=1)
+    for scaler in (StandardScaler(), StandardScaler(with_mean=False), StandardScaler(with_std=False)):
+        pipeline = make_pipeline(SimpleImputer(), scaler, SVR())
+        pipeline.fit(features, features[:, 0])
+        predictor = FusedSVRPredictor.from_pipeline(pipeline)
+        assert_allclose(predictor.predict(features), pipeline.predict(features), rtol=1e-9, atol=1e-9)
+
+
+def test_fused_rejects_bad_shape():
+    # Wrong feature count raises instead of silently broadcasting
+    predictor = FusedSVRPredictor.from_pipeline(MODEL)
+    with pytest.raises(ValueError):
+        predictor.predict(np.ones((2, 7)))
+
+
+def test_build_predictor_fallback():
+    # Unknown estimator types fall back to the pipeline itself
+    features = random_houses(50)
+    pipeline = make_pipeline(StandardScaler(), LinearRegression()).fit(features, features[:, 0])
+    with pytest.raises(UnsupportedModel):
+        FusedSVRPredictor.from_pipeline(pipeline)
+    assert build_predictor(pipeline) is pipeline
+    assert isinstance(build_predictor(MODEL), FusedSVRPredictor)
+
+
+def test_predict_fast_path_matches_pipeline(monkeypatch):
+    # /predict returns the same value with and without the fast path
+    house = dict(zip(housing_predict.HousingPrediction.model_fields, LOCATION.tolist()))
+    with TestClient(app) as lifespanned_client:
+        fast = lifespanned_client.post("/lab/predict", json=house).json()["prediction"]
+    monkeypatch.setattr(housing_predict, "FAST_PREDICTOR", False)
+    with TestClient(app) as lifespanned_client:
+        slow = lifespanned_client.post("/lab/predict", json=house).json()["prediction"]
+    assert fast == pytest.approx(slow, rel=1e-9)
+
+
+def test_approximation_within_tolerance():
+    # A Nystroem expansion is activated when it meets the error budget
+    exact = FusedSVRPredictor.from_pipeline(MODEL)
+    approx, report = approximate_predictor(exact, 500, max_error=10.0, mean_error=1.0)
+    assert report["active"] is True
+    assert approx is not exact
+    assert len(approx.dual_coef) == 500
+    assert report["max_abs_error"] <= 10.0
+    assert report["mean_abs_error"] <= report["max_abs_error"]
+
+
+def test_approximation_refused_above_tolerance():
+    # The exact predictor is kept when the approximation is too inaccurate
+    exact = FusedSVRPredictor.from_pipeline(MODEL)
+    served, report = approximate_predictor(exact, 50, max_error=1e-6, mean_error=1e-6)
+    assert served is exact
+    assert report["active"] is False
+    assert report["max_abs_error"] > 1e-6
+
+
+def test_approximation_reference_excludes_landmarks():
+    # The gate measures the expansion on rows that were not picked as its landmarks
+    exact = FusedSVRPredictor.from_pipeline(MODEL)
+    landmarks = nystroem_predictor(exact, 500).support_vectors * exact.scale + exact.center
+    reference = reference_features(exact, exclude=landmark_indices(exact, 500))
+    assert len(reference) == min(2000, len(exact.support_vectors) - 500)
+    assert not (reference[:, None, :] == landmarks[None, :, :]).all(axis=2).any()
+    _, report = approximate_predictor(exact, 500, max_error=10.0, mean_error=1.0)
+    errors = np.abs(nystroem_predictor(exact, 500).predict(reference) - exact.predict(reference))
+    assert report["max_abs_error"] == pytest.approx(errors.max())
+
+
+def test_approximation_requires_fused_predictor():
+    # Pipelines without a fused predictor are served exactly
+    served, report = approximate_predictor(MODEL, 500, max_error=10.0, mean_error=1.0)
+    assert served is MODEL
+    assert report["active"] is False
+
+
+def test_health_reports_approximation(monkeypatch):
+    # The startup approximation report is exposed on /lab/health
+    monkeypatch.setattr(housing_predict, "APPROX_MODE", "nystroem")
+    monkeypatch.setattr(housing_predict, "APPROX_COMPONENTS", 200)
+    monkeypatch.setattr(housing_predict, "APPROX_MAX_ERROR", 100.0)
+    monkeypatch.setattr(housing_predict, "APPROX_MEAN_ERROR", 100.0)
+    monkeypatch.setattr(housing_predict, "approximation_report", None)
+    with TestClient(app) as lifespanned_client:
+        report = lifespanned_client.get("/lab/health").json()["approximation"]
+    assert report["active"] is True
+    assert report["components"] == 200
+
+
+def test_float32_predictor_parity():
+    # float32 parameters and kernel stay within the gate of the float64 pipeline
+    exact = FusedSVRPredictor.from_pipeline(MODEL, chunk_size=64)
+    reduced, report = reduced_precision_predictor(exact, max_error=1e-3)
+    features = random_houses(500, seed=3)
+    assert report["active"] is True and report["dtype"] == "float32"
+    assert reduced.support_vectors.dtype == np.float32 and reduced.dual_coef.dtype == np.float32
+    assert reduced.support_vectors.nbytes * 2 == exact.support_vectors.nbytes
+    assert reduced.predict(features).dtype == np.float32
+    assert_allclose(reduced.predict(features), MODEL.predict(features), atol=1e-3)
+    assert report["max_abs_error"] <= 1e-3
+
+
+def test_float32_refused_above_tolerance():
+    # The float64 predictor is kept when float32 misses the gate, or cannot be built
+    exact = FusedSVRPredictor.from_pipeline(MODEL)
+    served, report = reduced_precision_predictor(exact, max_error=1e-9)
+    assert served is exact and report["active"] is False
+    served, report = reduced_precision_predictor(MODEL, max_error=1e-3)
+    assert served is MODEL and report["max_abs_error"] is None
+
+
+def test_health_reports_precision(monkeypatch):
+    # The float32 parity report is exposed on /lab/health and float32 answers stay close
+    house = dict(zip(housing_predict.FEATURE_NAMES, random_houses(1, seed=4)[0]))
+    monkeypatch.setattr(housing_predict, "INFERENCE_PRECISION", "float32")
+    with TestClient(app) as lifespanned_client:
+        health = lifespanned_client.get("/lab/health").json()
+        prediction = lifespanned_client.post("/lab/predict", json=house).json()["prediction"]
+        key_version = housing_predict.models.active.key_builder.version
+    assert health["precision"]["active"] is True
+    assert health["precision"]["max_abs_error"] <= housing_predict.PRECISION_MAX_ERROR
+    assert key_version.endswith(":float32")
+    assert prediction == pytest.approx(MODEL.predict([list(house.values())])[0], abs=1e-3)
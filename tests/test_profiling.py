@@ -0,0 +1,80 @@
+import time
+from collections import Counter
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import src.housing_predict as housing_predict
+from src.main import app
+from src.profiling import ProfileStore, ProfilingMiddleware, collapsed
+
+
+def busy_app(store, **kwargs):
+    profiled = FastAPI()
+    profiled.add_middleware(ProfilingMiddleware, store=store, interval=0.001, **kwargs)
+
+    @profiled.get("/busy")
+    def busy():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {"ok": True}
+
+    return profiled
+
+
+def test_profile_with_admin_token():
+    # A request carrying the admin token is sampled and its profile stored
+    store = ProfileStore(keep=5)
+    client = TestClient(busy_app(store, admin_token="secret"))
+    response = client.get("/busy", headers={"X-Profile": "secret"})
+    assert response.status_code == 200
+    profile = store.get(int(response.headers["x-profile-id"]))
+    assert profile["path"] == "/busy"
+    assert profile["duration_seconds"] >= 0.05
+    assert any("busy (test_profiling.py" in stack for stack in profile["samples"])
+
+
+def test_profile_not_selected():
+    # Wrong tokens and a zero sample rate leave requests unprofiled
+    store = ProfileStore(keep=5)
+    client = TestClient(busy_app(store, admin_token="secret"))
+    assert "x-profile-id" not in client.get("/busy", headers={"X-Profile": "wrong"}).headers
+    assert "x-profile-id" not in client.get("/busy").headers
+    assert store.summary() == []
+
+
+def test_profile_sample_rate_and_aggregate():
+    # Sampled profiles are retained up to the limit and aggregate into one flamegraph
+    store = ProfileStore(keep=2)
+    client = TestClient(busy_app(store, sample_rate=1.0))
+    for _ in range(3):
+        client.get("/busy")
+    summary = store.summary()
+    assert [profile["id"] for profile in summary] == [2, 3]
+    assert all(profile["sample_count"] > 0 for profile in summary)
+    lines = collapsed(store.aggregate()).splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_admin_endpoints(monkeypatch):
+    # Admin endpoints are hidden without a token and protected with one
+    with TestClient(app) as lifespanned_client:
+        assert lifespanned_client.get("/lab/admin/profiles").status_code == 404
+
+        monkeypatch.setattr(housing_predict, "ADMIN_TOKEN", "secret")
+        store = ProfileStore(keep=5)
+        monkeypatch.setattr(housing_predict, "profiles", store)
+        samples = Counter({"MainThread;predict (housing_predict.py:1)": 3})
+        profile_id = store.add("/predict", 0.0, 0.1, samples)
+
+        assert lifespanned_client.get("/lab/admin/profiles",
+                                      headers={"X-Admin-Token": "nope"}).status_code == 403
+        headers = {"X-Admin-Token": "secret"}
+        listing = lifespanned_client.get("/lab/admin/profiles", headers=headers).json()
+        assert listing["profiles"][0]["sample_count"] == 3
+        single = lifespanned_client.get(f"/lab/admin/profiles/{profile_id}", headers=headers)
+        assert single.text == collapsed(samples)
+        flamegraph = lifespanned_client.get("/lab/admin/profiles/flamegraph", headers=headers)
+        assert flamegraph.text == "MainThread;predict (housing_predict.py:1) 3\n"
+        assert lifespanned_client.get("/lab/admin/profiles/99", headers=headers).status_code == 404
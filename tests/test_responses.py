@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import src.responses as responses
+from src.main import app
+from src.responses import ResponseCoder, encode_predictions_json, prediction_response
+
+
+EDGE_VALUES = [1e-05, -3.2e-05, 0.0001, -0.0, 0.0, 2.5, 1 / 3, 1e15, 1e16, -1e22, 5e-324, 1.7976931348623157e308]
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_encoding_matches_json_response(fast, monkeypatch):
+    # Encoded predictions are byte-identical to JSONResponse, with and without orjson
+    if not fast:
+        monkeypatch.setattr(responses, "orjson", None)
+    random = np.random.default_rng(0).normal(2, 1, 10000)
+    for values in (np.array(EDGE_VALUES), random, random[:0], random.astype(np.float32)):
+        expected = JSONResponse({"predictions": values.astype(np.float64).tolist()}).body
+        assert encode_predictions_json(values) == expected
+
+
+def test_encoding_rejects_nan():
+    # Non-finite predictions fail just as they would in JSONResponse
+    with pytest.raises(ValueError):
+        encode_predictions_json(np.array([1.0, np.nan]))
+
+
+def test_response_coder_round_trip():
+    # Cached bodies are served back unchanged
+    response = prediction_response(np.float64(4.442319584582414))
+    assert response.body == JSONResponse({"prediction": 4.442319584582414}).body
+    cached = ResponseCoder.decode(ResponseCoder.encode(response))
+    assert cached.body == response.body
+    assert cached.media_type == "application/json"
+
+
+def test_bulk_predict_bytes_unchanged():
+    # The bulk endpoint returns the same bytes as the validated dict response did
+    rng = np.random.default_rng(3)
+    houses = [{"MedInc": float(income), "HouseAge": 20.0, "AveRooms": 5.0, "AveBedrms": 1.0,
+               "Population": 900.0, "AveOccup": 3.0, "Latitude": 36.1, "Longitude": -120.4}
+              for income in rng.uniform(1, 10, 300)]
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict", json={"houses": houses})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == JSONResponse({"predictions": response.json()["predictions"]}).body
@@ -0,0 +1,119 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+import src.housing_predict as housing_predict
+from src.main import app
+from src.metrics import MetricsRegistry
+from src.serve import cpu_quota, default_workers
+from src.worker_state import merge_stats
+
+
+def test_cpu_quota(tmp_path):
+    # Quotas are read from cgroup v2, then v1; "max" and -1 mean unlimited
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert cpu_quota(str(tmp_path)) == 1.5
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cpu_quota(str(tmp_path)) is None
+
+    v1 = tmp_path / "v1"
+    (v1 / "cpu").mkdir(parents=True)
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("50000\n")
+    (v1 / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert cpu_quota(str(v1)) == 0.5
+    assert default_workers(str(v1)) == 1
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert cpu_quota(str(v1)) is None
+    assert cpu_quota(str(tmp_path / "missing")) is None
+
+
+def test_registry_merge():
+    # Counters and histograms add up across workers; gauges stay per worker
+    first, second = MetricsRegistry(), MetricsRegistry()
+    for registry in (first, second):
+        registry.inc("requests", (("route", "/predict"),), 2)
+        registry.observe("latency", 0.003)
+        registry.set_gauge("in_flight", 1)
+    total = MetricsRegistry()
+    total.merge(json.loads(json.dumps(first.snapshot())), (("worker", 1),))
+    total.merge(json.loads(json.dumps(second.snapshot())), (("worker", 2),))
+    rendered = total.render()
+    assert 'requests{route="/predict"} 4' in rendered
+    assert 'latency_bucket{le="0.005"} 2' in rendered
+    assert 'in_flight{worker="1"} 1' in rendered and 'in_flight{worker="2"} 1' in rendered
+
+
+def test_merge_stats():
+    # Numbers and nested histograms are summed; disagreeing strings become "mixed"
+    total = merge_stats({}, {"hits": 1, "state": "closed", "latency": {"buckets": {"0.1": 1}, "count": 1}})
+    merge_stats(total, {"hits": 2, "state": "open", "latency": {"buckets": {"0.1": 3}, "count": 3}})
+    assert total == {"hits": 3, "state": "mixed", "latency": {"buckets": {"0.1": 4}, "count": 4}}
+
+
+def test_metrics_include_peer_workers(tmp_path, monkeypatch):
+    # Metrics and cache stats published by sibling workers are aggregated
+    monkeypatch.setattr(housing_predict, "WORKER_STATE_DIR", str(tmp_path))
+    peer = MetricsRegistry()
+    peer.inc("peer_requests_total", amount=5)
+    peer.set_gauge("http_requests_in_flight", 3)
+    with TestClient(app) as lifespanned_client:
+        own = housing_predict.worker_state()
+        peer_cache = {**own["cache"], "l1_hits": 7}
+        (tmp_path / "1.json").write_text(json.dumps({"metrics": peer.snapshot(), "cache": peer_cache,
+                                                     "batching": None, "admission": None}))
+        metrics = lifespanned_client.get("/lab/metrics").text
+        cache = lifespanned_client.get("/lab/cache").json()
+    assert "peer_requests_total 5" in metrics
+    assert 'http_requests_in_flight{worker="1"} 3' in metrics
+    assert cache["l1_hits"] >= 7
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_serve_forks_preloaded_workers():
+    # Workers share the parent's preloaded model and report each other's metrics
+    port = free_port()
+    env = {**os.environ, "WORKER_STATE_INTERVAL": "0.1", "REDIS_URL": "redis://127.0.0.1:1/0"}
+    server = subprocess.Popen([sys.executable, "-m", "src.serve", "--host", "127.0.0.1",
+                               "--port", str(port), "--workers", "2", "--log-level", "warning"], env=env)
+    base = f"http://127.0.0.1:{port}/lab"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base}/health", timeout=1)
+                break
+            except httpx.TransportError:
+                assert time.monotonic() < deadline and server.poll() is None
+                time.sleep(0.1)
+        assert httpx.get(f"{base}/startup").json()["preloaded"] is True
+        house = dict(zip(housing_predict.FEATURE_NAMES, [8.3, 41.0, 6.9, 1.0, 322.0, 2.5, 37.88, -122.23]))
+        for _ in range(10):
+            assert httpx.post(f"{base}/predict", json=house).status_code == 200
+
+        # Peers publish periodically, so poll until both workers' counts have landed
+        total = 'http_requests_total{route="/predict",method="POST",status="200"} 10'
+        deadline = time.monotonic() + 10
+        while True:
+            metrics = httpx.get(f"{base}/metrics").text
+            workers = {line.split('worker="')[1].split('"')[0]
+                       for line in metrics.splitlines() if line.startswith("http_requests_in_flight{")}
+            if (len(workers) == 2 and total in metrics) or time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+        assert len(workers) == 2
+        assert total in metrics
+    finally:
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=20) == 0
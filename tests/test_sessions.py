@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from numpy.testing import assert_allclose
+
+from src.housing_predict import FEATURE_NAMES, HousingPrediction
+from src.main import app
+from src.sessions import PredictionSession
+
+
+@pytest.fixture
+def houses(random_features):
+    return [dict(zip(FEATURE_NAMES, row)) for row in random_features(40, seed=1).tolist()]
+
+
+def receive_results(websocket, count):
+    results = {}
+    while len(results) < count:
+        for result in websocket.receive_json():
+            results[result["id"]] = result
+    return results
+
+
+def test_session_predictions(houses):
+    # Singles and arrays of houses are answered by id with the same predictions as HTTP
+    with TestClient(app) as lifespanned_client:
+        expected = lifespanned_client.post("/lab/bulk-predict", json={"houses": houses}).json()["predictions"]
+        with lifespanned_client.websocket_connect("/lab/predict/ws") as websocket:
+            for index, house in enumerate(houses[:10]):
+                websocket.send_text(json.dumps({"id": f"house-{index}", **house}))
+            websocket.send_text(json.dumps([{"id": index, **house} for index, house in enumerate(houses)
+                                            if index >= 10]))
+            results = receive_results(websocket, len(houses))
+
+    predictions = [results[f"house-{index}" if index < 10 else index]["prediction"] for index in range(len(houses))]
+    assert_allclose(predictions, expected)
+
+
+def test_session_validation_matches_predict(houses):
+    # Invalid houses get the errors /predict reports, without the "body" prefix
+    invalid = [{**houses[0], "Latitude": 95}, {"MedInc": 1.0}, {**houses[1], "HouseAge": "old"},
+               {**houses[2], "Rooms": 3}]
+    with TestClient(app) as lifespanned_client:
+        expected = [lifespanned_client.post("/lab/predict", json=house).json()["detail"] for house in invalid]
+        with lifespanned_client.websocket_connect("/lab/predict/ws") as websocket:
+            websocket.send_text(json.dumps([{"id": index, **house} for index, house in enumerate(invalid)]))
+            websocket.send_text(json.dumps({"id": "no-house", "house": houses[3]}))
+            results = receive_results(websocket, len(invalid) + 1)
+            websocket.send_text("{not json")
+            unparsable = websocket.receive_json()
+            websocket.send_text(json.dumps(houses[0]))
+            anonymous = websocket.receive_json()
+
+    def summary(errors, prefix=()):
+        return [(error["type"], tuple(error["loc"][len(prefix):]), error["msg"]) for error in errors]
+
+    for index, errors in enumerate(expected):
+        assert summary(results[index]["errors"]) == summary(errors, ("body",))
+    assert ("extra_forbidden", ("house",), "Extra inputs are not permitted") in summary(results["no-house"]["errors"])
+    assert unparsable[0]["id"] is None and unparsable[0]["errors"][0]["type"] == "json_invalid"
+    assert anonymous == [{"id": None, "errors": [{"type": "missing", "loc": ["id"], "msg": "Field required",
+                                                  "input": houses[0]}]}]
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.futures = []
+
+    def enqueue(self, row):
+        self.futures.append(asyncio.get_running_loop().create_future())
+        return self.futures[-1]
+
+
+def test_session_flow_control(houses):
+    # Only max_in_flight records are read until earlier results have been sent
+    async def scenario():
+        websocket, batcher = FakeWebSocket(), FakeBatcher()
+        session = asyncio.get_running_loop().create_task(
+            PredictionSession(websocket, HousingPrediction, batcher, max_in_flight=3).run())
+        await websocket.incoming.put({"type": "websocket.receive",
+                                      "text": json.dumps([{"id": index, **house}
+                                                          for index, house in enumerate(houses[:5])])})
+        await asyncio.sleep(0.01)
+        queued_while_full = len(batcher.futures)
+        batcher.futures[1].set_result(2.0)
+        batcher.futures[0].set_result(1.0)
+        await asyncio.sleep(0.01)
+        queued_after = len(batcher.futures)
+        for future in batcher.futures[2:]:
+            future.set_result(3.0)
+        await asyncio.sleep(0.01)
+        await websocket.incoming.put({"type": "websocket.disconnect"})
+        await session
+        return queued_while_full, queued_after, websocket.sent
+
+    queued_while_full, queued_after, sent = asyncio.run(scenario())
+    assert (queued_while_full, queued_after) == (3, 5)
+    assert sent[0] == [{"id": 1, "prediction": 2.0}, {"id": 0, "prediction": 1.0}]
+    assert sorted(result["id"] for message in sent for result in message) == [0, 1, 2, 3, 4]
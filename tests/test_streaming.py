@@ -0,0 +1,104 @@
+import asyncio
+import json
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+
+import src.housing_predict as housing_predict
+from src.housing_predict import HousingPrediction
+from src.main import app
+from src.streaming import iter_lines, predict_ndjson
+
+
+HOUSE = {"MedInc": 8.3252,
+         "HouseAge": 41.0,
+         "AveRooms": 6.984127,
+         "AveBedrms": 1.023810,
+         "Population": 322.0,
+         "AveOccup": 2.555556,
+         "Latitude": 37.88,
+         "Longitude": -122.23}
+
+
+async def collect(generator):
+    return [item async for item in generator]
+
+
+async def chunked(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_iter_lines_splits_across_chunks():
+    # Lines split across chunk boundaries are reassembled and blanks skipped
+    lines = asyncio.run(collect(iter_lines(chunked(b'{"a"', b':1}\n\n{"b":2}\n{"c"', b":3}"), 100)))
+    assert lines == [b'{"a":1}', b'{"b":2}', b'{"c":3}']
+
+
+def test_iter_lines_too_long():
+    # Oversized lines are dropped and reported as None
+    lines = asyncio.run(collect(iter_lines(chunked(b"x" * 20, b"x" * 20 + b"\nok\n"), 16)))
+    assert lines == [None, b"ok"]
+    lines = asyncio.run(collect(iter_lines(chunked(b"y" * 20 + b"\nok\n" + b"z" * 17), 16)))
+    assert lines == [None, b"ok", None]
+
+
+def test_iter_lines_memory_bounded():
+    # A huge line is skipped without being buffered
+    async def huge():
+        chunk = b"x" * 65536
+        for _ in range(160):
+            yield chunk
+        yield b"\nok\n"
+
+    tracemalloc.start()
+    try:
+        lines = asyncio.run(collect(iter_lines(huge(), 1024)))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert lines == [None, b"ok"]
+    assert peak < 1024 * 1024
+
+
+def test_predict_ndjson_chunks_and_inline_errors():
+    # Valid rows are predicted in fixed chunks and errors stay in position
+    calls = []
+
+    async def fake_predict(features):
+        calls.append(len(features))
+        return features[:, 0]
+
+    bad = dict(HOUSE, Latitude=97)
+    records = [HOUSE, bad, dict(HOUSE, MedInc=1.0), HOUSE, dict(HOUSE, MedInc=2.0)]
+    lines = chunked(*[json.dumps(record).encode() for record in records])
+    output = asyncio.run(collect(predict_ndjson(lines, HousingPrediction, fake_predict, 2)))
+    results = [json.loads(line) for line in output]
+
+    assert calls == [2, 2]
+    assert [result["row"] for result in results] == [0, 1, 2, 3, 4]
+    assert results[2]["prediction"] == 1.0
+    assert results[1]["errors"][0]["msg"] == "Value error, Invalid value for Latitude"
+
+
+def test_stream_endpoint(monkeypatch):
+    # Streamed predictions match /predict and bad rows do not fail the batch
+    monkeypatch.setattr(housing_predict, "STREAM_CHUNK_SIZE", 2)
+    body = "\n".join([json.dumps(HOUSE), '{"MedInc": "abc"}', json.dumps(HOUSE), json.dumps(HOUSE)])
+
+    def upload():
+        for start in range(0, len(body), 37):
+            yield body[start:start + 37].encode()
+
+    with TestClient(app) as lifespanned_client:
+        expected = lifespanned_client.post("/lab/predict", json=HOUSE).json()["prediction"]
+        response = lifespanned_client.post("/lab/bulk-predict/stream", content=upload(),
+                                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert len(results) == 4
+    assert results[1]["row"] == 1 and "errors" in results[1]
+    for result in (results[0], results[2], results[3]):
+        assert result["prediction"] == pytest.approx(expected)
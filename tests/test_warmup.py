@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from numpy.testing import assert_allclose
+from redis import asyncio as redis_asyncio
+
+import src.housing_predict as housing_predict
+from src.housing_predict import FEATURE_NAMES
+from src.main import app
+from src.warmup import HotInputs, warm_up
+
+
+def test_hot_inputs_stay_bounded():
+    # One-off inputs are pruned while frequently requested ones are kept
+    hot = HotInputs(capacity=2)
+    for index in range(100):
+        hot.record(("popular",))
+        if index % 2:
+            hot.record(("regular",))
+        hot.record((index,))
+    assert len(hot) <= 4
+    assert {("popular",), ("regular",)} <= set(hot.counts)
+
+
+def test_hot_inputs_shared_through_redis(random_features):
+    # Counts from several workers add up in Redis, ranked and trimmed to capacity
+    fakeredis = pytest.importorskip("fakeredis")
+    features = random_features(20, seed=4)
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        workers = [HotInputs(capacity=3, key="hot"), HotInputs(capacity=3, key="hot")]
+        for worker in workers:
+            worker.start(fakeredis.FakeAsyncRedis(server=server), interval=0)
+        for row, count in ((0, 5), (1, 1), (2, 3), (3, 2)):
+            for _ in range(count):
+                workers[row % 2].record(tuple(features[row]))
+        for worker in workers:
+            await worker.stop()
+        reader = HotInputs(capacity=3, key="hot")
+        reader.start(fakeredis.FakeAsyncRedis(server=server), interval=0)
+        return await reader.top(10), await reader.top(1)
+
+    top, first = asyncio.run(scenario())
+    assert np.array_equal(top, features[[0, 2, 3]])
+    assert np.array_equal(first, features[[0]])
+
+
+def test_warm_up_budget():
+    # Warm-up reports rather than raises, and gives up once its budget is spent
+    async def slow(served):
+        await asyncio.sleep(10)
+
+    async def broken(served):
+        raise RuntimeError("no model")
+
+    async def scenario():
+        served = type("Served", (), {"version": "v1"})()
+        return (await warm_up(slow, served, 0.05), await warm_up(broken, served, 1),
+                await warm_up(slow, served, 1, enabled=False))
+
+    timeout, failed, disabled = asyncio.run(scenario())
+    assert timeout["status"] == "timeout" and timeout["seconds"] < 1
+    assert failed["status"] == "failed"
+    assert disabled["status"] == "disabled"
+
+
+def test_startup_warms_cache_from_hot_inputs(monkeypatch, random_features):
+    # A starting pod precomputes the recorded hot inputs into the cache before serving
+    fakeredis = pytest.importorskip("fakeredis")
+    features = random_features(20, seed=4)
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(housing_predict, "redis_client",
+                        lambda *args, **kwargs: fakeredis.FakeAsyncRedis(server=server))
+    monkeypatch.setattr(redis_asyncio, "from_url", lambda *args, **kwargs: fakeredis.FakeAsyncRedis(
+        server=server, decode_responses=True))
+    monkeypatch.setattr(housing_predict, "WARMUP_ROWS", 5)
+    # FastAPICache.init only takes effect once per process; let this lifespan install its backend
+    monkeypatch.setattr(FastAPICache, "_init", False)
+    monkeypatch.setattr(FastAPICache, "_backend", FastAPICache._backend)
+
+    async def record():
+        hot = HotInputs(capacity=100, key=housing_predict.HOT_INPUTS_KEY)
+        hot.start(fakeredis.FakeAsyncRedis(server=server), interval=0)
+        for index, row in enumerate(features):
+            for _ in range(len(features) - index):
+                hot.record(tuple(row))
+        await hot.stop()
+
+    async def cached(key):
+        return await fakeredis.FakeAsyncRedis(server=server).get(key)
+
+    asyncio.run(record())
+    with TestClient(app) as lifespanned_client:
+        report = lifespanned_client.get("/lab/startup").json()
+        served = housing_predict.models.active
+        keys = served.key_builder.row_keys(features[:20], FastAPICache.get_prefix(),
+                                           "predict-json")
+        expected = lifespanned_client.post("/lab/predict", json=dict(zip(FEATURE_NAMES, features[0])))
+        data = housing_predict.HousingPrediction(**dict(zip(FEATURE_NAMES, features[0])))
+        housing_predict.predict_cache_key(housing_predict.predict, "predict-json", kwargs={"data": data})
+        recorded = len(housing_predict.hot_inputs)
+
+    assert report["warmup"]["status"] == "warmed" and report["warmup"]["rows"] == 5
+    assert "warmup" in report["stages_seconds"]
+    values = [asyncio.run(cached(key)) for key in keys]
+    assert [value is not None for value in values] == [True] * 5 + [False] * 15
+    assert json.loads(values[0]).keys() == expected.json().keys()
+    assert_allclose(json.loads(values[0])["prediction"], expected.json()["prediction"])
+    assert recorded == 1